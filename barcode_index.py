@@ -0,0 +1,166 @@
+import hashlib
+import asyncio
+import logging
+import struct
+import math
+import os
+
+# where the compact snapshot of the filter is kept between restarts
+BARCODE_SNAPSHOT_PATH = os.getenv("BARCODE_SNAPSHOT_PATH", "barcode_index.snapshot")
+BARCODE_FALSE_POSITIVE_RATE = float(os.getenv("BARCODE_FALSE_POSITIVE_RATE", "0.001"))
+MIN_CAPACITY = 100000
+
+SNAPSHOT_HEADER = struct.Struct("<4sQQQQ")  # magic, bit count, hash count, items, change log version
+SNAPSHOT_MAGIC = b"BCB2"
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=BARCODE_FALSE_POSITIVE_RATE, bit_count=None, hash_count=None, bits=None):
+        self.capacity = capacity
+        self.bit_count = bit_count or max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hash_count = hash_count or max(1, int(round(self.bit_count / capacity * math.log(2))))
+        self.bits = bits if bits is not None else bytearray((self.bit_count + 7) // 8)
+        self.count = 0
+
+    # double hashing over one 128-bit digest gives all k positions
+    def positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.bit_count for i in range(self.hash_count)]
+
+    def add(self, item):
+        for position in self.positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(item))
+
+
+'''
+barcode membership index
+
+a bloom filter over every barcode in ProductVariants. a miss means the barcode was not
+there when the filter was last caught up, so ReceiveVariantsBulk skips the locked probe for
+it and relies on the unique barcode index, retrying the batch with every line probed if a
+concurrent insert got there first. the filter is only a hint, never the duplicate check.
+
+it is caught up from the ChangeLog (written by the ProductVariants trigger) before each use.
+change log versions stop below min_active_rowversion(), so a variant whose transaction
+commits late is still read, which a variantID watermark would skip.
+'''
+class BarcodeIndex:
+    def __init__(self, snapshot_path=BARCODE_SNAPSHOT_PATH):
+        self.snapshot_path = snapshot_path
+        self.bloom = None
+        self.version = 0  # change log version the filter is caught up to
+        self.lock = asyncio.Lock()
+
+    @property
+    def ready(self):
+        return self.bloom is not None
+
+    def load_snapshot(self):
+        try:
+            with open(self.snapshot_path, "rb") as file:
+                magic, bit_count, hash_count, count, version = SNAPSHOT_HEADER.unpack(file.read(SNAPSHOT_HEADER.size))
+                if magic != SNAPSHOT_MAGIC:
+                    return False
+                bits = bytearray(file.read())
+        except (OSError, struct.error):
+            return False
+        if len(bits) != (bit_count + 7) // 8:
+            return False
+
+        capacity = max(1, int(bit_count * math.log(2) ** 2 / -math.log(BARCODE_FALSE_POSITIVE_RATE)))
+        self.bloom = BloomFilter(capacity, bit_count=bit_count, hash_count=hash_count, bits=bits)
+        self.bloom.count = count
+        self.version = version
+        return True
+
+    def save_snapshot(self):
+        if not self.ready:
+            return
+        # every worker saves its own copy, so each writes a temp file of its own
+        temp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, self.bloom.bit_count, self.bloom.hash_count,
+                                            self.bloom.count, self.version))
+            file.write(self.bloom.bits)
+        os.replace(temp_path, self.snapshot_path)
+
+    # load from the snapshot (or rebuild from the db) and catch up to the latest variant
+    async def load(self, cursor):
+        async with self.lock:
+            if not self.load_snapshot():
+                await self.rebuild(cursor)
+            else:
+                await self.catch_up(cursor)
+        logging.info(f"Barcode index ready: {self.bloom.count} barcodes up to change log version {self.version}.")
+
+    async def rebuild(self, cursor, batch_size=50000):
+        # the version is taken first: a variant committed during the scan is read twice, which
+        # is harmless, and one still uncommitted is above the version and read by the catch-up
+        await cursor.execute('select cast(min_active_rowversion() as bigint) - 1, (select count(*) from ProductVariants)')
+        version, count = await cursor.fetchone()
+        bloom = BloomFilter(max(MIN_CAPACITY, 2 * (count or 0)))
+
+        await cursor.execute('select barcode from ProductVariants where barcode is not null')
+        while True:
+            rows = await cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for (barcode,) in rows:
+                bloom.add(barcode)
+        self.bloom, self.version = bloom, version
+        await self.catch_up(cursor)
+
+    async def catch_up(self, cursor, batch_size=50000):
+        # only inserts are read: updates (mostly availability) would re-add the same barcodes and
+        # inflate the count. a barcode changed by an update is still caught by the unique index.
+        # entries older than the purged part of the log are gone, start over from the table
+        await cursor.execute('select purgedThrough from ChangeLogState where stateID = 1')
+        row = await cursor.fetchone()
+        if row and self.version < row[0]:
+            await self.rebuild(cursor)
+            return
+
+        while True:
+            await cursor.execute(
+                '''select top (?) cast(c.version as bigint), json_value(c.data, '$.barcode')
+                from ChangeLog as c
+                where c.tableName = 'ProductVariants' and c.operation = 'I'
+                    and c.version > cast(cast(? as bigint) as binary(8))
+                    and c.version < min_active_rowversion()
+                order by c.version''',
+                (batch_size, self.version)
+            )
+            rows = await cursor.fetchall()
+            for version, barcode in rows:
+                if barcode is not None:
+                    self.bloom.add(barcode)
+            if rows:
+                self.version = int(rows[-1][0])
+            if len(rows) < batch_size:
+                break
+
+        # past its capacity the false positive rate climbs, so grow the filter
+        if self.bloom.count > self.bloom.capacity:
+            await self.rebuild(cursor)
+
+    async def refresh(self, cursor):
+        async with self.lock:
+            if self.ready:
+                await self.catch_up(cursor)
+
+    # barcodes that might already exist; everything else is definitely new
+    async def possible_duplicates(self, cursor, barcodes):
+        if not self.ready:
+            return set(barcodes)
+        await self.refresh(cursor)
+        return {barcode for barcode in barcodes if barcode in self.bloom}
+
+
+# shared instance
+barcode_index = BarcodeIndex()
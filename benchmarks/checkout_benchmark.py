@@ -0,0 +1,65 @@
+'''
+benchmark for the set-based CheckoutSale procedure
+
+checks out baskets of increasing size against the configured database. every run
+happens inside a transaction that is rolled back, so no stock is actually sold.
+
+usage: python -m benchmarks.checkout_benchmark [userID] [basket sizes...]
+'''
+import sys
+import time
+import asyncio
+import database
+
+
+async def time_checkout(cursor, user_id, basket_size):
+    started = time.perf_counter()
+    await cursor.execute(
+        '''set nocount on;
+        begin transaction;
+
+        declare @variantIDs VariantIDList;
+        insert into @variantIDs (variantID)
+        select top (?) variantID
+        from ProductVariants
+        where isAvailable = 1
+        order by variantID;
+
+        declare @started datetime2 = sysdatetime();
+        exec CheckoutSale @userID = ?, @variantIDs = @variantIDs;
+        select datediff(microsecond, @started, sysdatetime()) as elapsed;
+
+        rollback transaction;''',
+        (basket_size, user_id)
+    )
+    await cursor.fetchall()  # the sale row
+    await cursor.nextset()
+    server_us = (await cursor.fetchone())[0]
+    return server_us / 1000, (time.perf_counter() - started) * 1000
+
+
+async def main(user_id=1, basket_sizes=(1, 10, 100, 1000, 5000)):
+    conn = await database.get_db_connection()
+    cursor = await conn.cursor()
+    try:
+        await cursor.execute('select count(*) from ProductVariants where isAvailable = 1')
+        available = (await cursor.fetchone())[0]
+        print(f"{available} available variants")
+        print(f"{'basket':>8} {'server ms':>12} {'round trip ms':>14}")
+
+        for basket_size in basket_sizes:
+            if basket_size > available:
+                print(f"{basket_size:>8} skipped, not enough available variants")
+                continue
+            server_ms, total_ms = await time_checkout(cursor, user_id, basket_size)
+            print(f"{basket_size:>8} {server_ms:>12.1f} {total_ms:>14.1f}")
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    if len(args) > 1:
+        asyncio.run(main(args[0], args[1:]))
+    else:
+        asyncio.run(main(*args))
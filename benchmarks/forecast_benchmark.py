@@ -0,0 +1,40 @@
+'''
+benchmark for the vectorized demand forecast
+
+generates a synthetic sales history (products x days) and times the matrix build,
+both forecasting methods and the reorder level computation.
+
+usage: python -m benchmarks.forecast_benchmark [products] [days]
+'''
+import sys
+import time
+import numpy as np
+from routers.forecast import build_demand_matrix, forecast_daily_demand, compute_stock_levels
+
+
+def timed(label, func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    print(f"{label:<28} {(time.perf_counter() - start) * 1000:10.1f} ms")
+    return result
+
+
+def main(n_products=5000, n_days=5 * 365, sales_per_day=3000):
+    rng = np.random.default_rng(42)
+    n_rows = n_days * sales_per_day // 10
+
+    # flat (product, day, quantity) rows like the grouped history query returns
+    product_index = rng.integers(0, n_products, n_rows)
+    day_index = rng.integers(0, n_days, n_rows)
+    quantities = rng.poisson(10, n_rows).astype(np.float64)
+    print(f"{n_products} products, {n_days} days, {n_rows} grouped sales rows")
+
+    demand = timed("build demand matrix", build_demand_matrix, product_index, day_index, quantities, n_products, n_days)
+    timed("moving average", forecast_daily_demand, demand, method="sma")
+    forecast = timed("exponential smoothing", forecast_daily_demand, demand, method="ema")
+    timed("safety stock + levels", compute_stock_levels, demand, forecast)
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    main(*args)
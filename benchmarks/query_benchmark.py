@@ -0,0 +1,166 @@
+'''
+benchmark for the router read queries
+
+runs each query the routers issue against the configured database, with parameters taken
+from existing rows, and prints the median time of several runs. run it once with --save
+before applying migrations/0002_indexes.sql (or a schema change) and again with --compare afterwards to get
+before/after timings per query. the queries only read.
+
+usage: python -m benchmarks.query_benchmark [--repeat N] [--save FILE] [--compare FILE]
+'''
+import sys
+import json
+import time
+import asyncio
+import statistics
+from datetime import date, datetime, time as day_start, timedelta
+import database
+from routers.inventory import fetch_catalog
+from routers.sales import fetch_sales_page
+from routers.po_queries import fetch_purchase_orders, ORDER_STATUSES
+from routers.analytics import load_sales_facts, load_products
+
+
+async def sample_parameters(cursor):
+    await cursor.execute(
+        '''select top 1 p.productID, p.productName, p.size, p.category, p.unitPrice, pv.barcode
+        from Products as p
+        inner join ProductVariants as pv
+            on pv.productID = p.productID and pv.isAvailable = 1
+        where p.isActive = 1
+        order by p.productID desc''')
+    product = await cursor.fetchone()
+    await cursor.execute('select top 1 userID from Sales order by salesID desc')
+    seller = await cursor.fetchone()
+    if not product or not seller:
+        raise SystemExit("the database needs at least one available product and one sale to benchmark against")
+    return {
+        "productID": int(product[0]),
+        "productName": product[1],
+        "size": product[2],
+        "category": product[3],
+        "unitPrice": float(product[4]),
+        "barcode": product[5],
+        "userID": int(seller[0]),
+    }
+
+
+def router_queries(sample):
+    today = date.today()
+    tomorrow = datetime.combine(today + timedelta(days=1), day_start.min)
+
+    async def execute(cursor, sql, params=()):
+        await cursor.execute(sql, params)
+        rows = await cursor.fetchall()
+        while await cursor.nextset():
+            rows = await cursor.fetchall()
+        return rows
+
+    return {
+        # inventory
+        "catalog: all products": lambda c: fetch_catalog(c),
+        "catalog: one category": lambda c: fetch_catalog(c, category=sample["category"]),
+        "catalog: one product": lambda c: fetch_catalog(c, product_id=sample["productID"]),
+        "product sizes": lambda c: execute(c,
+            '''select size, currentStock, minStockLevel, maxStockLevel, reorderLevel, threshold
+            from Products
+            where productName = ? and unitPrice = ? and category = ?''',
+            (sample["productName"], sample["unitPrice"], sample["category"])),
+        "product identity": lambda c: execute(c,
+            '''select top 1 productID, isActive
+            from Products
+            where productName = ? and size = ? and category = ?
+            order by isActive desc, productID''',
+            (sample["productName"], sample["size"], sample["category"])),
+        "barcode lookup": lambda c: execute(c,
+            'select variantID, productID, isAvailable from ProductVariants where barcode = ?',
+            (sample["barcode"],)),
+        "warehouse stock": lambda c: execute(c,
+            '''select ws.productID, p.productName, p.category, p.size, ws.warehouseID, ws.available
+            from vw_WarehouseStock as ws with (noexpand)
+            inner join Products as p
+                on p.productID = ws.productID
+            where p.isActive = 1 and p.category = ?''',
+            (sample["category"],)),
+        "stock levels": lambda c: execute(c,
+            '''select p.productID, p.productName, p.category, p.size, count(pv.variantID) as available
+            from Products as p
+            left join ProductVariants as pv
+                on pv.productID = p.productID and pv.isAvailable = 1
+            where p.isActive = 1
+            group by p.productID, p.productName, p.category, p.size'''),
+        # sales
+        "sales products: all": lambda c: execute(c, 'exec GetProductByCategory @category = ?', ("All Categories",)),
+        "sales products: category": lambda c: execute(c, 'exec GetProductByCategory @category = ?', (sample["category"],)),
+        "sales history page": lambda c: fetch_sales_page(c, 50),
+        "sales history: employee": lambda c: fetch_sales_page(c, 50, user_id=sample["userID"]),
+        "sales history: last 30 days": lambda c: fetch_sales_page(c, 50, start_date=today - timedelta(days=30), end_date=today),
+        "sales analytics: 90 days": lambda c: load_sales_facts(c, tomorrow - timedelta(days=91), tomorrow),
+        "analytics products": lambda c: load_products(c),
+        # purchase orders
+        "purchase orders page": lambda c: fetch_purchase_orders(c, 50),
+        **{
+            f"purchase orders: {status}": (lambda c, status=status: fetch_purchase_orders(c, 50, order_status=status))
+            for status in ORDER_STATUSES
+        },
+    }
+
+
+async def time_query(cursor, query, repeat):
+    await query(cursor)  # warm the plan cache and buffer pool
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await query(cursor)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+async def main(repeat=5, save=None, compare=None):
+    baseline = {}
+    if compare:
+        with open(compare) as file:
+            baseline = json.load(file)
+
+    conn = await database.get_db_connection()
+    cursor = await conn.cursor()
+    results = {}
+    try:
+        sample = await sample_parameters(cursor)
+        print(f"{'query':<36} {'median ms':>10}" + (f" {'before ms':>10} {'change':>8}" if baseline else ""))
+
+        for name, query in router_queries(sample).items():
+            try:
+                results[name] = await time_query(cursor, query, repeat)
+            except Exception as e:
+                print(f"{name:<36} failed: {e}")
+                continue
+            line = f"{name:<36} {results[name]:>10.2f}"
+            if name in baseline:
+                change = (results[name] - baseline[name]) / baseline[name] * 100 if baseline[name] else 0
+                line += f" {baseline[name]:>10.2f} {change:>+7.0f}%"
+            print(line)
+    finally:
+        await conn.close()
+
+    if save:
+        with open(save, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"saved to {save}")
+
+
+def parse_args(argv):
+    options = {}
+    args = iter(argv)
+    for arg in args:
+        if arg == "--repeat":
+            options["repeat"] = int(next(args))
+        elif arg in ("--save", "--compare"):
+            options[arg[2:]] = next(args)
+        else:
+            raise SystemExit(__doc__)
+    return options
+
+
+if __name__ == "__main__":
+    asyncio.run(main(**parse_args(sys.argv[1:])))
@@ -0,0 +1,167 @@
+from collections import OrderedDict
+import logging
+import time
+import json
+import os
+import database
+
+# abandoned carts are dropped after this many idle seconds
+CART_TTL_SECONDS = float(os.getenv("CART_TTL_SECONDS", "1800"))
+# keep carts in the Cart table too, so they survive restarts and are shared between workers
+CART_PERSIST = os.getenv("CART_PERSIST", "false").lower() == "true"
+
+
+class CartStore:
+    def __init__(self, ttl_seconds=CART_TTL_SECONDS, persist=CART_PERSIST):
+        self.ttl_seconds = ttl_seconds
+        self.persist = persist
+        # cartKey -> {productID: line}, ordered from least to most recently used
+        self.carts = OrderedDict()
+        self.touched = {}
+        self.expiry_listeners = []
+
+    def on_expire(self, listener):
+        self.expiry_listeners.append(listener)
+
+    def touch(self, key):
+        self.touched[key] = time.monotonic()
+        self.carts.move_to_end(key)
+
+    # drop carts idle for longer than the ttl; they sit at the front of the ordered dict
+    def sweep(self):
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = []
+        while self.carts:
+            key = next(iter(self.carts))
+            if self.touched[key] > cutoff:
+                break
+            expired.append((key, self.carts.pop(key)))
+            del self.touched[key]
+        for key, lines in expired:
+            for listener in self.expiry_listeners:
+                listener(key, lines)
+        return [key for key, _ in expired]
+
+    # remove abandoned carts from the Cart table (rows are rewritten on every change)
+    async def sweep_persisted(self):
+        if not self.persist:
+            return
+        conn = await database.get_db_connection()
+        try:
+            cursor = await conn.cursor()
+            await cursor.execute(
+                '''delete from Cart
+                where cartKey is not null
+                    and createdAt < dateadd(second, -?, getdate())''',
+                (int(self.ttl_seconds),)
+            )
+        finally:
+            await conn.close()
+
+    async def get(self, key):
+        self.sweep()
+        if self.persist:
+            # the table is the source of truth when several workers share carts
+            self.carts[key] = await self.load(key)
+        lines = self.carts.setdefault(key, {})
+        self.touch(key)
+        return lines
+
+    async def view(self, key):
+        return list((await self.get(key)).values())
+
+    # add a line, merging it with an existing line for the same product
+    async def add(self, key, line):
+        lines = await self.get(key)
+        existing = lines.get(line["productID"])
+        if existing:
+            existing["quantity"] += line["quantity"]
+            existing["price"] = line["price"]
+        else:
+            lines[line["productID"]] = dict(line)
+        await self.save(key)
+        return lines[line["productID"]]
+
+    async def update(self, key, product_id, quantity):
+        lines = await self.get(key)
+        line = lines.get(product_id)
+        if line is None:
+            return None
+        line["quantity"] = quantity
+        await self.save(key)
+        return line
+
+    async def remove(self, key, product_id):
+        lines = await self.get(key)
+        line = lines.pop(product_id, None)
+        if line is not None:
+            await self.save(key)
+        return line
+
+    async def clear(self, key):
+        lines = self.carts.pop(key, {})
+        self.touched.pop(key, None)
+        if self.persist:
+            await self.save_lines(key, {})
+        return lines
+
+    async def save(self, key):
+        if self.persist:
+            await self.save_lines(key, self.carts.get(key, {}))
+
+    # replace the cart's rows in one round trip
+    async def save_lines(self, key, lines):
+        conn = await database.get_db_connection()
+        try:
+            cursor = await conn.cursor()
+            await cursor.execute(
+                '''set xact_abort on;
+                begin transaction;
+
+                delete from Cart where cartKey = ?;
+
+                insert into Cart (cartKey, userID, productID, quantity, unitPrice)
+                select ?, j.userID, j.productID, j.quantity, j.price
+                from openjson(?) with (userID numeric, productID numeric, quantity int, price numeric(18, 2)) as j;
+
+                commit transaction;''',
+                (key, key, json.dumps(list(lines.values())))
+            )
+        finally:
+            await conn.close()
+
+    async def load(self, key):
+        conn = await database.get_db_connection()
+        try:
+            cursor = await conn.cursor()
+            await cursor.execute(
+                '''select c.productID, p.productName, p.category, p.size, c.quantity, c.unitPrice, c.userID
+                from Cart as c
+                inner join Products as p
+                    on c.productID = p.productID
+                where c.cartKey = ?''',
+                (key,)
+            )
+            rows = await cursor.fetchall()
+        except Exception as e:
+            logging.error(f"error loading cart {key}: {e}")
+            return self.carts.get(key, {})
+        finally:
+            await conn.close()
+
+        return {
+            int(row[0]): {
+                "productID": int(row[0]),
+                "productName": row[1],
+                "category": row[2],
+                "size": row[3],
+                "quantity": row[4],
+                "price": float(row[5]),
+                "userID": int(row[6]) if row[6] is not None else None,
+            }
+            for row in rows
+        }
+
+
+# shared instance used by the sales router
+cart_store = CartStore()
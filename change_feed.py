@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import json
+import os
+import database
+
+# how often the shared poller reads new changes while anyone is subscribed
+CHANGE_FEED_POLL_SECONDS = float(os.getenv("CHANGE_FEED_POLL_SECONDS", "1"))
+# changes buffered per subscriber before it is cut off and told to resync
+CHANGE_FEED_QUEUE_SIZE = int(os.getenv("CHANGE_FEED_QUEUE_SIZE", "1000"))
+# changes older than this are purged; clients behind the purge must reload
+CHANGE_LOG_RETENTION_DAYS = int(os.getenv("CHANGE_LOG_RETENTION_DAYS", "7"))
+
+CHANGE_FEED_TABLES = ("Products", "ProductVariants", "PurchaseOrders")
+
+
+class ChangeTokenExpired(Exception):
+    pass
+
+
+class Subscription:
+    def __init__(self, version, max_queue):
+        self.version = version  # feed position when the subscription started
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.overflowed = False
+
+    def push(self, change):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(change)
+        except asyncio.QueueFull:
+            # a slow consumer is dropped instead of holding up everyone else
+            self.overflowed = True
+
+
+'''
+change feed over the ChangeLog table
+
+tokens are ChangeLog rowversions. reads stop below min_active_rowversion(), so a change
+from a transaction that is still open can never be skipped by a later token. a single
+poller per worker reads new changes and fans them out to subscribers (sse and websocket
+clients), so the number of clients does not add db queries.
+'''
+class ChangeFeed:
+    def __init__(self, poll_seconds=CHANGE_FEED_POLL_SECONDS, max_queue=CHANGE_FEED_QUEUE_SIZE):
+        self.poll_seconds = poll_seconds
+        self.max_queue = max_queue
+        self.subscribers = set()
+        self.version = None  # last version fanned out, None while nobody listens
+        self.lock = asyncio.Lock()
+        self.task = None
+
+    # latest version that no open transaction can still write below
+    async def head(self, cursor):
+        await cursor.execute('select cast(min_active_rowversion() as bigint) - 1')
+        return (await cursor.fetchone())[0]
+
+    async def check_token(self, cursor, since):
+        await cursor.execute('select purgedThrough from ChangeLogState where stateID = 1')
+        row = await cursor.fetchone()
+        if row and since < row[0]:
+            raise ChangeTokenExpired(f"Changes before {row[0]} have been purged.")
+
+    # changes after since, up to until (or everything committed), oldest first
+    async def read_changes(self, cursor, since, until=None, limit=1000, tables=None):
+        conditions = ["c.version > cast(cast(? as bigint) as binary(8))"]
+        params = [since]
+        if until is not None:
+            conditions.append("c.version <= cast(cast(? as bigint) as binary(8))")
+            params.append(until)
+        else:
+            conditions.append("c.version < min_active_rowversion()")
+        if tables:
+            conditions.append("c.tableName in (select value from openjson(?))")
+            params.append(json.dumps(list(tables)))
+
+        await cursor.execute(
+            f'''select top (?) cast(c.version as bigint), c.tableName, c.entityID, c.operation, c.data, c.changedAt
+            from ChangeLog as c
+            where {" and ".join(conditions)}
+            order by c.version''',
+            (limit, *params)
+        )
+        rows = await cursor.fetchall()
+        return [
+            {
+                "version": row[0],
+                "table": row[1],
+                "id": int(row[2]),
+                "operation": row[3],
+                "data": json.loads(row[4]) if row[4] else None,
+                "changedAt": row[5].isoformat(),
+            }
+            for row in rows
+        ]
+
+    async def subscribe(self):
+        async with self.lock:
+            if self.version is None:
+                conn = await database.get_db_connection()
+                try:
+                    self.version = await self.head(await conn.cursor())
+                finally:
+                    await conn.close()
+            subscription = Subscription(self.version, self.max_queue)
+            self.subscribers.add(subscription)
+        self.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscribers.discard(subscription)
+
+    # read what changed since the last poll and hand it to every subscriber
+    async def poll_once(self):
+        async with self.lock:
+            if not self.subscribers:
+                self.version = None
+                return 0
+            conn = await database.get_db_connection()
+            try:
+                cursor = await conn.cursor()
+                changes = await self.read_changes(cursor, self.version, limit=5000)
+            finally:
+                await conn.close()
+            if changes:
+                self.version = changes[-1]["version"]
+        for change in changes:
+            for subscription in list(self.subscribers):
+                subscription.push(change)
+        return len(changes)
+
+    async def run(self):
+        while True:
+            try:
+                # keep reading without a pause while a burst is being drained
+                if await self.poll_once() < 5000:
+                    await asyncio.sleep(self.poll_seconds)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"error polling the change feed: {e}")
+                await asyncio.sleep(self.poll_seconds)
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    # drop changes past the retention and remember how far the purge went
+    async def purge(self, retention_days=CHANGE_LOG_RETENTION_DAYS):
+        conn = await database.get_db_connection()
+        try:
+            cursor = await conn.cursor()
+            await cursor.execute(
+                '''set nocount on;
+                declare @purged table (version bigint);
+
+                delete from ChangeLog
+                output cast(deleted.version as bigint) into @purged (version)
+                where changedAt < dateadd(day, -?, sysdatetime());
+
+                update ChangeLogState
+                set purgedThrough = (select max(version) from @purged)
+                where stateID = 1 and exists (select 1 from @purged);
+
+                select count(*) from @purged;''',
+                (retention_days,)
+            )
+            return (await cursor.fetchone())[0]
+        finally:
+            await conn.close()
+
+
+# shared instance
+change_feed = ChangeFeed()
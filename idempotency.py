@@ -0,0 +1,56 @@
+from collections import OrderedDict
+import asyncio
+import os
+
+# how many recent results are answered from memory before falling back to the db
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+# how long keys are kept in the IdempotencyKeys table
+IDEMPOTENCY_RETENTION_DAYS = int(os.getenv("IDEMPOTENCY_RETENTION_DAYS", "7"))
+
+
+'''
+results of requests sent with an Idempotency-Key header
+
+recent results are kept in a bounded lru; the IdempotencyKeys table (written in the same
+transaction as the sale) is the durable copy. requests with a key that is still being
+processed in this worker wait for the first one instead of running again.
+'''
+class IdempotencyStore:
+    def __init__(self, max_entries=IDEMPOTENCY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.results = OrderedDict()
+        self.in_flight = {}
+
+    def get(self, key):
+        result = self.results.get(key)
+        if result is not None:
+            self.results.move_to_end(key)
+        return result
+
+    def put(self, key, result):
+        self.results[key] = result
+        self.results.move_to_end(key)
+        while len(self.results) > self.max_entries:
+            self.results.popitem(last=False)
+
+    # returns a future to await when another request with the key is running, otherwise None
+    def begin(self, key):
+        future = self.in_flight.get(key)
+        if future is not None:
+            return future
+        self.in_flight[key] = asyncio.get_running_loop().create_future()
+        return None
+
+    def finish(self, key, result=None, error=None):
+        future = self.in_flight.pop(key, None)
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+            future.exception()  # mark retrieved so an unawaited failure is not logged
+        else:
+            future.set_result(result)
+
+
+# shared instance for checkout
+checkout_idempotency = IdempotencyStore()
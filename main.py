@@ -3,8 +3,11 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 # from routers import inventory, auth, purchase_order, employee_accounts
-from routers import inventory, purchase_order, auth, employee_accounts, receive_orders, sales
+from routers import inventory, purchase_order, auth, employee_accounts, receive_orders, sales, forecast, analytics, changes, stock_stream
+from vms_client import vms_client
+from schema_migrations import report_schema_status
 import uvicorn
+import asyncio
 import os
 import logging
 
@@ -32,12 +35,35 @@ app.include_router(purchase_order.router, prefix='/purchase-order', tags=['purch
 app.include_router(employee_accounts.router, prefix='/employees', tags=['employee-accounts'])
 app.include_router(receive_orders.router, prefix='/receive-orders', tags=['receive-orders'])
 app.include_router(sales.router, prefix='/employee-sales', tags=['employee sales'])
+app.include_router(forecast.router, prefix='/forecast', tags=['forecast'])
+app.include_router(analytics.router, prefix='/analytics', tags=['analytics'])
+app.include_router(changes.router, prefix='/changes', tags=['changes'])
+app.include_router(stock_stream.router, prefix='/stock', tags=['stock'])
+
+# shared keep-alive client for the VMS
+@app.on_event("startup")
+async def start_vms_client():
+    await vms_client.start()
+
+@app.on_event("shutdown")
+async def close_vms_client():
+    await vms_client.close()
+
+# migrations are applied at deploy (python -m schema_migrations); workers only log what is missing
+@app.on_event("startup")
+async def check_schema():
+    asyncio.create_task(report_schema_status())
 
 # Health check endpoint
 @app.get("/health", tags=["health"])
 async def health_check():
     return {"status": "ok"}
 
+# VMS client latency, error and circuit breaker metrics
+@app.get("/health/vms", tags=["health"])
+async def vms_health():
+    return vms_client.metrics()
+
 # Example API endpoint to serve some data (to match the React fetch URL)
 @app.get("/api/data")
 async def get_data():
@@ -0,0 +1,357 @@
+-- base schema. the database itself is created by the deploy (it is the one in DB_NAME);
+-- applied once by schema_migrations, later changes go in new numbered scripts
+
+if object_id(N'dbo.Users', 'U') is null
+begin
+create table Users 
+(userID numeric identity(1,1) constraint userID_PK primary key,
+firstName varchar(50), 
+lastName varchar(50), 
+username varchar (50),
+userPassword varchar(500),
+userRole varchar(50),
+isDisabled bit default 0,
+createdAt datetime default getdate(),
+updatedAt datetime default getdate()
+)
+end
+
+if object_id(N'dbo.Warehouses', 'U') is null
+begin 
+create table Warehouses
+(
+warehouseID numeric identity(1,1) constraint warehouseID_PK primary key,
+warehouseName varchar(100),
+building varchar(100),
+street varchar(100),
+barangay varchar(100),
+city varchar(100),
+country varchar(100),
+zipcode varchar(20))
+end
+
+if object_id(N'dbo.Products', 'U') is null
+begin
+create table Products
+(productID numeric IDENTITY(1,1) constraint PK_productID PRIMARY KEY,
+    productName VARCHAR(100) NOT NULL constraint UQ_productName unique,
+    productDescription VARCHAR(255),
+	size VARCHAR(20),
+    color VARCHAR(20),
+    category VARCHAR(50),
+	unitPrice numeric,
+	reorderLevel INT NOT NULL default 0,
+	minStockLevel int not null default 0,
+	maxStockLevel int not null default 0,
+	currentStock int,
+	createdAt DATETIME DEFAULT GETDATE(),
+    lastUpdated DATETIME DEFAULT GETDATE(),
+	isActive bit default 1,
+	warehouseID numeric constraint FK_warehouseID_product foreign key references Warehouses(warehouseID),
+	threshold int,
+	image_path varchar(500)
+)
+end
+
+if col_length(N'dbo.Products', N'threshold') is null
+begin
+    alter table Products add threshold int null;
+end
+
+-- image paths are short relative paths; a text or max column cannot be grouped, indexed or
+-- included in an index, so it is narrowed once no stored path is longer than the new size
+if col_length(N'dbo.Products', N'image_path') is null
+begin
+    alter table Products add image_path varchar(500) null;
+end
+else if exists (select 1 from sys.columns
+                where object_id = object_id(N'dbo.Products') and name = N'image_path'
+                    and (type_name(system_type_id) in ('text', 'ntext') or max_length = -1))
+    and not exists (select 1 from Products where datalength(image_path) > 500)
+begin
+    exec (N'alter table Products alter column image_path varchar(500) null');
+end
+
+if object_id(N'dbo.ProductVariants', 'U') is null
+begin
+CREATE TABLE ProductVariants (
+    variantID numeric IDENTITY(1,1) constraint PK_variantID PRIMARY KEY,
+    barcode VARCHAR(50),
+    productCode VARCHAR(50),
+	isDamaged bit default 0,
+	isWrongItem bit default 0, 
+	isReturned bit default 0,
+	isAvailable bit default 1,
+	productID numeric NOT NULL constraint FK_productID_variant FOREIGN KEY REFERENCES products(productID)
+	on update cascade
+	on delete cascade
+)
+end
+
+if object_id('dbo.Vendors', 'U') is null
+begin
+create table Vendors
+(
+vendorID numeric identity(1,1) constraint vendorID_PK primary key,
+vendorName varchar (100),
+contactNumber char(11),
+building varchar(100),
+street varchar(100),
+barangay varchar(100),
+city varchar(100),
+country varchar(100),
+zipcode varchar(20),
+isActive bit default 1
+)
+end
+
+if object_id(N'dbo.PurchaseOrders', 'U') is null
+begin 
+create table PurchaseOrders
+(
+orderID numeric identity(1,1) constraint orderID_PK primary key,
+orderDate datetime2,
+orderStatus varchar (100),
+statusDate datetime2,
+vendorID numeric constraint vendorID_FK foreign key references vendors(vendorID),
+userID numeric constraint FK_userID_PO foreign key references users(userID)
+on update cascade
+on delete cascade)
+end
+
+if object_id(N'dbo.PurchaseOrderDetails', 'U') is null
+begin 
+create table PurchaseOrderDetails
+(
+orderDetailID numeric identity(1,1) constraint orderDetailID_PK primary key,
+orderQuantity numeric default 1,
+expectedDate datetime2,
+actualDate datetime2,
+variantID numeric constraint variantID_FK_PO foreign key references productVariants(variantID),
+warehouseID numeric constraint warehouseID_FK_PO foreign key references warehouses(warehouseID),
+orderID numeric constraint orderID_FK foreign key references purchaseOrders(orderID)
+on update cascade
+on delete cascade)
+end
+
+-- Create Sales Table
+if object_id(N'dbo.Sales', 'U') is null
+begin
+    create table Sales (
+        salesID numeric identity(1,1) constraint PK_salesID primary key,
+        userID numeric constraint FK_employeeID_sales foreign key references users(userID),
+        salesDate datetime default getdate(),
+        totalAmount numeric(18, 2) not null,
+        createdAt datetime default getdate(),
+        updatedAt datetime default getdate()
+    )
+end
+
+-- Create SalesDetails Table
+if object_id(N'dbo.SalesDetails', 'U') is null
+begin
+    create table SalesDetails (
+        salesDetailID numeric identity(1,1) constraint PK_salesDetailID primary key,
+        salesID numeric not null constraint FK_salesID_details foreign key references Sales(salesID) 
+            on update cascade on delete cascade,
+        variantID numeric not null constraint FK_variantID_salesDetail foreign key references ProductVariants(variantID),
+        unitPrice numeric(18, 2) not null
+    )
+end
+
+-- Create Cart Table (for pre-checkout actions)
+if object_id(N'dbo.Cart', 'U') is null
+begin
+    create table Cart (
+        cartID numeric identity(1,1) constraint PK_cartID primary key,
+        userID numeric constraint FK_userID_cart foreign key references Users(userID),
+        variantID numeric null constraint FK_variantID_cart foreign key references ProductVariants(variantID),
+        unitPrice numeric(18, 2) not null,
+        createdAt datetime default getdate(),
+        cartKey varchar(100) null, -- terminal or user the cart belongs to
+        productID numeric null constraint FK_productID_cart foreign key references Products(productID),
+        quantity int not null default 1
+    )
+end
+
+-- cart lines are kept per product and per terminal
+if col_length(N'dbo.Cart', N'cartKey') is null
+begin
+    alter table Cart add
+        cartKey varchar(100) null,
+        productID numeric null constraint FK_productID_cart foreign key references Products(productID),
+        quantity int not null constraint DF_quantity_cart default 1;
+    alter table Cart alter column variantID numeric null;
+end
+
+-- sales not yet added to the rollup tables
+if col_length(N'dbo.Sales', N'isRolledUp') is null
+begin
+    alter table Sales add isRolledUp bit not null constraint DF_isRolledUp_sales default 0;
+end
+
+-- Create SalesRollupHourly Table (units and amount per hour, product and employee)
+if object_id(N'dbo.SalesRollupHourly', 'U') is null
+begin
+    create table SalesRollupHourly (
+        rollupID bigint identity(1,1) constraint PK_rollupID_hourly primary key nonclustered,
+        salesHour datetime not null,
+        productID numeric not null constraint FK_productID_rollup_hourly foreign key references Products(productID),
+        userID numeric not null,
+        productName varchar(100),
+        category varchar(50),
+        size varchar(20),
+        quantity int not null,
+        amount numeric(18, 2) not null,
+        constraint UQ_rollup_hourly unique clustered (salesHour, productID, userID)
+    )
+end
+
+-- Create SalesRollupDaily Table (units and amount per day, product and employee)
+if object_id(N'dbo.SalesRollupDaily', 'U') is null
+begin
+    create table SalesRollupDaily (
+        rollupID bigint identity(1,1) constraint PK_rollupID_daily primary key nonclustered,
+        salesDay date not null,
+        productID numeric not null constraint FK_productID_rollup_daily foreign key references Products(productID),
+        userID numeric not null,
+        productName varchar(100),
+        category varchar(50),
+        size varchar(20),
+        quantity int not null,
+        amount numeric(18, 2) not null,
+        constraint UQ_rollup_daily unique clustered (salesDay, productID, userID)
+    )
+end
+
+-- Create IdempotencyKeys Table (checkout results for retried requests)
+if object_id(N'dbo.IdempotencyKeys', 'U') is null
+begin
+    create table IdempotencyKeys (
+        idempotencyKey varchar(150) constraint PK_idempotencyKey primary key,
+        userID numeric constraint FK_userID_idempotency foreign key references Users(userID),
+        salesID numeric not null constraint FK_salesID_idempotency foreign key references Sales(salesID),
+        createdAt datetime default getdate()
+    )
+end
+
+-- Create ReceiveCheckpoints Table (progress of streamed deliveries, for resuming)
+if object_id(N'dbo.ReceiveCheckpoints', 'U') is null
+begin
+    create table ReceiveCheckpoints (
+        uploadID varchar(100) constraint PK_uploadID primary key,
+        orderID numeric constraint FK_orderID_checkpoint foreign key references PurchaseOrders(orderID),
+        linesCommitted int not null default 0,
+        received int not null default 0,
+        skipped int not null default 0,
+        isComplete bit not null default 0,
+        createdAt datetime default getdate(),
+        updatedAt datetime default getdate()
+    )
+end
+
+-- units sit in a warehouse; backfilled from the product's warehouse for existing rows
+if col_length(N'dbo.ProductVariants', N'warehouseID') is null
+begin
+    alter table ProductVariants add warehouseID numeric null
+        constraint FK_warehouseID_variant foreign key references Warehouses(warehouseID);
+end
+go
+
+update pv
+set pv.warehouseID = p.warehouseID
+from ProductVariants as pv
+inner join Products as p
+    on p.productID = pv.productID
+where pv.warehouseID is null and p.warehouseID is not null;
+go
+
+-- available units per product and warehouse, maintained by SQL Server on every variant write
+create or alter view dbo.vw_WarehouseStock
+with schemabinding
+as
+select pv.productID, pv.warehouseID, count_big(*) as available
+from dbo.ProductVariants as pv
+where pv.isAvailable = 1
+group by pv.productID, pv.warehouseID;
+go
+
+if not exists (select 1 from sys.indexes where name = N'IX_vw_WarehouseStock' and object_id = object_id(N'dbo.vw_WarehouseStock'))
+begin
+    create unique clustered index IX_vw_WarehouseStock on dbo.vw_WarehouseStock (productID, warehouseID);
+    create index IX_vw_WarehouseStock_warehouseID on dbo.vw_WarehouseStock (warehouseID, productID) include (available);
+end
+go
+
+-- Create ChangeLog Table (change feed over Products, ProductVariants and PurchaseOrders, written by triggers)
+if object_id(N'dbo.ChangeLog', 'U') is null
+begin
+    create table ChangeLog (
+        changeID bigint identity(1,1) constraint PK_changeID primary key,
+        version rowversion not null,
+        tableName varchar(50) not null,
+        entityID numeric not null,
+        operation char(1) not null, -- I, U or D
+        data nvarchar(max), -- the row after the change as json, null for deletes
+        changedAt datetime2 not null constraint DF_changedAt_changeLog default sysdatetime()
+    )
+    create unique index IX_ChangeLog_version on ChangeLog (version);
+    create index IX_ChangeLog_changedAt on ChangeLog (changedAt);
+end
+
+-- Create ChangeLogState Table (highest version purged from the change log)
+if object_id(N'dbo.ChangeLogState', 'U') is null
+begin
+    create table ChangeLogState (
+        stateID tinyint constraint PK_stateID_changeLog primary key,
+        purgedThrough bigint not null default 0
+    )
+    insert into ChangeLogState (stateID, purgedThrough) values (1, 0);
+end
+
+
+
+/*
+
+if object_id('dbo.Customers', 'U') is null
+begin 
+create table Customers
+(
+customerID numeric identity(1,1) constraint customerID_PK primary key,
+lastName varchar(100),
+firstName varchar(100),
+building varchar(100),
+street varchar(100),
+barangay varchar(100),
+city varchar(100),
+country varchar(100),
+zipcode varchar(20)),
+contactNumber char(13) 
+end
+
+if object_id(N'dbo.Deliveries','U') is null
+begin 
+create table Deliveries 
+(
+deliveryID numeric identity(1,1) constraint deliveryID_PK primary key,
+salesDate datetime2,
+customerID numeric constraint customerID_FK foreign key references customers(customerID)
+on delete cascade
+on update cascade)
+end
+
+if object_id(N'dbo.DeliveryDetails', 'U') is null
+begin 
+create table DeliveryDetails
+(
+deliveryDetailID numeric identity(1,1) constraint deliveryDetailID_PK primary key,
+quantity numeric default 1,
+expectedDate date,
+actualDate datetime2,
+variantID numeric constraint variantID_FK_delivery foreign key references productVariants(variantID),
+deliveryID numeric constraint deliveryID_FK foreign key references deliveries(deliveryID)
+on update cascade
+on delete cascade)
+end
+
+*/
\ No newline at end of file
@@ -0,0 +1,100 @@
+-- barcode lookups when receiving deliveries
+if not exists (select 1 from sys.indexes where name = N'IX_ProductVariants_barcode' and object_id = object_id(N'dbo.ProductVariants'))
+begin
+	create index IX_ProductVariants_barcode on ProductVariants (barcode);
+end
+go
+
+-- carts are read and rewritten by cartKey
+if not exists (select 1 from sys.indexes where name = N'IX_Cart_cartKey' and object_id = object_id(N'dbo.Cart'))
+begin
+	create index IX_Cart_cartKey on Cart (cartKey) include (productID, quantity, unitPrice, userID);
+end
+go
+
+-- sales history pages, newest first
+if not exists (select 1 from sys.indexes where name = N'IX_Sales_salesDate' and object_id = object_id(N'dbo.Sales'))
+begin
+	create index IX_Sales_salesDate on Sales (salesDate desc, salesID desc) include (userID, totalAmount);
+end
+go
+
+-- an employee's own sales history
+if not exists (select 1 from sys.indexes where name = N'IX_Sales_userID_salesDate' and object_id = object_id(N'dbo.Sales'))
+begin
+	create index IX_Sales_userID_salesDate on Sales (userID, salesDate desc, salesID desc) include (totalAmount);
+end
+go
+
+-- lines of a page of sales
+if not exists (select 1 from sys.indexes where name = N'IX_SalesDetails_salesID' and object_id = object_id(N'dbo.SalesDetails'))
+begin
+	create index IX_SalesDetails_salesID on SalesDetails (salesID) include (variantID, unitPrice);
+end
+go
+
+-- purchase order listings by status, newest first
+if not exists (select 1 from sys.indexes where name = N'IX_PurchaseOrders_orderStatus_orderDate' and object_id = object_id(N'dbo.PurchaseOrders'))
+begin
+	create index IX_PurchaseOrders_orderStatus_orderDate on PurchaseOrders (orderStatus, orderDate desc, orderID desc) include (statusDate, vendorID);
+end
+go
+
+-- unfiltered purchase order listings, newest first
+if not exists (select 1 from sys.indexes where name = N'IX_PurchaseOrders_orderDate' and object_id = object_id(N'dbo.PurchaseOrders'))
+begin
+	create index IX_PurchaseOrders_orderDate on PurchaseOrders (orderDate desc, orderID desc) include (orderStatus, statusDate, vendorID);
+end
+go
+
+-- purchase order listings per vendor
+if not exists (select 1 from sys.indexes where name = N'IX_PurchaseOrders_vendorID_orderDate' and object_id = object_id(N'dbo.PurchaseOrders'))
+begin
+	create index IX_PurchaseOrders_vendorID_orderDate on PurchaseOrders (vendorID, orderDate desc, orderID desc) include (orderStatus, statusDate);
+end
+go
+
+-- lines of a page of purchase orders
+if not exists (select 1 from sys.indexes where name = N'IX_PurchaseOrderDetails_orderID' and object_id = object_id(N'dbo.PurchaseOrderDetails'))
+begin
+	create index IX_PurchaseOrderDetails_orderID on PurchaseOrderDetails (orderID) include (variantID, orderQuantity, expectedDate);
+end
+go
+
+-- product identity lookups (name, size and category) on resolver misses
+if not exists (select 1 from sys.indexes where name = N'IX_Products_identity' and object_id = object_id(N'dbo.Products'))
+begin
+	create index IX_Products_identity on Products (productName, size, category) include (isActive, currentStock);
+end
+go
+
+-- available unit counts per product (catalog listings, stock levels, holds); filtered so sold
+-- and damaged units, most of the table over time, are not in it
+if not exists (select 1 from sys.indexes where name = N'IX_ProductVariants_available' and object_id = object_id(N'dbo.ProductVariants'))
+begin
+	create index IX_ProductVariants_available on ProductVariants (productID) include (warehouseID) where isAvailable = 1;
+end
+go
+
+-- every variant of a product, available or not (cascades and variant listings)
+if not exists (select 1 from sys.indexes where name = N'IX_ProductVariants_productID_isAvailable' and object_id = object_id(N'dbo.ProductVariants'))
+begin
+	create index IX_ProductVariants_productID_isAvailable on ProductVariants (productID, isAvailable) include (barcode, productCode);
+end
+go
+
+-- receiving resolves barcodes to the variant and its product
+if exists (select 1 from sys.indexes i where i.name = N'IX_ProductVariants_barcode' and i.object_id = object_id(N'dbo.ProductVariants')
+		   and not exists (select 1 from sys.index_columns ic where ic.object_id = i.object_id and ic.index_id = i.index_id and ic.is_included_column = 1))
+begin
+	create index IX_ProductVariants_barcode on ProductVariants (barcode) include (productID, isAvailable) with (drop_existing = on);
+end
+go
+
+-- active catalog per category (GetProductByCategory and the category listings), once image_path is narrowed
+if not exists (select 1 from sys.indexes where name = N'IX_Products_category_active' and object_id = object_id(N'dbo.Products'))
+	and exists (select 1 from sys.columns where object_id = object_id(N'dbo.Products') and name = N'image_path' and max_length between 1 and 500)
+begin
+	create index IX_Products_category_active on Products (category, isActive) include (productName, size, unitPrice, image_path);
+end
+go
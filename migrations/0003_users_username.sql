@@ -0,0 +1,14 @@
+-- usernames identify accounts at login; bulk provisioning checks them per row against this index.
+-- it is only made unique when the existing accounts have no duplicate usernames
+if not exists (select 1 from sys.indexes where name = N'UQ_Users_username' and object_id = object_id(N'dbo.Users'))
+	and not exists (select username from Users where username is not null group by username having count(*) > 1)
+begin
+	create unique index UQ_Users_username on Users (username) where username is not null;
+end
+go
+
+if not exists (select 1 from sys.indexes where name in (N'UQ_Users_username', N'IX_Users_username') and object_id = object_id(N'dbo.Users'))
+begin
+	create index IX_Users_username on Users (username);
+end
+go
@@ -0,0 +1,6 @@
+-- employee directory: active accounts in username order (keyset pages and username prefix search)
+if not exists (select 1 from sys.indexes where name = N'IX_Users_isDisabled_username' and object_id = object_id(N'dbo.Users'))
+begin
+	create index IX_Users_isDisabled_username on Users (isDisabled, username) include (firstName, lastName, userRole, createdAt, updatedAt);
+end
+go
@@ -0,0 +1,12 @@
+-- barcodes identify units; the unique index is what rejects a duplicate, the barcode index
+-- filter in the app only decides which lines ReceiveVariantsBulk probes under lock first.
+-- it replaces the plain barcode index, and is only created when no barcode is duplicated yet
+if not exists (select 1 from sys.indexes where name = N'UQ_ProductVariants_barcode' and object_id = object_id(N'dbo.ProductVariants'))
+	and not exists (select barcode from ProductVariants where barcode is not null group by barcode having count(*) > 1)
+begin
+	create unique index UQ_ProductVariants_barcode on ProductVariants (barcode) include (productID, isAvailable) where barcode is not null;
+
+	if exists (select 1 from sys.indexes where name = N'IX_ProductVariants_barcode' and object_id = object_id(N'dbo.ProductVariants'))
+		drop index IX_ProductVariants_barcode on ProductVariants;
+end
+go
@@ -0,0 +1,17 @@
+-- batched purchase orders waiting to be sent to the VMS. a row is written in the same
+-- transaction as its order and deleted once the VMS accepted the batch, so an order whose
+-- send failed is retried instead of being lost. nextAttemptAt doubles as the claim: a worker
+-- sending a row pushes it forward, so other workers skip it until the send is over.
+if object_id(N'dbo.PurchaseOrderOutbox', 'U') is null
+begin
+    create table PurchaseOrderOutbox (
+        orderID numeric constraint PK_orderID_outbox primary key
+            constraint FK_orderID_outbox foreign key references PurchaseOrders(orderID) on delete cascade,
+        payload nvarchar(max) not null,
+        attempts int not null constraint DF_attempts_outbox default 0,
+        lastError nvarchar(1000) null,
+        nextAttemptAt datetime2 not null constraint DF_nextAttemptAt_outbox default sysdatetime(),
+        createdAt datetime2 not null constraint DF_createdAt_outbox default sysdatetime()
+    )
+end
+go
@@ -0,0 +1,13 @@
+-- orders written by one flush are sent to the VMS as one batch under one idempotency key.
+-- a batch that failed is resent unchanged with its key, so the VMS can tell a resend from a
+-- new batch; rows written before this column get a batch of their own
+if col_length(N'dbo.PurchaseOrderOutbox', N'batchKey') is null
+begin
+    alter table PurchaseOrderOutbox add batchKey varchar(64) null;
+end
+go
+
+update PurchaseOrderOutbox
+set batchKey = concat('order-', cast(orderID as bigint))
+where batchKey is null;
+go
@@ -0,0 +1,66 @@
+-- change feed triggers: every insert, update and delete on Products, ProductVariants and
+-- PurchaseOrders adds one ChangeLog row per affected row, in the same transaction.
+-- statements on these tables must use output ... into (an output clause without into
+-- is not allowed on a table with triggers).
+
+create or alter trigger trg_Products_changeLog
+on Products
+after insert, update, delete
+as
+begin
+	set nocount on;
+
+	insert into ChangeLog (tableName, entityID, operation, data)
+	select 'Products', coalesce(i.productID, d.productID),
+		case when d.productID is null then 'I' when i.productID is null then 'D' else 'U' end,
+		case when i.productID is not null then
+			(select i.productID, i.productName, i.category, i.size, i.color, i.unitPrice, i.currentStock,
+				i.reorderLevel, i.minStockLevel, i.maxStockLevel, i.isActive, i.warehouseID
+			 for json path, without_array_wrapper)
+		end
+	from inserted as i
+	full outer join deleted as d
+		on d.productID = i.productID;
+end;
+go
+
+create or alter trigger trg_ProductVariants_changeLog
+on ProductVariants
+after insert, update, delete
+as
+begin
+	set nocount on;
+
+	insert into ChangeLog (tableName, entityID, operation, data)
+	select 'ProductVariants', coalesce(i.variantID, d.variantID),
+		case when d.variantID is null then 'I' when i.variantID is null then 'D' else 'U' end,
+		case when i.variantID is not null then
+			(select i.variantID, i.productID, i.barcode, i.productCode, i.isAvailable,
+				i.isDamaged, i.isWrongItem, i.isReturned
+			 for json path, without_array_wrapper)
+		end
+	from inserted as i
+	full outer join deleted as d
+		on d.variantID = i.variantID;
+end;
+go
+
+create or alter trigger trg_PurchaseOrders_changeLog
+on PurchaseOrders
+after insert, update, delete
+as
+begin
+	set nocount on;
+
+	insert into ChangeLog (tableName, entityID, operation, data)
+	select 'PurchaseOrders', coalesce(i.orderID, d.orderID),
+		case when d.orderID is null then 'I' when i.orderID is null then 'D' else 'U' end,
+		case when i.orderID is not null then
+			(select i.orderID, i.orderDate, i.orderStatus, i.statusDate, i.vendorID, i.userID
+			 for json path, without_array_wrapper)
+		end
+	from inserted as i
+	full outer join deleted as d
+		on d.orderID = i.orderID;
+end;
+go
@@ -0,0 +1,211 @@
+-- list of variants passed to CheckoutSale
+if type_id(N'dbo.VariantIDList') is null
+begin
+	create type VariantIDList as table (variantID numeric primary key);
+end
+go
+
+-- quantity per product passed to CheckoutCart
+if type_id(N'dbo.ProductQuantityList') is null
+begin
+	create type ProductQuantityList as table (productID numeric primary key, quantity int not null);
+end
+go
+
+-- records a sale for variants that were already claimed (isAvailable = 0)
+-- runs inside the caller's transaction and returns the sale through its output parameters.
+-- the caller rolls the sale up once it committed (TryApplySalesRollup)
+create or alter procedure RecordSale
+	@userID numeric,
+	@claimed VariantIDList readonly,
+	@salesID numeric = null output,
+	@totalAmount numeric(18, 2) = null output
+as
+begin
+	set nocount on;
+
+	declare @TempSalesID table (salesID numeric) -- temporary table to capture output
+	declare @lines table (variantID numeric primary key, productID numeric, unitPrice numeric(18, 2));
+
+	insert into @lines (variantID, productID, unitPrice)
+	select pv.variantID, pv.productID, p.unitPrice
+	from @claimed as c
+	inner join ProductVariants as pv
+		on pv.variantID = c.variantID
+	inner join Products as p
+		on pv.productID = p.productID;
+
+	--------------
+	-- CREATE THE SALE WITH ITS TOTAL
+	--------------
+	insert into Sales (userID, totalAmount)
+	output inserted.salesID into @TempSalesID(salesID)
+	select @userID, isnull(sum(unitPrice), 0)
+	from @lines;
+
+	select @salesID = salesID from @TempSalesID;
+
+	insert into SalesDetails (salesID, variantID, unitPrice)
+	select @salesID, variantID, unitPrice
+	from @lines;
+
+	-- one stock decrement per product
+	update p
+	set p.currentStock = p.currentStock - d.quantity,
+		p.lastUpdated = getdate()
+	from Products as p
+	inner join (select productID, count(*) as quantity
+				from @lines
+				group by productID) as d
+		on p.productID = d.productID;
+
+	select @totalAmount = s.totalAmount
+	from Sales as s
+	where s.salesID = @salesID;
+end;
+go
+
+create or alter procedure CheckoutSale
+	@userID numeric,
+	@variantIDs VariantIDList readonly -- variants being sold
+as
+begin
+	set nocount on;
+	set xact_abort on;
+
+	declare @claimed VariantIDList;
+	declare @salesID numeric, @totalAmount numeric(18, 2);
+
+	begin transaction;
+
+	begin try
+		-- claim the listed variants that are still available
+		update pv
+		set pv.isAvailable = 0
+		output inserted.variantID into @claimed (variantID)
+		from ProductVariants as pv
+		inner join @variantIDs as v
+			on pv.variantID = v.variantID
+		where pv.isAvailable = 1;
+
+		if (select count(*) from @claimed) <> (select count(*) from @variantIDs)
+			throw 50001, 'One or more variants are no longer available.', 1;
+
+		exec RecordSale @userID = @userID, @claimed = @claimed,
+			@salesID = @salesID output, @totalAmount = @totalAmount output;
+
+		-- COMMIT THE TRANSACTION YEHEY
+		commit transaction;
+	end try
+
+	begin catch 
+		-- rollback transaction in case of error
+		if @@trancount > 0
+			rollback transaction;
+		throw;
+	end catch;
+
+	exec TryApplySalesRollup @salesID = @salesID;
+
+	select @salesID as salesID, @totalAmount as totalAmount;
+end;
+go
+
+-- checkout by product quantity: picks and claims the variants in one statement
+create or alter procedure CheckoutCart
+	@userID numeric,
+	@items ProductQuantityList readonly,
+	@idempotencyKey varchar(150) = null -- a repeated key returns the original sale without selling again
+as
+begin
+	set nocount on;
+	set xact_abort on;
+
+	declare @claimed VariantIDList;
+	declare @shortProductID numeric;
+	declare @message nvarchar(2048);
+	declare @existingSalesID numeric;
+	declare @salesID numeric, @totalAmount numeric(18, 2);
+
+	begin transaction;
+
+	begin try
+		--------------
+		-- REPLAY A REPEATED REQUEST
+		--------------
+		if @idempotencyKey is not null
+		begin
+			-- the range lock makes a concurrent retry wait for this checkout to finish
+			select @existingSalesID = salesID
+			from IdempotencyKeys with (updlock, holdlock)
+			where idempotencyKey = @idempotencyKey;
+
+			if @existingSalesID is not null
+			begin
+				commit transaction;
+				select s.salesID, s.totalAmount, cast(1 as bit) as replayed
+				from Sales as s
+				where s.salesID = @existingSalesID;
+				return;
+			end;
+		end;
+
+		--------------
+		-- CLAIM VARIANTS
+		--------------
+		-- readpast skips rows another checkout has locked, so concurrent terminals
+		-- claim different variants instead of waiting on or double-selling the same ones.
+		-- top (quantity) per product stops the seek on IX_ProductVariants_available after the
+		-- rows it claims, so only those stay locked until commit
+		update pv
+		set pv.isAvailable = 0
+		output inserted.variantID into @claimed (variantID)
+		from ProductVariants as pv
+		inner join (select picked.variantID
+					from @items as i
+					cross apply (select top (i.quantity) v.variantID
+								 from ProductVariants as v with (updlock, readpast, rowlock)
+								 where v.productID = i.productID and v.isAvailable = 1
+								 order by v.variantID) as picked) as c
+			on c.variantID = pv.variantID
+		where pv.isAvailable = 1;
+
+		select top 1 @shortProductID = i.productID
+		from @items as i
+		left join (select pv.productID, count(*) as claimed
+				   from @claimed as c
+				   inner join ProductVariants as pv
+					on pv.variantID = c.variantID
+				   group by pv.productID) as c
+			on c.productID = i.productID
+		where isnull(c.claimed, 0) < i.quantity;
+
+		if @shortProductID is not null
+		begin
+			set @message = concat('Not enough available variants for productID ', @shortProductID, '.');
+			throw 50002, @message, 1;
+		end;
+
+		exec RecordSale @userID = @userID, @claimed = @claimed,
+			@salesID = @salesID output, @totalAmount = @totalAmount output;
+
+		if @idempotencyKey is not null
+		begin
+			insert into IdempotencyKeys (idempotencyKey, userID, salesID)
+			values (@idempotencyKey, @userID, @salesID);
+		end;
+
+		commit transaction;
+	end try
+
+	begin catch
+		if @@trancount > 0
+			rollback transaction;
+		throw;
+	end catch;
+
+	exec TryApplySalesRollup @salesID = @salesID;
+
+	select @salesID as salesID, @totalAmount as totalAmount, cast(0 as bit) as replayed;
+end;
+go
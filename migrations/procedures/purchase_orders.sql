@@ -0,0 +1,138 @@
+create or alter procedure CreatePurchaseOrder
+	@productName varchar(255),
+	@size varchar(50),
+	@category varchar(100),
+	@quantity int,
+	@warehouseName varchar(100) = null,
+    @building varchar(100) = null,
+    @street varchar(100) = null,
+    @barangay varchar(100) = null,
+    @city varchar(100) = null,
+    @country varchar(100) = null,
+    @zipcode varchar(100) = null,
+	@userID int,
+	@warehouseID int = null, -- resolved by the caller's warehouse directory; the address is the fallback
+	@productID int = null -- resolved by the caller's product resolver; the name and category are the fallback
+
+as
+begin 
+	set nocount on;
+
+	declare @vendorID int, @vendorName varchar(255), @variantID int;
+	declare @orderID int, @orderDate datetime, @expectedDate datetime;
+	set @orderDate = GETDATE();
+	set @expectedDate = dateadd(day, 7, @orderDate);
+
+	-- a supplied productID comes from the caller's cache; ignore it if the product was renamed since
+	if @productID is not null
+		and not exists (select 1 from Products
+						where productID = @productID and productName = @productName
+							and size = @size and category = @category)
+		set @productID = null;
+
+	-- validate product existence and fetch productID 
+	if @productID is null
+		select top 1 @productID = productID
+		from products
+		where productName = @productName and category = @category;
+
+	if @productID is null
+	begin 
+		raiserror ('Product not found for the given name and category.', 16, 1);
+		return;
+	end;
+
+	-- fetch vendor
+	select top 1 @vendorID = vendorID, @vendorName = vendorName
+	from Vendors
+	where isActive = 1;
+
+	if @vendorID is null
+	begin 
+		raiserror ('No available product variant found for the given size.', 16, 1);
+		return;
+	end;
+	-- Fetch Product Variant
+    SELECT TOP 1 @variantID = variantID
+    FROM ProductVariants
+    WHERE productID = @productID and isAvailable = 1;
+
+    IF @variantID IS NULL
+    BEGIN
+        RAISERROR ('No available product variant found for the given size.', 16, 1);
+        RETURN;
+    END;
+
+    IF @warehouseID IS NOT NULL
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM Warehouses WHERE warehouseID = @warehouseID)
+            SET @warehouseID = NULL;
+    END
+    ELSE
+    BEGIN
+        -- Fetch Warehouse ID based on provided location details
+        SELECT TOP 1 @warehouseID = warehouseID
+        FROM Warehouses
+        WHERE warehouseName = @warehouseName
+            AND building = @building
+            AND street = @street
+            AND barangay = @barangay
+            AND city = @city
+            AND country = @country
+            AND zipcode = @zipcode;
+    END;
+
+    IF @warehouseID IS NULL
+    BEGIN
+        RAISERROR ('No warehouse found for the given details.', 16, 1);
+        RETURN;
+    END;
+
+	-- insert into PurchaseOrders table (output into, PurchaseOrders has a change log trigger)
+	declare @newOrder table (orderID numeric);
+	insert into PurchaseOrders (orderDate, orderStatus, statusDate, vendorID, userID)
+	output inserted.orderID into @newOrder (orderID)
+	values (@orderDate, 'Pending', GETDATE(), @vendorID, @userID);
+
+	select @orderID = orderID from @newOrder;
+
+	-- insert into PurchaseOrderDetails
+	insert into PurchaseOrderDetails (orderQuantity, expectedDate, warehouseID, orderID, variantID)
+	values (@quantity, @expectedDate, @warehouseID, @orderID, @variantID);
+
+	-- return orderID 
+	select @orderID as orderID;
+end;
+go
+
+-- ========================= addwarehouse
+create or alter procedure AddWarehouse
+	@warehouseName varchar(255),
+	@building varchar(255),
+	@street varchar(255),
+	@barangay varchar(255),
+	@city varchar(255),
+	@country varchar(255),
+	@zipcode varchar(25)
+as
+begin
+	set nocount on;
+
+	insert into Warehouses (warehouseName, building, street, barangay, city, country, zipcode)
+	output inserted.warehouseID
+	values (@warehouseName, @building, @street, @barangay, @city, @country, @zipcode);
+end;
+go
+-- sizes of a product for the purchase order form
+create or alter procedure GetProductSizes
+	@productName varchar(100)
+as
+begin
+	set nocount on;
+
+	select distinct size
+	from Products
+	where productName = @productName and isActive = 1
+	order by size;
+end;
+go
@@ -1,6 +1,6 @@
 
 -- get all product variants
-create view vw_all_variants
+create or alter view vw_all_variants
 as 
 select p.productName, pv.barcode, pv.productCode, 
 p.productDescription, p.size, p.color, p.unitPrice, p.warehouseID,
@@ -12,7 +12,7 @@ where p.isActive = 1 and pv.isAvailable = 1;
 go 
 
 -- get one product variant
-create procedure get_one_variant
+create or alter procedure get_one_variant
 @variantID numeric
 as
 begin
@@ -24,7 +24,7 @@ go
 
 
 -- get all products
-create procedure get_all_products
+create or alter procedure get_all_products
 as 
 select p.productName, p.productDescription,
 p.size, p.color, p.unitPrice, p.warehouseID,
@@ -38,11 +38,8 @@ group by p.productName, p.productDescription, p.size, p.color, p.unitPrice, p.wa
 order by p.productID;
 go
 
-exec get_all_products
-go
-
 -- get one product
-create procedure get_one_product
+create or alter procedure get_one_product
 @productID numeric
 as 
 select p.productName, p.productDescription,
@@ -58,70 +55,70 @@ go
 
 -- exec get_one_product @productID =? 
 
--- get sales history
-create procedure EmployeeSalesHistory
-@userID numeric
+-- get sales history (per day, read from the daily rollup); the dates are inclusive
+create or alter procedure EmployeeSalesHistory
+@userID numeric,
+@startDate date = null,
+@endDate date = null
 as
 begin
-select p.productName, p.category, p.size,
-count(sd.salesdetailID) as totalQuantitySold,
-format(count(sd.salesdetailID) * p.unitPrice, 'N', 'en-US') as totalAmount,
-s.salesDate
-from Sales as s 
-inner join SalesDetails as sd
-on s.salesID = sd.salesID
-inner join ProductVariants as pv
-on sd.variantID = pv.variantID
-inner join Products as p
-on pv.productID = p.productID
-where s.userID = 7
-group by p.productname, p.category, p.size, s.salesDate, p.unitPrice
-order by s.salesDate desc
+set nocount on;
+select r.productName, r.category, r.size,
+r.quantity as totalQuantitySold,
+r.amount as totalAmount,
+cast(r.salesDay as datetime) as salesDate
+from SalesRollupDaily as r
+where r.userID = @userID
+and (@startDate is null or r.salesDay >= @startDate)
+and (@endDate is null or r.salesDay <= @endDate)
+order by r.salesDay desc, r.productName
+option (recompile)
+end
+go
+
+-- sales history for the admin (per day and product, read from the daily rollup); the dates are inclusive
+create or alter procedure SalesData
+@startDate date = null,
+@endDate date = null
+as
+begin
+set nocount on;
+select r.productName, r.category, r.size,
+sum(r.quantity) as totalQuantitySold,
+sum(r.amount) as totalAmount,
+cast(r.salesDay as datetime) as salesDate
+from SalesRollupDaily as r
+where (@startDate is null or r.salesDay >= @startDate)
+and (@endDate is null or r.salesDay <= @endDate)
+group by r.salesDay, r.productID, r.productName, r.category, r.size
+order by r.salesDay desc, r.productName
+option (recompile)
 end
 go
 
 
 -- get products per category for the dropdown in sales logic
-create procedure GetProductByCategory
+create or alter procedure GetProductByCategory
 	@category varchar(100) -- select category from dropdown
 as 
 begin
 	set nocount on;
 
-	if @category = 'All Categories'
-	begin
-		-- fetch all available products
-		select p.productName, p.size, p.unitPrice,
-		cast(p.image_path as varchar(max)) as image_path
-		from Products as p
-		left join ProductVariants as pv
-			on p.productID = pv.productID
-		where p.isActive =1
-			and pv.isAvailable=1
-		group by p.productName, p.size, p.unitPrice, p.productID,
-				cast(p.image_path as varchar(max))
-		order by p.productID desc;
-	end
-	else 
-	begin
-		--fetch products by specific category
-		select p.productName, p.size, p.unitPrice,
-		cast(p.image_path as varchar(max)) as image_path
-		from Products as p
-		left join ProductVariants as pv
-			on p.productID = pv.productID
-		where p.isActive =1
-			and pv.isAvailable=1
-			and p.category = @category
-		group by p.productName, p.size, p.unitPrice, p.productID,
-				cast(p.image_path as varchar(max))
-		order by p.productID desc;
-	end
+	-- products with at least one available unit, newest first; 'All Categories' skips the filter
+	select p.productName, p.size, p.unitPrice, p.category, p.image_path
+	from Products as p
+	where p.isActive = 1
+		and (@category = 'All Categories' or p.category = @category)
+		and exists (select 1 from ProductVariants as pv
+					where pv.productID = p.productID and pv.isAvailable = 1)
+	order by p.productID desc
+	option (recompile);
+
 	set nocount off;
 end;
 go
 
-create procedure get_all_orderStatus
+create or alter procedure get_all_orderStatus
 as
 begin
 select p.productName, p.category, p.size,
@@ -140,7 +137,7 @@ order by po.orderDate desc
 end
 go
 
-create procedure get_orders_by_status
+create or alter procedure get_orders_by_status
 @orderStatus varchar(50)
 as
 begin
@@ -163,7 +160,7 @@ go
 
 
 
-create proc get_delivered_orders_with_orderid
+create or alter procedure get_delivered_orders_with_orderid
 as
 SELECT 
                 po.orderID,                       -- Include orderID
@@ -186,4 +183,4 @@ SELECT
                 po.orderStatus = 'Delivered'
             ORDER BY 
                 po.orderDate DESC
-			
\ No newline at end of file
+go
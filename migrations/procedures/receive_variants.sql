@@ -0,0 +1,182 @@
+create or alter procedure ReceiveVariantsBulk
+	@orderID numeric,
+	@variants nvarchar(max), -- json array of {productID, barcode, productCode, productName, category, size, probe}
+	@markDelivered bit = 1, -- streamed uploads mark the order themselves once the last batch is in
+	@uploadID varchar(100) = null, -- streamed uploads: checkpoint committed with the batch
+	@linesThrough int = null,
+	@deliverFrom nvarchar(max) = N'["To Ship"]' -- json array of the statuses an order may become Delivered from
+as
+begin
+	set nocount on;
+	set xact_abort on;
+
+	--------------
+	-- STAGE THE PAYLOAD
+	--------------
+	create table #incoming (
+		lineNumber int primary key,
+		barcode varchar(50),
+		productCode varchar(50),
+		productName varchar(100),
+		category varchar(50),
+		size varchar(20),
+		probe bit not null, -- 0 when the app's barcode filter has not seen the barcode (a hint, see below)
+		productID numeric null,
+		skipReason varchar(100) null
+	);
+
+	insert into #incoming (lineNumber, barcode, productCode, productName, category, size, probe, productID)
+	select cast(j.[key] as int), v.barcode, v.productCode, v.productName, v.category, v.size, isnull(v.probe, 1), v.productID
+	from openjson(@variants) as j
+	cross apply openjson(j.value) with (
+		barcode varchar(50),
+		productCode varchar(50),
+		productName varchar(100),
+		category varchar(50),
+		size varchar(20),
+		probe bit,
+		productID numeric
+	) as v;
+
+	create index IX_incoming_barcode on #incoming (barcode);
+
+	declare @warehouseID numeric = (select top 1 warehouseID
+									from PurchaseOrderDetails
+									where orderID = @orderID and warehouseID is not null
+									order by orderDetailID);
+
+	-- supplied productIDs come from the app's resolver cache; one whose product was renamed or
+	-- deactivated since is dropped and looked up by name like the lines without one
+	update i
+	set i.productID = null
+	from #incoming as i
+	where i.productID is not null
+		and not exists (select 1
+						from Products as p
+						where p.productID = i.productID
+							and p.productName = i.productName
+							and p.category = i.category
+							and p.size = i.size
+							and p.isActive = 1);
+
+	-- resolve the productIDs the caller did not supply with one join
+	update i
+	set i.productID = p.productID
+	from #incoming as i
+	cross apply (select top 1 productID
+				 from Products
+				 where productName = i.productName
+					and category = i.category
+					and size = i.size
+				 order by isActive desc, productID) as p
+	where i.productID is null;
+
+	-- lines the filter has not seen skip the locked probe only while the unique barcode index
+	-- is there to reject one inserted concurrently; without it every line is probed
+	if not exists (select 1 from sys.indexes
+				   where name = N'UQ_ProductVariants_barcode' and object_id = object_id(N'dbo.ProductVariants'))
+	begin
+		update #incoming set probe = 1;
+	end;
+
+	declare @attempt int = 1;
+
+retry:
+	begin transaction;
+
+	begin try
+		--------------
+		-- DEDUPE BARCODES
+		--------------
+		-- repeated within the payload, the first occurrence wins
+		with repeated as (
+			select skipReason,
+				row_number() over (partition by barcode order by lineNumber) as occurrence
+			from #incoming
+		)
+		update repeated
+		set skipReason = 'duplicate barcode in payload'
+		where occurrence > 1;
+
+		-- already received (locked so a concurrent delivery cannot insert it meanwhile)
+		-- probed lines only; the unique index catches the others
+		update i
+		set i.skipReason = 'barcode already exists'
+		from #incoming as i
+		where i.skipReason is null
+			and i.probe = 1
+			and exists (select 1
+						from ProductVariants as pv with (updlock, holdlock)
+						where pv.barcode = i.barcode);
+
+		update #incoming
+		set skipReason = 'product not found'
+		where skipReason is null
+			and productID is null;
+
+		--------------
+		-- INSERT VARIANTS AND APPLY STOCK DELTAS
+		--------------
+		-- units are stocked in the warehouse the order was placed for, else the product's own
+		insert into ProductVariants (barcode, productCode, isAvailable, productID, warehouseID)
+		select i.barcode, i.productCode, 1, i.productID, isnull(@warehouseID, p.warehouseID)
+		from #incoming as i
+		inner join Products as p
+			on p.productID = i.productID
+		where i.skipReason is null
+		order by i.lineNumber;
+
+		update p
+		set p.currentStock = isnull(p.currentStock, 0) + d.quantity,
+			p.lastUpdated = getdate()
+		from Products as p
+		inner join (select productID, count(*) as quantity
+					from #incoming
+					where skipReason is null
+					group by productID) as d
+			on p.productID = d.productID;
+
+		-- the order is delivered once every variant in it was received, if its status allows it
+		if @markDelivered = 1 and not exists (select 1 from #incoming where skipReason is not null)
+		begin
+			update PurchaseOrders
+			set orderStatus = 'Delivered',
+				statusDate = getdate()
+			where orderID = @orderID
+				and orderStatus in (select value from openjson(@deliverFrom));
+		end;
+
+		-- record streaming progress in the same transaction as the batch
+		if @uploadID is not null
+		begin
+			update ReceiveCheckpoints
+			set linesCommitted = @linesThrough,
+				received = received + (select count(*) from #incoming where skipReason is null),
+				skipped = skipped + (select count(*) from #incoming where skipReason is not null),
+				updatedAt = getdate()
+			where uploadID = @uploadID;
+		end;
+
+		commit transaction;
+	end try
+
+	begin catch
+		if @@trancount > 0 rollback transaction;
+
+		-- a barcode the filter had not seen was inserted by another transaction meanwhile:
+		-- run the batch again with every line probed, which skips it instead
+		if error_number() in (2601, 2627) and @attempt = 1
+		begin
+			set @attempt = 2;
+			update #incoming set probe = 1, skipReason = null;
+			goto retry;
+		end;
+		throw;
+	end catch;
+
+	-- per-variant outcome
+	select lineNumber, barcode, productID, skipReason
+	from #incoming
+	order by lineNumber;
+end;
+go
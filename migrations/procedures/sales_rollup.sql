@@ -0,0 +1,107 @@
+-- rolls sales up into SalesRollupHourly and SalesRollupDaily
+-- @salesID rolls up one sale (called after checkout through TryApplySalesRollup); null catches up a batch of pending sales
+create or alter procedure ApplySalesRollup
+	@salesID numeric = null,
+	@batchSize int = 5000
+as
+begin
+	set nocount on;
+	set xact_abort on;
+
+	declare @pending table (salesID numeric primary key);
+	declare @facts table (
+		salesHour datetime,
+		productID numeric,
+		userID numeric,
+		quantity int,
+		amount numeric(18, 2)
+	);
+
+	begin transaction;
+
+	begin try
+		-- claim the sales to roll up; readpast lets a catch-up run next to checkouts
+		update top (@batchSize) s
+		set s.isRolledUp = 1
+		output inserted.salesID into @pending (salesID)
+		from Sales as s with (readpast, updlock, rowlock)
+		where s.isRolledUp = 0
+			and (@salesID is null or s.salesID = @salesID);
+
+		insert into @facts (salesHour, productID, userID, quantity, amount)
+		select dateadd(hour, datediff(hour, 0, s.salesDate), 0), pv.productID, isnull(s.userID, 0),
+			count(*), sum(sd.unitPrice)
+		from @pending as pe
+		inner join Sales as s
+			on s.salesID = pe.salesID
+		inner join SalesDetails as sd
+			on sd.salesID = s.salesID
+		inner join ProductVariants as pv
+			on pv.variantID = sd.variantID
+		group by dateadd(hour, datediff(hour, 0, s.salesDate), 0), pv.productID, isnull(s.userID, 0);
+
+		merge SalesRollupHourly with (holdlock) as r
+		using (select f.salesHour, f.productID, f.userID, p.productName, p.category, p.size, f.quantity, f.amount
+			   from @facts as f
+			   inner join Products as p
+				on p.productID = f.productID) as f
+		on r.salesHour = f.salesHour and r.productID = f.productID and r.userID = f.userID
+		when matched then
+			update set r.quantity = r.quantity + f.quantity,
+				r.amount = r.amount + f.amount
+		when not matched then
+			insert (salesHour, productID, userID, productName, category, size, quantity, amount)
+			values (f.salesHour, f.productID, f.userID, f.productName, f.category, f.size, f.quantity, f.amount);
+
+		merge SalesRollupDaily with (holdlock) as r
+		using (select cast(f.salesHour as date) as salesDay, f.productID, f.userID,
+					p.productName, p.category, p.size, sum(f.quantity) as quantity, sum(f.amount) as amount
+			   from @facts as f
+			   inner join Products as p
+				on p.productID = f.productID
+			   group by cast(f.salesHour as date), f.productID, f.userID, p.productName, p.category, p.size) as f
+		on r.salesDay = f.salesDay and r.productID = f.productID and r.userID = f.userID
+		when matched then
+			update set r.quantity = r.quantity + f.quantity,
+				r.amount = r.amount + f.amount
+		when not matched then
+			insert (salesDay, productID, userID, productName, category, size, quantity, amount)
+			values (f.salesDay, f.productID, f.userID, f.productName, f.category, f.size, f.quantity, f.amount);
+
+		commit transaction;
+	end try
+
+	begin catch
+		if @@trancount > 0
+			rollback transaction;
+		throw;
+	end catch;
+
+	-- the checkout call must not add a result set to RecordSale's output
+	if @salesID is null
+		select count(*) as rolledUp from @pending;
+end;
+go
+
+-- rolls up a sale right after its checkout committed. the rollup rows are shared by every
+-- checkout in the same hour and day, so updating them inside the sale's transaction would
+-- queue concurrent checkouts behind each other, and a rollup error would undo the sale.
+-- here a rollup that fails, or waits more than a second for a lock, is left to the catch-up
+-- job in the sales router (the sale keeps isRolledUp = 0)
+create or alter procedure TryApplySalesRollup
+	@salesID numeric
+as
+begin
+	set nocount on;
+
+	begin try
+		set lock_timeout 1000;
+		exec ApplySalesRollup @salesID = @salesID;
+	end try
+	begin catch
+		-- left for the catch-up
+	end catch;
+
+	set lock_timeout -1;
+end;
+go
@@ -0,0 +1,54 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import asyncio
+import os
+from routers.auth import get_password_hash
+
+# bcrypt is cpu bound, so hashing runs in worker processes (defaults to one per core)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "0")) or os.cpu_count() or 1
+
+
+def hash_passwords(passwords):
+    return [get_password_hash(password) for password in passwords]
+
+
+'''
+password hashing off the event loop
+
+a hash takes long enough with bcrypt that hashing on the event loop stalls every other
+request of the worker. the pool is started on first use and spread over its processes, so
+provisioning many accounts scales with the number of cores.
+'''
+class PasswordHasher:
+    def __init__(self, workers=PASSWORD_HASH_WORKERS):
+        self.workers = workers
+        self.executor = None
+
+    def start(self):
+        if self.executor is None:
+            # spawned, not forked: the worker process has threads (db and event loop) a fork would copy
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self.executor
+
+    # hashes in the order of the passwords, one chunk per process
+    async def hash_many(self, passwords):
+        if not passwords:
+            return []
+        executor = self.start()
+        loop = asyncio.get_running_loop()
+        size = -(-len(passwords) // self.workers)
+        chunks = [passwords[i:i + size] for i in range(0, len(passwords), size)]
+        results = await asyncio.gather(*(loop.run_in_executor(executor, hash_passwords, chunk) for chunk in chunks))
+        return [hashed for chunk in results for hashed in chunk]
+
+    async def hash(self, password):
+        return (await self.hash_many([password]))[0]
+
+    def close(self):
+        executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# shared instance
+password_hasher = PasswordHasher()
@@ -0,0 +1,117 @@
+import asyncio
+import time
+import os
+import database
+
+# full reload interval, which also picks up renames made by other workers
+PRODUCT_RESOLVER_TTL_SECONDS = float(os.getenv("PRODUCT_RESOLVER_TTL_SECONDS", "300"))
+
+
+def product_key(name, size, category):
+    return tuple((value or "").strip().lower() for value in (name, size, category))
+
+
+'''
+product identity resolver
+
+maps a normalized (productName, size, category) to its productID in memory, so write paths
+do not look products up by free-text columns on every request. the map is loaded once,
+updated by this worker's writes and reloaded on a ttl; a miss falls back to one indexed
+query, so products created by another worker are still found.
+'''
+class ProductResolver:
+    def __init__(self, ttl_seconds=PRODUCT_RESOLVER_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.by_key = {}  # key -> (productID, isActive)
+        self.loaded_at = None
+        self.lock = asyncio.Lock()
+
+    def put(self, key, product_id, is_active):
+        current = self.by_key.get(key)
+        # the active product wins, then the oldest one (same order ReceiveVariantsBulk uses)
+        if current is None or (is_active, -product_id) > (current[1], -current[0]):
+            self.by_key[key] = (product_id, is_active)
+
+    async def load(self):
+        conn = await database.get_db_connection()
+        try:
+            cursor = await conn.cursor()
+            await cursor.execute('select productID, productName, size, category, isActive from Products')
+            rows = await cursor.fetchall()
+        finally:
+            await conn.close()
+
+        self.by_key = {}
+        for row in rows:
+            self.put(product_key(row[1], row[2], row[3]), int(row[0]), bool(row[4]))
+        self.loaded_at = time.monotonic()
+
+    async def ensure_loaded(self):
+        if self.loaded_at is not None and time.monotonic() - self.loaded_at < self.ttl_seconds:
+            return
+        async with self.lock:
+            if self.loaded_at is None or time.monotonic() - self.loaded_at >= self.ttl_seconds:
+                await self.load()
+
+    # productID for a name, size and category, or None. a cached id can be stale when another worker
+    # renamed the product, so writes keyed on it match the name, size and category in the same statement
+    # (and call forget when that matches nothing); verify=True checks a cached id first, for callers
+    # that act on the id without such a write
+    async def resolve(self, cursor, name, size, category, active_only=True, verify=False):
+        await self.ensure_loaded()
+        key = product_key(name, size, category)
+        found = self.by_key.get(key)
+        if found is not None and verify:
+            await cursor.execute(
+                '''select isActive from Products
+                where productID = ? and productName = ? and size = ? and category = ?''',
+                (found[0], name, size, category)
+            )
+            row = await cursor.fetchone()
+            found = (found[0], bool(row[0])) if row else None
+            if found is None:
+                self.by_key.pop(key, None)
+        if found is None or (active_only and not found[1]):
+            await cursor.execute(
+                '''select top 1 productID, isActive
+                from Products
+                where productName = ? and size = ? and category = ?
+                order by isActive desc, productID''',
+                (name, size, category)
+            )
+            row = await cursor.fetchone()
+            if row is None:
+                return None
+            found = (int(row[0]), bool(row[1]))
+            self.put(key, *found)
+        if active_only and not found[1]:
+            return None
+        return found[0]
+
+    # cached lookup only, for batch paths that fall back to sql themselves
+    def peek(self, name, size, category):
+        found = self.by_key.get(product_key(name, size, category))
+        return found[0] if found and found[1] else None
+
+    # a product was created in this worker
+    def remember(self, product_id, name, size, category, is_active=True):
+        self.put(product_key(name, size, category), int(product_id), is_active)
+
+    # a write keyed on a cached productID matched no row, the product changed elsewhere
+    def forget(self, name, size, category):
+        self.by_key.pop(product_key(name, size, category), None)
+
+    # a product's name, size or category changed; drop its old key
+    def rename(self, product_id, old, new):
+        key = product_key(*old)
+        if self.by_key.get(key, (None,))[0] == int(product_id):
+            del self.by_key[key]
+        self.remember(product_id, *new)
+
+    # several products changed at once; reload on the next lookup
+    def invalidate(self):
+        self.loaded_at = None
+
+
+# shared instance
+product_resolver = ProductResolver()
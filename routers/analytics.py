@@ -0,0 +1,205 @@
+from fastapi import APIRouter, HTTPException, Depends
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+import numpy as np
+import time as clock
+import os
+import database
+from routers.auth import role_required
+
+
+router = APIRouter(dependencies=[Depends(role_required(["admin"]))])
+
+# computed results are reused for this long per (window, topN)
+ANALYTICS_CACHE_SECONDS = float(os.getenv("ANALYTICS_CACHE_SECONDS", "300"))
+ANALYTICS_CACHE_SIZE = 64
+
+DEFAULT_WINDOW_DAYS = 30
+DEFAULT_TOP_N = 10
+
+# (startDate, endDate, topN) -> (computed at, result)
+analytics_cache = {}
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+'''
+vectorized aggregation (no database access)
+'''
+# facts: dict of equal-length arrays (productID, hourIndex, quantity, amount), one entry per
+# product and hour; hourIndex counts hours from a monday midnight
+# products: dict of arrays (productID, productName, category, size, onHand) for the catalog
+def compute_analytics(facts, products, top_n=DEFAULT_TOP_N):
+    product_ids = products["productID"]
+    n_products = len(product_ids)
+
+    # map each fact to its catalog row; facts for products no longer listed are dropped
+    if n_products:
+        order = np.argsort(product_ids)
+        position = np.clip(np.searchsorted(product_ids, facts["productID"], sorter=order), 0, n_products - 1)
+        known = product_ids[order[position]] == facts["productID"]
+        row = order[position[known]]
+    else:
+        known = np.zeros(len(facts["productID"]), dtype=bool)
+        row = np.zeros(0, dtype=np.int64)
+    quantity = facts["quantity"][known]
+    amount = facts["amount"][known]
+    hours = facts["hourIndex"][known]
+
+    sold = np.bincount(row, weights=quantity, minlength=n_products)
+    revenue = np.bincount(row, weights=amount, minlength=n_products)
+
+    # top sellers by units
+    top = np.argsort(-sold, kind="stable")[:top_n]
+    top = top[sold[top] > 0]
+    top_sellers = [
+        {
+            "productID": int(product_ids[i]),
+            "productName": products["productName"][i],
+            "category": products["category"][i],
+            "size": products["size"][i],
+            "unitsSold": int(sold[i]),
+            "revenue": round(float(revenue[i]), 2),
+        }
+        for i in top
+    ]
+
+    # sell-through: units sold over units sold plus units still on hand
+    on_hand = products["onHand"]
+    supplied = sold + on_hand
+    sell_through = np.divide(sold, supplied, out=np.zeros(n_products), where=supplied > 0)
+    sell_through_rates = [
+        {
+            "productID": int(product_ids[i]),
+            "productName": products["productName"][i],
+            "size": products["size"][i],
+            "unitsSold": int(sold[i]),
+            "onHand": int(on_hand[i]),
+            "sellThrough": round(float(sell_through[i]), 4),
+        }
+        for i in np.argsort(-sell_through, kind="stable")
+        if supplied[i] > 0
+    ]
+
+    # size curve: share of each size within a model (products sharing a name)
+    models, model_index = np.unique(products["productName"], return_inverse=True)
+    sizes, size_index = np.unique(products["size"], return_inverse=True)
+    curve = np.zeros((len(models), len(sizes)))
+    np.add.at(curve, (model_index, size_index), sold)
+    model_totals = curve.sum(axis=1, keepdims=True)
+    shares = np.divide(curve, model_totals, out=np.zeros_like(curve), where=model_totals > 0)
+    size_curve = {
+        str(models[m]): {str(sizes[s]): round(float(shares[m, s]), 4) for s in np.nonzero(curve[m])[0]}
+        for m in np.nonzero(model_totals[:, 0])[0]
+    }
+
+    # weekday x hour-of-day units
+    heatmap = np.zeros((7, 24))
+    np.add.at(heatmap, ((hours // 24) % 7, hours % 24), quantity)
+
+    return {
+        "unitsSold": int(sold.sum()),
+        "revenue": round(float(revenue.sum()), 2),
+        "topSellers": top_sellers,
+        "sellThrough": sell_through_rates,
+        "sizeCurve": size_curve,
+        "hourlyHeatmap": {WEEKDAYS[d]: heatmap[d].astype(np.int64).tolist() for d in range(7)},
+    }
+
+
+'''
+database access
+'''
+# stream the hourly sales facts of a window in batches into numpy arrays
+async def load_sales_facts(cursor, start, end, batch_size=50000):
+    await cursor.execute(
+        '''select r.productID, datediff(hour, '19700105', r.salesHour) as hourIndex,
+            sum(r.quantity) as quantity, sum(r.amount) as amount
+        from SalesRollupHourly as r
+        where r.salesHour >= ? and r.salesHour < ?
+        group by r.productID, r.salesHour''',
+        (start, end)
+    )
+    product_ids, hour_index, quantity, amount = [], [], [], []
+    while True:
+        rows = await cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        batch = np.array([(float(r[0]), r[1], r[2], float(r[3])) for r in rows], dtype=np.float64)
+        product_ids.append(batch[:, 0].astype(np.int64))
+        hour_index.append(batch[:, 1].astype(np.int64))
+        quantity.append(batch[:, 2])
+        amount.append(batch[:, 3])
+
+    def join(parts, dtype):
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=dtype)
+
+    return {
+        "productID": join(product_ids, np.int64),
+        "hourIndex": join(hour_index, np.int64),
+        "quantity": join(quantity, np.float64),
+        "amount": join(amount, np.float64),
+    }
+
+# active catalog with the units still on hand
+async def load_products(cursor):
+    await cursor.execute(
+        '''select p.productID, p.productName, p.category, p.size, count(pv.variantID) as onHand
+        from Products as p
+        left join ProductVariants as pv
+            on pv.productID = p.productID and pv.isAvailable = 1
+        where p.isActive = 1
+        group by p.productID, p.productName, p.category, p.size'''
+    )
+    rows = await cursor.fetchall()
+    return {
+        "productID": np.array([int(r[0]) for r in rows], dtype=np.int64),
+        "productName": np.array([r[1] or "" for r in rows], dtype=object),
+        "category": np.array([r[2] or "" for r in rows], dtype=object),
+        "size": np.array([r[3] or "" for r in rows], dtype=object),
+        "onHand": np.array([r[4] for r in rows], dtype=np.float64),
+    }
+
+async def get_analytics(start_date, end_date, top_n):
+    key = (start_date, end_date, top_n)
+    cached = analytics_cache.get(key)
+    if cached and clock.monotonic() - cached[0] < ANALYTICS_CACHE_SECONDS:
+        return cached[1]
+
+    conn = await database.get_db_connection()
+    cursor = await conn.cursor()
+    try:
+        start = datetime.combine(start_date, time.min)
+        end = datetime.combine(end_date + timedelta(days=1), time.min)
+        facts = await load_sales_facts(cursor, start, end)
+        products = await load_products(cursor)
+    finally:
+        await conn.close()
+
+    result = {"startDate": start_date.isoformat(), "endDate": end_date.isoformat(),
+              "generatedAt": datetime.now().isoformat(), **compute_analytics(facts, products, top_n)}
+
+    analytics_cache[key] = (clock.monotonic(), result)
+    while len(analytics_cache) > ANALYTICS_CACHE_SIZE:
+        analytics_cache.pop(next(iter(analytics_cache)))
+    return result
+
+
+'''
+endpoints
+'''
+# top sellers, sell-through, size curves and the weekday/hour heatmap for a date window
+@router.get('/sales')
+async def sales_analytics(startDate: Optional[date] = None, endDate: Optional[date] = None,
+                          topN: int = DEFAULT_TOP_N):
+    end_date = endDate or date.today()
+    start_date = startDate or end_date - timedelta(days=DEFAULT_WINDOW_DAYS - 1)
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="startDate must not be after endDate.")
+    if not 1 <= topN <= 100:
+        raise HTTPException(status_code=400, detail="topN must be between 1 and 100.")
+
+    try:
+        return await get_analytics(start_date, end_date, topN)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,141 @@
+from fastapi import APIRouter, HTTPException, Depends, Request, Header, Query
+from fastapi.responses import StreamingResponse
+from typing import Optional
+import asyncio
+import logging
+import json
+import database
+from change_feed import change_feed, ChangeTokenExpired, CHANGE_FEED_TABLES
+from routers.auth import get_current_active_user
+
+
+router = APIRouter(dependencies=[Depends(get_current_active_user)])
+
+CHANGE_PAGE_SIZE = 1000
+CHANGE_MAX_PAGE_SIZE = 5000
+# how often the change log is purged, and how often an idle stream sends a keep-alive
+CHANGE_LOG_PURGE_HOURS = 6
+STREAM_KEEPALIVE_SECONDS = 15
+
+
+def parse_tables(tables):
+    if not tables:
+        return None
+    names = [name.strip() for name in tables.split(",") if name.strip()]
+    unknown = [name for name in names if name not in CHANGE_FEED_TABLES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown tables: {', '.join(unknown)}")
+    return names
+
+
+@router.on_event('startup')
+async def start_change_log_purge():
+    async def purge():
+        while True:
+            try:
+                purged = await change_feed.purge()
+                if purged:
+                    logging.info(f"Purged {purged} change log rows.")
+            except Exception as e:
+                logging.error(f"error purging the change log: {e}")
+            await asyncio.sleep(CHANGE_LOG_PURGE_HOURS * 3600)
+    asyncio.create_task(purge())
+
+@router.on_event('shutdown')
+async def stop_change_feed():
+    await change_feed.stop()
+
+
+# changes after a token, oldest first; without since, returns the current token to start from.
+# pass nextToken back as since; 410 means the token is older than the retained log and the
+# client has to reload its lists
+@router.get('')
+async def get_changes(since: Optional[int] = None, tables: Optional[str] = None,
+                      limit: int = Query(CHANGE_PAGE_SIZE, ge=1, le=CHANGE_MAX_PAGE_SIZE)):
+    table_names = parse_tables(tables)
+    conn = await database.get_db_connection()
+    try:
+        cursor = await conn.cursor()
+        if since is None:
+            return {"changes": [], "nextToken": await change_feed.head(cursor), "hasMore": False}
+
+        await change_feed.check_token(cursor, since)
+        changes = await change_feed.read_changes(cursor, since, limit=limit, tables=table_names)
+        return {
+            "changes": changes,
+            "nextToken": changes[-1]["version"] if changes else since,
+            "hasMore": len(changes) == limit,
+        }
+    except ChangeTokenExpired as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"error reading changes: {e}")
+    finally:
+        await conn.close()
+
+def sse_event(event, data, event_id=None):
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines += [f"event: {event}", f"data: {json.dumps(data)}"]
+    return "\n".join(lines) + "\n\n"
+
+# server-sent events: catches up from since (or Last-Event-ID), then streams changes live.
+# a client that falls too far behind gets a resync event with its last token and should reconnect
+@router.get('/stream')
+async def stream_changes(request: Request, since: Optional[int] = None, tables: Optional[str] = None,
+                         last_event_id: Optional[str] = Header(None)):
+    table_names = parse_tables(tables)
+    if since is None and last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+
+    if since is not None:
+        conn = await database.get_db_connection()
+        try:
+            await change_feed.check_token(await conn.cursor(), since)
+        except ChangeTokenExpired as e:
+            raise HTTPException(status_code=410, detail=str(e))
+        finally:
+            await conn.close()
+
+    subscription = await change_feed.subscribe()
+
+    async def events():
+        token = since if since is not None else subscription.version
+        try:
+            # catch up from the log up to the version the live feed starts after
+            if token < subscription.version:
+                conn = await database.get_db_connection()
+                try:
+                    cursor = await conn.cursor()
+                    while token < subscription.version:
+                        changes = await change_feed.read_changes(
+                            cursor, token, until=subscription.version, limit=CHANGE_PAGE_SIZE, tables=table_names)
+                        for change in changes:
+                            yield sse_event("change", change, change["version"])
+                        if len(changes) < CHANGE_PAGE_SIZE:
+                            break
+                        token = changes[-1]["version"]
+                finally:
+                    await conn.close()
+                token = subscription.version
+            yield sse_event("ready", {"token": token})
+
+            while not await request.is_disconnected():
+                if subscription.overflowed:
+                    yield sse_event("resync", {"token": token})
+                    break
+                try:
+                    change = await asyncio.wait_for(subscription.queue.get(), timeout=STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if change["version"] <= token:
+                    continue
+                token = change["version"]
+                if table_names and change["table"] not in table_names:
+                    continue
+                yield sse_event("change", change, change["version"])
+        finally:
+            change_feed.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
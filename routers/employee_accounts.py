@@ -1,11 +1,29 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Query, status
 from pydantic import BaseModel
 from datetime import datetime
+from typing import List, Optional
+import time as clock
+import json
+import os
 import database
-from routers.auth import get_current_active_user, role_required, get_password_hash
+from routers.auth import get_current_active_user, role_required
+from password_hasher import password_hasher
 
 router = APIRouter()
 
+# accounts accepted by one bulk provisioning request
+EMPLOYEE_BULK_MAX = 1000
+
+# employee directory pages, keyset-paginated on (username, userID)
+DIRECTORY_PAGE_SIZE = 50
+DIRECTORY_MAX_PAGE_SIZE = 200
+# pages are cached for the admin screen and cleared by account changes made through this
+# worker; other workers' changes show up once the entry expires
+DIRECTORY_CACHE_SECONDS = float(os.getenv("DIRECTORY_CACHE_SECONDS", "60"))
+DIRECTORY_CACHE_SIZE = 256
+
+directory_cache = {}
+
 # pydantic model for crud for users
 class UserCreate(BaseModel):
     firstName: str
@@ -21,11 +39,18 @@ class UserUpdate(BaseModel):
     lastName: str | None = None
     password: str | None = None
 
+class BulkUserCreate(BaseModel):
+    users: List[UserCreate]
+
+
+@router.on_event('shutdown')
+async def stop_password_hasher():
+    password_hasher.close()
 
 # admin: create a new employee acc
 @router.post('/create', dependencies=[Depends(role_required(["admin"]))])
 async def create_user(user: UserCreate):
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await password_hasher.hash(user.password)
     conn = await database.get_db_connection()
     cursor =await conn.cursor()
     try:
@@ -37,24 +62,167 @@ async def create_user(user: UserCreate):
                               hashed_password
                               ))
         await conn.commit()
+        directory_cache.clear()
     finally:
         await cursor.close()
         await conn.close()
     return {'message': 'User created successfully!'}
 
-# admin: fetch all employee accts
+# admin: create many employee accts at once (onboarding a branch)
+# passwords are hashed in parallel and the accounts inserted with one statement. usernames that
+# already exist or repeat in the request are reported per row (by index) instead of failing the batch
+@router.post('/bulk-create', dependencies=[Depends(role_required(["admin"]))])
+async def bulk_create_users(payload: BulkUserCreate):
+    if not payload.users:
+        raise HTTPException(status_code=400, detail="No users to create.")
+    if len(payload.users) > EMPLOYEE_BULK_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {EMPLOYEE_BULK_MAX} users can be created per request.")
+
+    # usernames compare case-insensitively, like the database collation
+    conflicts, candidates, seen = [], [], set()
+    for index, user in enumerate(payload.users):
+        if user.username.lower() in seen:
+            conflicts.append({"index": index, "username": user.username, "detail": "Username appears more than once in the request."})
+        else:
+            seen.add(user.username.lower())
+            candidates.append((index, user))
+
+    # skip hashing for usernames that are already taken
+    conn = await database.get_db_connection()
+    try:
+        cursor = await conn.cursor()
+        await cursor.execute(
+            '''select u.username
+            from openjson(?) with (username varchar(50) '$') as j
+            inner join Users as u
+                on u.username = j.username''',
+            (json.dumps([user.username for _, user in candidates]),)
+        )
+        taken = {row[0].lower() for row in await cursor.fetchall()}
+    finally:
+        await conn.close()
+
+    new_users = []
+    for index, user in candidates:
+        if user.username.lower() in taken:
+            conflicts.append({"index": index, "username": user.username, "detail": "Username already exists."})
+        else:
+            new_users.append((index, user))
+
+    created = {}
+    if new_users:
+        hashed_passwords = await password_hasher.hash_many([user.password for _, user in new_users])
+        rows = json.dumps([
+            {"firstName": user.firstName, "lastName": user.lastName, "username": user.username, "userPassword": hashed}
+            for (_, user), hashed in zip(new_users, hashed_passwords)
+        ])
+
+        conn = await database.get_db_connection()
+        try:
+            cursor = await conn.cursor()
+            # the not exists check holds its range lock until the insert, so a username taken since
+            # the check above is reported as a conflict rather than inserted twice
+            await cursor.execute(
+                '''set nocount on;
+                declare @created table (userID numeric, username varchar(50));
+
+                insert into Users (firstName, lastName, username, userPassword, userRole)
+                output inserted.userID, inserted.username into @created
+                select j.firstName, j.lastName, j.username, j.userPassword, 'employee'
+                from openjson(?) with (
+                    firstName varchar(50),
+                    lastName varchar(50),
+                    username varchar(50),
+                    userPassword varchar(500)
+                ) as j
+                where not exists (select 1 from Users as u with (updlock, holdlock) where u.username = j.username);
+
+                select userID, username from @created;''',
+                (rows,)
+            )
+            created = {row[1].lower(): int(row[0]) for row in await cursor.fetchall()}
+            await conn.commit()
+            directory_cache.clear()
+        finally:
+            await conn.close()
+
+    results = []
+    for index, user in new_users:
+        if user.username.lower() in created:
+            results.append({"index": index, "username": user.username, "userID": created[user.username.lower()]})
+        else:
+            conflicts.append({"index": index, "username": user.username, "detail": "Username already exists."})
+
+    return {
+        'message': f'{len(results)} users created, {len(conflicts)} conflicts.',
+        'created': results,
+        'conflicts': sorted(conflicts, key=lambda conflict: conflict["index"]),
+    }
+
+def encode_directory_cursor(username, user_id):
+    return f"{username}_{int(user_id)}"
+
+def decode_directory_cursor(cursor):
+    try:
+        username, user_id = cursor.rsplit("_", 1)
+        return username, int(user_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+async def fetch_directory_page(cursor, limit, after=None, search=None, role=None):
+    # accounts without a username cannot sign in, and a null would not survive the cursor
+    conditions, params = ["u.isDisabled = 0", "u.username is not null"], []
+    if search:
+        # prefix match; like wildcards typed in the search box are matched literally
+        prefix = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_").replace("[", "\\[") + "%"
+        conditions.append("(u.username like ? escape '\\' or u.firstName like ? escape '\\' or u.lastName like ? escape '\\')")
+        params += [prefix, prefix, prefix]
+    if role:
+        conditions.append("u.userRole = ?")
+        params.append(role)
+    if after:
+        conditions.append("(u.username > ? or (u.username = ? and u.userID > ?))")
+        params += [after[0], after[0], after[1]]
+
+    await cursor.execute(
+        f'''select top (?) u.userID, u.firstName, u.lastName, u.username, u.userRole, u.createdAt, u.updatedAt
+        from Users as u
+        where {" and ".join(conditions)}
+        order by u.username, u.userID''',
+        (limit + 1, *params)
+    )
+    rows = await cursor.fetchall()
+
+    users = [{"userID": int(u[0]), "firstName": u[1], "lastName": u[2],
+              "username": u[3], "userRole": u[4], "createdAt": u[5], "updatedAt": u[6]}
+             for u in rows[:limit]]
+    next_cursor = encode_directory_cursor(users[-1]["username"], users[-1]["userID"]) if len(rows) > limit else None
+    return {"users": users, "nextCursor": next_cursor}
+
+# admin: employee directory, filtered by a name or username prefix and a role
+# pass nextCursor back as cursor for the next page
 @router.get('/list-employee-accounts', dependencies=[Depends(role_required(['admin']))])
-async def list_users():
+async def list_users(search: Optional[str] = Query(None, max_length=50), role: Optional[str] = None,
+                     cursor: Optional[str] = None,
+                     limit: int = Query(DIRECTORY_PAGE_SIZE, ge=1, le=DIRECTORY_MAX_PAGE_SIZE)):
+    after = decode_directory_cursor(cursor) if cursor else None
+    search = search.strip() if search else None
+    key = (search.lower() if search else None, role, after, limit)
+    cached = directory_cache.get(key)
+    if cached and clock.monotonic() - cached[0] < DIRECTORY_CACHE_SECONDS:
+        return cached[1]
+
     conn = await database.get_db_connection()
-    cursor = await conn.cursor()
-    await cursor.execute('''select userID, firstName, lastName, username, userRole, createdAt, updatedAt
-from users
-where isDisabled = 0 ''')
-    users = await cursor.fetchall()
-    await conn.close()
-    return [{"userID": u[0], "firstName": u[1], "lastName": u[2], 
-             "username": u[3], "userRole": u[4], "createdAt": u[5], "updatedAt": u[6]}
-             for u in users]
+    try:
+        db_cursor = await conn.cursor()
+        page = await fetch_directory_page(db_cursor, limit, after, search, role)
+    finally:
+        await conn.close()
+
+    directory_cache[key] = (clock.monotonic(), page)
+    while len(directory_cache) > DIRECTORY_CACHE_SIZE:
+        directory_cache.pop(next(iter(directory_cache)))
+    return page
 
 # admin: update an employee acc
 @router.put("/update/{user_id}", dependencies=[Depends(role_required(['admin']))])
@@ -71,7 +239,7 @@ async def update_user(user_id: int, user: UserUpdate):
         updates.append("lastName = ?")
         values.append(user.lastName)
     if user.password:
-        hashed_password = get_password_hash(user.password)
+        hashed_password = await password_hasher.hash(user.password)
         updates.append("userPassword = ?")
         values.append(hashed_password)
     updates.append("updatedAt = ?")
@@ -83,6 +251,7 @@ async def update_user(user_id: int, user: UserUpdate):
             await cursor.execute(f'''update Users set {', '.join(updates)} 
                                  where userID =? and isDisabled=0''', (*values,))
             await conn.commit()
+            directory_cache.clear()
         finally:
             await cursor.close()
             await conn.close()
@@ -99,6 +268,7 @@ async def delete_user(user_id: int):
                              isDisabled = 1
                              where userID = ?''',  (user_id,))
         await conn.commit()
+        directory_cache.clear()
     finally:
         await cursor.close()
         await conn.close()
@@ -120,7 +290,7 @@ async def update_self(user: UserUpdate, current_user=Depends(get_current_active_
         updates.append("lastName = ?")
         values.append(user.lastName)
     if user.password:
-        hashed_password = get_password_hash(user.password)
+        hashed_password = await password_hasher.hash(user.password)
         updates.append("userPassword = ?")
         values.append(hashed_password)
     updates.append('updatedAt = ?')
@@ -133,6 +303,7 @@ async def update_self(user: UserUpdate, current_user=Depends(get_current_active_
             await cursor.execute(f'''update users set {', '.join(updates)}
                                   where username =? and isDisabled =0''',(*values,))
             await conn.commit()
+            directory_cache.clear()
         finally:
             await cursor.close()
             await conn.close()
@@ -0,0 +1,272 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from datetime import datetime, timedelta
+from statistics import NormalDist
+from typing import Optional
+import numpy as np
+import asyncio
+import logging
+import json
+import os
+import database
+from routers.auth import role_required
+
+
+router = APIRouter(dependencies=[Depends(role_required(["admin"]))])
+
+# scheduled job settings (hours between runs, and whether the job writes the new levels)
+FORECAST_INTERVAL_HOURS = float(os.getenv("FORECAST_INTERVAL_HOURS", "24"))
+FORECAST_AUTO_APPLY = os.getenv("FORECAST_AUTO_APPLY", "false").lower() == "true"
+
+# default forecasting parameters
+DEFAULT_HISTORY_DAYS = 730
+DEFAULT_WINDOW_DAYS = 28
+DEFAULT_ALPHA = 0.2
+DEFAULT_SERVICE_LEVEL = 0.95
+DEFAULT_LEAD_TIME_DAYS = 7     # matches the expectedDate offset used when creating POs
+DEFAULT_REVIEW_DAYS = 14
+
+# request bounds; the demand matrix is products x historyDays, so the history is capped
+MAX_HISTORY_DAYS = 3650
+MAX_WINDOW_DAYS = 365
+MAX_LEAD_TIME_DAYS = 365
+MAX_REVIEW_DAYS = 365
+
+# latest proposal produced by the scheduled job
+latest_proposal = {"generatedAt": None, "applied": False, "proposals": []}
+
+
+'''
+vectorized forecasting helpers (no database access, used by the job and the benchmark)
+'''
+# build a (products x days) demand matrix from flat (product, day, quantity) arrays
+def build_demand_matrix(product_index, day_index, quantities, n_products, n_days):
+    demand = np.zeros((n_products, n_days), dtype=np.float64)
+    np.add.at(demand, (product_index, day_index), quantities)
+    return demand
+
+# forecast the daily demand of every product at once
+def forecast_daily_demand(demand, method="ema", window=DEFAULT_WINDOW_DAYS, alpha=DEFAULT_ALPHA):
+    n_days = demand.shape[1]
+    if n_days == 0:
+        return np.zeros(demand.shape[0])
+
+    if method == "sma":
+        window = max(1, min(window, n_days))
+        return demand[:, -window:].mean(axis=1)
+
+    if method == "ema":
+        # the recursive smoothing level unrolls into a weighted sum over the history,
+        # so the whole catalog is one matrix-vector product
+        ages = np.arange(n_days - 1, -1, -1)
+        weights = alpha * (1.0 - alpha) ** ages
+        weights[0] = (1.0 - alpha) ** (n_days - 1)  # the oldest day seeds the level
+        return demand @ weights
+
+    raise ValueError(f"Unknown forecasting method: {method}")
+
+# compute reorder and min stock levels from the demand matrix
+def compute_stock_levels(demand, forecast, window=DEFAULT_WINDOW_DAYS, service_level=DEFAULT_SERVICE_LEVEL,
+                         lead_time_days=DEFAULT_LEAD_TIME_DAYS, review_days=DEFAULT_REVIEW_DAYS):
+    window = max(1, min(window, demand.shape[1])) if demand.shape[1] else 1
+    sigma = demand[:, -window:].std(axis=1) if demand.shape[1] else np.zeros(demand.shape[0])
+    z = NormalDist().inv_cdf(service_level)
+
+    safety_stock = z * sigma * np.sqrt(lead_time_days)
+    reorder_level = np.ceil(forecast * lead_time_days + safety_stock)
+    # minStockLevel is the order-up-to level used by the stock webhook
+    min_stock_level = np.maximum(np.ceil(reorder_level + forecast * review_days), reorder_level)
+
+    return safety_stock, reorder_level.astype(np.int64), min_stock_level.astype(np.int64)
+
+
+'''
+database access
+'''
+# load daily unit sales per product (one product row per size) into numpy arrays
+async def load_sales_history(cursor, history_days, batch_size=50000):
+    start_date = (datetime.now() - timedelta(days=history_days)).date()
+
+    await cursor.execute(
+        '''select productID, currentStock, reorderLevel, minStockLevel
+        from Products
+        where isActive = 1
+        order by productID'''
+    )
+    product_rows = await cursor.fetchall()
+    product_ids = np.array([int(row[0]) for row in product_rows], dtype=np.int64)
+    current_stock = np.array([row[1] or 0 for row in product_rows], dtype=np.int64)
+    reorder_levels = np.array([row[2] or 0 for row in product_rows], dtype=np.int64)
+    min_stock_levels = np.array([row[3] or 0 for row in product_rows], dtype=np.int64)
+
+    await cursor.execute(
+        '''select pv.productID, datediff(day, ?, cast(s.salesDate as date)) as dayIndex, count(*) as quantity
+        from Sales as s
+        inner join SalesDetails as sd
+            on s.salesID = sd.salesID
+        inner join ProductVariants as pv
+            on sd.variantID = pv.variantID
+        where s.salesDate >= ?
+        group by pv.productID, datediff(day, ?, cast(s.salesDate as date))''',
+        (start_date, start_date, start_date)
+    )
+
+    sales_product, sales_day, sales_qty = [], [], []
+    while True:
+        rows = await cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        sales_product.append(np.array([int(row[0]) for row in rows], dtype=np.int64))
+        sales_day.append(np.array([row[1] for row in rows], dtype=np.int64))
+        sales_qty.append(np.array([row[2] for row in rows], dtype=np.float64))
+
+    n_days = history_days + 1
+    if sales_product:
+        sales_product = np.concatenate(sales_product)
+        sales_day = np.concatenate(sales_day)
+        sales_qty = np.concatenate(sales_qty)
+    else:
+        sales_product = np.zeros(0, dtype=np.int64)
+        sales_day = np.zeros(0, dtype=np.int64)
+        sales_qty = np.zeros(0, dtype=np.float64)
+
+    if len(product_ids) == 0:
+        return product_ids, current_stock, reorder_levels, min_stock_levels, np.zeros((0, n_days))
+
+    # map productIDs onto matrix rows, dropping sales of inactive products
+    position = np.clip(np.searchsorted(product_ids, sales_product), 0, len(product_ids) - 1)
+    known = (product_ids[position] == sales_product) & (sales_day >= 0) & (sales_day < n_days)
+
+    demand = build_demand_matrix(position[known], sales_day[known], sales_qty[known], len(product_ids), n_days)
+    return product_ids, current_stock, reorder_levels, min_stock_levels, demand
+
+# run the forecast over the whole catalog and return one proposal per product
+async def generate_proposals(cursor, method="ema", history_days=DEFAULT_HISTORY_DAYS,
+                             window=DEFAULT_WINDOW_DAYS, alpha=DEFAULT_ALPHA, service_level=DEFAULT_SERVICE_LEVEL,
+                             lead_time_days=DEFAULT_LEAD_TIME_DAYS, review_days=DEFAULT_REVIEW_DAYS):
+    product_ids, current_stock, reorder_levels, min_stock_levels, demand = await load_sales_history(cursor, history_days)
+
+    forecast = forecast_daily_demand(demand, method=method, window=window, alpha=alpha)
+    safety_stock, new_reorder, new_min_stock = compute_stock_levels(
+        demand, forecast, window=window, service_level=service_level,
+        lead_time_days=lead_time_days, review_days=review_days)
+
+    return [
+        {
+            "productID": int(product_ids[i]),
+            "currentStock": int(current_stock[i]),
+            "dailyDemand": round(float(forecast[i]), 3),
+            "safetyStock": round(float(safety_stock[i]), 2),
+            "reorderLevel": int(reorder_levels[i]),
+            "minStockLevel": int(min_stock_levels[i]),
+            "proposedReorderLevel": int(new_reorder[i]),
+            "proposedMinStockLevel": int(new_min_stock[i]),
+        }
+        for i in range(len(product_ids))
+    ]
+
+# write the proposed levels in one set-based update
+async def apply_proposals(cursor, proposals):
+    changed = [
+        {"productID": p["productID"], "reorderLevel": p["proposedReorderLevel"], "minStockLevel": p["proposedMinStockLevel"]}
+        for p in proposals
+        if p["proposedReorderLevel"] != p["reorderLevel"] or p["proposedMinStockLevel"] != p["minStockLevel"]
+    ]
+    if not changed:
+        return 0
+
+    await cursor.execute(
+        '''update p
+        set p.reorderLevel = j.reorderLevel,
+            p.minStockLevel = j.minStockLevel,
+            p.lastUpdated = getdate()
+        from Products as p
+        inner join openjson(?) with (productID numeric, reorderLevel int, minStockLevel int) as j
+            on p.productID = j.productID
+        where p.isActive = 1''',
+        (json.dumps(changed),)
+    )
+    return len(changed)
+
+
+'''
+scheduled job
+'''
+async def run_forecast_job(apply=FORECAST_AUTO_APPLY):
+    conn = await database.get_db_connection()
+    cursor = await conn.cursor()
+    try:
+        proposals = await generate_proposals(cursor)
+        applied = 0
+        if apply:
+            applied = await apply_proposals(cursor, proposals)
+            await conn.commit()
+
+        latest_proposal.update({
+            "generatedAt": datetime.now().isoformat(),
+            "applied": apply,
+            "proposals": proposals,
+        })
+        logging.info(f"Forecast job finished: {len(proposals)} products, {applied} reorder levels updated.")
+        return proposals, applied
+    finally:
+        await conn.close()
+
+async def forecast_job_loop():
+    while True:
+        try:
+            await run_forecast_job()
+        except Exception as e:
+            logging.error(f"Forecast job failed: {e}")
+        await asyncio.sleep(FORECAST_INTERVAL_HOURS * 3600)
+
+# start the scheduled job on app startup
+@router.on_event('startup')
+async def start_forecast_job():
+    if FORECAST_INTERVAL_HOURS > 0:
+        asyncio.create_task(forecast_job_loop())
+
+
+'''
+endpoints
+'''
+# propose reorder levels for the whole catalog (nothing is written)
+@router.get('/reorder-levels')
+async def propose_reorder_levels(method: str = "ema",
+                                 historyDays: int = Query(DEFAULT_HISTORY_DAYS, ge=1, le=MAX_HISTORY_DAYS),
+                                 window: int = Query(DEFAULT_WINDOW_DAYS, ge=1, le=MAX_WINDOW_DAYS),
+                                 alpha: float = DEFAULT_ALPHA, serviceLevel: float = DEFAULT_SERVICE_LEVEL,
+                                 leadTimeDays: int = Query(DEFAULT_LEAD_TIME_DAYS, ge=1, le=MAX_LEAD_TIME_DAYS),
+                                 reviewDays: int = Query(DEFAULT_REVIEW_DAYS, ge=1, le=MAX_REVIEW_DAYS),
+                                 productID: Optional[int] = None):
+    if method not in ("ema", "sma"):
+        raise HTTPException(status_code=400, detail="method must be 'ema' or 'sma'.")
+    if not 0 < alpha <= 1 or not 0.5 <= serviceLevel < 1:
+        raise HTTPException(status_code=400, detail="alpha must be in (0, 1] and serviceLevel in [0.5, 1).")
+
+    conn = await database.get_db_connection()
+    cursor = await conn.cursor()
+    try:
+        proposals = await generate_proposals(
+            cursor, method=method, history_days=historyDays, window=window, alpha=alpha,
+            service_level=serviceLevel, lead_time_days=leadTimeDays, review_days=reviewDays)
+        if productID is not None:
+            proposals = [p for p in proposals if p["productID"] == productID]
+        return {"proposals": proposals}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await conn.close()
+
+# recompute and apply reorder levels for the whole catalog
+@router.post('/reorder-levels/apply')
+async def apply_reorder_levels():
+    try:
+        proposals, applied = await run_forecast_job(apply=True)
+        return {"message": f"{applied} products updated.", "proposals": proposals}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# latest proposal from the scheduled job
+@router.get('/reorder-levels/latest')
+async def latest_reorder_levels():
+    return latest_proposal
@@ -1,6 +1,5 @@
 from fastapi import APIRouter, HTTPException, File, UploadFile, Depends
 from pydantic import BaseModel
-import httpx
 import random
 import string
 import os
@@ -9,6 +8,11 @@ from typing import Optional
 import logging
 from fastapi.staticfiles import StaticFiles 
 import database
+from vms_client import vms_client
+from stock_holds import hold_ledger
+from stock_push import stock_push
+from warehouse_directory import warehouse_directory
+from product_resolver import product_resolver
 from routers.auth import role_required, get_current_active_user
 
 # Directory for saving uploaded images
@@ -54,9 +58,9 @@ def generate_sku():
 
 router = APIRouter(dependencies=[Depends(role_required(["admin"]))])
 
-# webhook url ---------------------
+# webhook path on the vms ---------------------
 
-STOCK_WEBHOOK_URL = "http://127.0.0.1:8001/stock"
+STOCK_WEBHOOK_PATH = "/stock"
 
 # pydantic model for products 
 class Product(BaseModel):
@@ -147,14 +151,15 @@ class ADDSIZE(BaseModel):
 
 # function to trigger stock webhook
 async def trigger_stock_webhook(product_id: int, current_stock: int):
-    async with httpx.AsyncClient() as client:
-        try:
-            # Ensure currentStock is treated as an integer
-            payload = {"productID": product_id, "currentStock": int(current_stock)} 
-            response = await client.post(STOCK_WEBHOOK_URL, json=payload)
-            response.raise_for_status()  
-        except Exception as e:
-            print(f'Error sending stock webhook: {e}')
+    # stock changed, so cart holds re-read the available count and pos terminals get the new level
+    hold_ledger.invalidate([int(product_id)])
+    stock_push.notify([product_id])
+    try:
+        # Ensure currentStock is treated as an integer
+        payload = {"productID": int(product_id), "currentStock": int(current_stock)} 
+        await vms_client.post(STOCK_WEBHOOK_PATH, payload, attempts=2)
+    except Exception as e:
+        print(f'Error sending stock webhook: {e}')
 
 # create a new product with variants
 @router.post('/products')
@@ -166,11 +171,8 @@ async def add_product(product: Product):
         image_path = save_base64_image(product.image)
 
         # check if a product with the same details already exists
-        await cursor.execute('''select productID from Products
-                                where productname = ? and size=? and category=? 
-                                and isActive=1''',
-                             product.productName, product.size, product.category)
-        existing_product = await cursor.fetchone()
+        existing_product = await product_resolver.resolve(cursor, product.productName, product.size, product.category,
+                                                          verify=True)
 
         if existing_product:
             raise HTTPException(status_code=400, 
@@ -202,6 +204,7 @@ async def add_product(product: Product):
 
         if not product_id:
             raise HTTPException(status_code=500, detail='Failed to retrieve productID after insertion')
+        product_resolver.remember(product_id, product.productName, product.size, product.category)
 
         # insert multiple variants/quantity into productVariants table
         variants_data = [
@@ -209,8 +212,8 @@ async def add_product(product: Product):
             for _ in range(product.quantity)
         ]
         
-        await cursor.executemany(''' insert into ProductVariants (barcode, productCode, productID)
-                                      values (?, ?, ?);''', variants_data)
+        await cursor.executemany(''' insert into ProductVariants (barcode, productCode, productID, warehouseID)
+                                      select ?, ?, productID, warehouseID from Products where productID = ?;''', variants_data)
         await conn.commit()
 
         # trigger the stock webhook with the unitPrice converted to float
@@ -232,21 +235,34 @@ async def add_product_quantity(product: AddQuantity):
     cursor = await conn.cursor()
 
     try:
-        await cursor.execute(
-            ''' select productID, currentStock
-            from Products
-            where productName = ? and size = ? and category=? 
-            and isActive = 1''',
-            product.productName,
-            product.size,
-            product.category
-        )
-        product_row = await cursor.fetchone()
+        # update currentStock in Products table (incremented in place, so concurrent adds are not lost).
+        # the update also matches the name, size and category: a cached id of a product another worker
+        # renamed updates nothing, and is then forgotten and looked up again once
+        stock_row = None
+        for _ in range(2):
+            product_id = await product_resolver.resolve(cursor, product.productName, product.size, product.category)
+            if product_id is None:
+                break
+            await cursor.execute(
+                '''set nocount on;
+                declare @stock table (currentStock int);
 
-        if not product_row:
-            raise HTTPException(status_code=404, detail='Product not found.')
+                update Products
+                set currentStock = isnull(currentStock, 0) + ?
+                output inserted.currentStock into @stock (currentStock)
+                where productID = ? and productName = ? and size = ? and category = ? and isActive = 1;
 
-        product_id, current_stock = product_row
+                select currentStock from @stock;''',
+                product.quantity, product_id, product.productName, product.size, product.category
+            )
+            stock_row = await cursor.fetchone()
+            if stock_row:
+                break
+            product_resolver.forget(product.productName, product.size, product.category)
+
+        if not stock_row:
+            raise HTTPException(status_code=404, detail='Product not found.')
+        new_stock = stock_row[0]
 
         # add new variant to ProductVariants table 
         variants_data= [(
@@ -256,17 +272,10 @@ async def add_product_quantity(product: AddQuantity):
                  for _ in range(product.quantity)
                  ]
         await cursor.executemany(
-                    '''insert into ProductVariants (barcode, productCode, productID)
-                    values (?, ?, ?)''',
+                    '''insert into ProductVariants (barcode, productCode, productID, warehouseID)
+                    select ?, ?, productID, warehouseID from Products where productID = ?''',
                     variants_data
                 )
-        
-        # update currentStock in Products tabel
-        new_stock = current_stock + product.quantity
-        await cursor.execute(
-            '''update Products set currentStock = ? where productID =?''',
-            new_stock, product_id
-        )
 
         await conn.commit()
 
@@ -275,6 +284,9 @@ async def add_product_quantity(product: AddQuantity):
 
         return{'message': f'{product.quantity} quantities of {product.productName} added successfully.'}
     
+    except HTTPException:
+        await conn.rollback()
+        raise
     except Exception as e:
         await conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
@@ -287,37 +299,45 @@ async def update_product(productData: ProductUpdate):
     cursor = await conn.cursor()
 
     try:
-        # step 1: select the productID based on the given fields
-        await cursor.execute(
-            '''
-            select productID, productName, productDescription, size, category, unitPrice, minStockLevel, maxStockLevel, reorderLevel, threshold 
-            from Products 
-            where productName = ? AND productDescription = ? AND size = ? AND category = ? AND unitPrice = ? AND isActive = 1''',
-            productData.productName, productData.productDescription,productData.size, productData.category,float(productData.unitPrice))
-        
-        product_row = await cursor.fetchone()
-        if not product_row:
+        # step 1: resolve the productID from its name, size and category, and
+        # step 2: update the specific fields. the update also matches the old name, size and category,
+        # so a cached id of a product another worker renamed updates nothing and is looked up again once
+        updated = 0
+        for _ in range(2):
+            product_id = await product_resolver.resolve(cursor, productData.productName, productData.size, productData.category)
+            if product_id is None:
+                break
+            await cursor.execute('''update Products
+                                     set size = ?, minStockLevel = ?, maxStockLevel = ?,
+                                         reorderLevel = ?, threshold = ?
+                                     where productID = ? and productName = ? and size = ? and category = ?
+                                         and isActive = 1''',
+                                 productData.newSize,
+                                 productData.minStockLevel,
+                                 productData.maxStockLevel,
+                                 productData.reorderLevel,
+                                 productData.threshold,
+                                 product_id,
+                                 productData.productName,
+                                 productData.size,
+                                 productData.category)
+            updated = cursor.rowcount
+            if updated > 0:
+                break
+            product_resolver.forget(productData.productName, productData.size, productData.category)
+
+        if updated <= 0:
             raise HTTPException(
                 status_code=404,
-                detail=f"Product with name '{productData.productName}', description '{productData.productDescription}', "
-                       f"size '{productData.size}', category '{productData.category}', and unit price '{productData.unitPrice}' not found."
+                detail=f"Product with name '{productData.productName}', size '{productData.size}' "
+                       f"and category '{productData.category}' not found."
             )
-        
-        # extract the product ID
-        product_id = product_row[0]
-
-        # step 2: update the specific fields
-        await cursor.execute('''update Products
-                                 set size = ?, minStockLevel = ?, maxStockLevel = ?,
-                                     reorderLevel = ?, threshold = ?
-                                 where productID = ? AND isActive = 1''',
-                             productData.newSize,
-                             productData.minStockLevel,
-                             productData.maxStockLevel,
-                             productData.reorderLevel,
-                             productData.threshold,
-                             product_id)
         await conn.commit()
+        product_resolver.rename(
+            product_id,
+            (productData.productName, productData.size, productData.category),
+            (productData.productName, productData.newSize, productData.category)
+        )
 
         # step 3: return success message with updated data
         return {"message": f"Product with ID {product_id} updated successfully.",
@@ -329,6 +349,9 @@ async def update_product(productData: ProductUpdate):
                     "reorderLevel": productData.reorderLevel,
                     "threshold": productData.threshold
                 }}
+    except HTTPException:
+        await conn.rollback()
+        raise
     except Exception as e:
         await conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
@@ -378,6 +401,7 @@ async def add_size(product: ADDSIZE):
 
         if not product_id:
             raise HTTPException(status_code=500, detail='Failed to retrieve productID after insertion')
+        product_resolver.remember(product_id, product.productName, product.size, product.category)
         
         # step 5: insert multiple variants/quantity into productVariants table
         variants_data = [
@@ -385,8 +409,8 @@ async def add_size(product: ADDSIZE):
             for _ in range(product.quantity)
         ]
         await cursor.executemany(
-            '''INSERT INTO ProductVariants (barcode, productCode, productID)
-            values (?, ?, ?);''', variants_data )
+            '''INSERT INTO ProductVariants (barcode, productCode, productID, warehouseID)
+            select ?, ?, productID, warehouseID from Products where productID = ?;''', variants_data )
         await conn.commit()
 
         # step 6: trigger the stock webhook with the unitPrice converted to float
@@ -508,6 +532,7 @@ async def update_product_details(productData: ProductUpdates):
             where productID = ? AND isActive = 1''',
             productData.newProductName, productData.newProductDescription, productData.newCategory, float(productData.newUnitPrice), product_id)
         await conn.commit()
+        product_resolver.invalidate()
 
         # fetch the updated product 
         await cursor.execute(
@@ -531,27 +556,43 @@ async def update_product_details(productData: ProductUpdates):
     finally:
         await conn.close()
 
+# active products with their available unit count. the counts are aggregated once per product
+# from the filtered IX_ProductVariants_available index and joined back, instead of grouping
+# the join by every product column; products without available units are left out
+async def fetch_catalog(cursor, category=None, product_id=None):
+    conditions, params = ["p.isActive = 1"], []
+    if category is not None:
+        conditions.append("p.category = ?")
+        params.append(category)
+    if product_id is not None:
+        conditions.append("p.productID = ?")
+        params.append(product_id)
+
+    await cursor.execute(
+        f'''select p.productName, p.productDescription, p.category,
+p.size, p.unitPrice, p.image_path,
+a.available as 'available quantity', p.currentStock,
+p.reorderLevel, p.minStockLevel, p.maxStockLevel, p.threshold, p.warehouseID
+from Products as p
+inner join (select productID, count(*) as available
+            from ProductVariants
+            where isAvailable = 1
+            group by productID) as a
+on a.productID = p.productID
+where {" and ".join(conditions)}''',
+        params
+    )
+    products = await cursor.fetchall()
+    # map column names to row values
+    return [dict(zip([column[0] for column in cursor.description], row)) for row in products]
+
 # get all productss 
 @router.get("/products")
 async def get_products():
     conn = await database.get_db_connection()
     try: 
         async with conn.cursor() as cursor:
-            await cursor.execute('''
-select p.productName, p.productDescription,
-p.size, p.unitPrice,
-count(pv.variantID) as 'available quantity', p.currentStock,
-p.reorderLevel, p.minStockLevel, p.maxStockLevel, p.threshold,
-cast(p.image_path as varchar(max)) as image_path
-from products as p
-left join ProductVariants as pv
-on p.productID = pv.productID
-where p.isActive = 1 and pv.isAvailable =1
-group by p.productName, p.productDescription, p.size, p.unitPrice, p.warehouseID, p.reorderLevel, p.minStockLevel, p.maxStockLevel, p.currentStock, p.threshold, cast(p.image_path as varchar(max));
-''')
-            products = await cursor.fetchall()
-            # map column names to row values
-            return [dict(zip([column[0] for column in cursor.description], row)) for row in products]
+            return await fetch_catalog(cursor)
     finally: 
         await conn.close()
 
@@ -560,23 +601,9 @@ group by p.productName, p.productDescription, p.size, p.unitPrice, p.warehouseID
 @router.get("/products/Womens-Leather-Shoes")
 async def get_womens_products():
     conn = await database.get_db_connection()
-    cursor = await conn.cursor()
     try: 
-        await cursor.execute(
-            '''select p.productName, p.productDescription, p.category,
-p.size, p.unitPrice, cast(p.image_path as varchar(max)),
-count(pv.variantID) as 'available quantity', p.currentStock,
-p.reorderLevel, p.minStockLevel, p.maxStockLevel, p.threshold
-from products as p
-left join ProductVariants as pv
-on p.productID = pv.productID
-where p.isActive = 1 and pv.isAvailable =1  and p.category = 'Women''s Leather Shoes'
-group by p.productName, p.productDescription, p.category, p.size, p.unitPrice, p.warehouseID, p.reorderLevel, p.minStockLevel, p.maxStockLevel, p.currentStock, p.threshold, cast(p.image_path as varchar(max))
-'''
-        )
-        products = await cursor.fetchall()
-        # map column names to row values
-        return [dict(zip([column[0] for column in cursor.description], row)) for row in products]
+        async with conn.cursor() as cursor:
+            return await fetch_catalog(cursor, category="Women's Leather Shoes")
     finally: 
         await conn.close()
 
@@ -586,23 +613,9 @@ async def get_mens_products():
     logging.info("Received request for Men's Leather Shoes products")
 
     conn = await database.get_db_connection()
-    cursor = await conn.cursor()
     try: 
-        await cursor.execute(
-            '''select p.productName, p.productDescription, p.category,
-p.size, p.unitPrice, cast(p.image_path as varchar(max)) AS image_path,
-count(pv.variantID) as 'available quantity', p.currentStock,
-p.reorderLevel, p.minStockLevel, p.maxStockLevel, p.threshold
-from products as p
-left join ProductVariants as pv
-on p.productID = pv.productID
-where p.isActive = 1 and pv.isAvailable =1  and p.category = 'Men''s Leather Shoes'
-group by p.productName, p.productDescription, p.category, p.size, p.unitPrice, p.warehouseID, p.reorderLevel, p.minStockLevel, p.maxStockLevel, p.currentStock, p.threshold, cast(p.image_path as varchar(max))
-'''
-)
-        products = await cursor.fetchall()
-        # map column names to row values
-        return [dict(zip([column[0] for column in cursor.description], row)) for row in products]
+        async with conn.cursor() as cursor:
+            return await fetch_catalog(cursor, category="Men's Leather Shoes")
     finally: 
         await conn.close()
 
@@ -610,23 +623,9 @@ group by p.productName, p.productDescription, p.category, p.size, p.unitPrice, p
 @router.get("/products/Boys-Leather-Shoes") 
 async def get_boys_products():
     conn = await database.get_db_connection()
-    cursor = await conn.cursor()
     try: 
-        await cursor.execute(
-            '''select p.productName, p.productDescription, p.category,
-p.size, p.unitPrice, cast(p.image_path as varchar(max)),
-count(pv.variantID) as 'available quantity', p.currentStock,
-p.reorderLevel, p.minStockLevel, p.maxStockLevel, p.threshold
-from products as p
-left join ProductVariants as pv
-on p.productID = pv.productID
-where p.isActive = 1 and pv.isAvailable =1  and p.category = 'Boy''s Leather Shoes'
-group by p.productName, p.productDescription, p.category, p.size, p.unitPrice, p.warehouseID, p.reorderLevel, p.minStockLevel, p.maxStockLevel, p.currentStock, p.threshold, cast(p.image_path as varchar(max))
-'''
-)
-        products = await cursor.fetchall()
-        # map column names to row values
-        return [dict(zip([column[0] for column in cursor.description], row)) for row in products]
+        async with conn.cursor() as cursor:
+            return await fetch_catalog(cursor, category="Boy's Leather Shoes")
     finally: 
         await conn.close()
 
@@ -634,23 +633,9 @@ group by p.productName, p.productDescription, p.category, p.size, p.unitPrice, p
 @router.get("/products/Girls-Leather-Shoes")
 async def get_girls_products():
     conn = await database.get_db_connection()
-    cursor = await conn.cursor()
     try: 
-        await cursor.execute(
-            '''select p.productName, p.productDescription, p.category,
-p.size, p.unitPrice, cast(p.image_path as varchar(max)),
-count(pv.variantID) as 'available quantity', p.currentStock,
-p.reorderLevel, p.minStockLevel, p.maxStockLevel, p.threshold
-from products as p
-left join ProductVariants as pv
-on p.productID = pv.productID
-where p.isActive = 1 and pv.isAvailable =1  and p.category = 'Girl''s Leather Shoes'
-group by p.productName, p.productDescription, p.category, p.size, p.unitPrice, p.warehouseID, p.reorderLevel, p.minStockLevel, p.maxStockLevel, p.currentStock, p.threshold, cast(p.image_path as varchar(max))
-'''
-)
-        products = await cursor.fetchall()
-        # map column names to row values
-        return [dict(zip([column[0] for column in cursor.description], row)) for row in products]
+        async with conn.cursor() as cursor:
+            return await fetch_catalog(cursor, category="Girl's Leather Shoes")
     finally: 
         await conn.close()
 
@@ -658,22 +643,12 @@ group by p.productName, p.productDescription, p.category, p.size, p.unitPrice, p
 @router.get('/products/{product_id}')
 async def get_product(product_id: int):
     conn = await database.get_db_connection()
-    cursor = await conn.cursor()
     try:
-        await cursor.execute('''select p.productName, p.productDescription,
-p.size, p.unitPrice, cast(p.image_path as varchar(max)),
-p.reorderLevel, p.minStockLevel, p.maxStockLevel, p.warehouseID,
-count(pv.variantID) as 'available quantity'
-from products as p
-left join ProductVariants as pv
-on p.productID = pv.productID
-where p.productID = ? and p.isActive = 1 and pv.isAvailable =1
-group by p.productName, p.productDescription, p.size, p.color, p.unitPrice, p.warehouseID, p.reorderLevel, p.minStockLevel, p.maxStockLevel, cast(p.image_path as varchar(max))l''', (product_id,)
-)
-        product = await cursor.fetchone()
-        if not product:
+        async with conn.cursor() as cursor:
+            products = await fetch_catalog(cursor, product_id=product_id)
+        if not products:
             raise HTTPException(status_code=404, detail='product not found')
-        return dict(zip([column[0] for column in cursor.description], product))
+        return products[0]
     finally:
         await conn.close()
 
@@ -759,6 +734,7 @@ where productID = ? ''',
             product_id,
         )
             await conn.commit()
+            product_resolver.invalidate()
             return{'message': 'product updated successfully!'}
     except Exception as e:
         await conn.rollback()
@@ -830,3 +806,63 @@ async def delete_product_variant(variant_id: int):
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         await conn.close()
+
+# available units per warehouse, with the total across locations, read from the indexed vw_WarehouseStock view
+@router.get('/stock/warehouses')
+async def get_warehouse_stock(product_id: Optional[int] = None, category: Optional[str] = None,
+                              warehouse_id: Optional[int] = None):
+    conditions, params = ["p.isActive = 1"], []
+    if product_id is not None:
+        conditions.append("ws.productID = ?")
+        params.append(product_id)
+    if category:
+        conditions.append("p.category = ?")
+        params.append(category)
+    if warehouse_id is not None:
+        conditions.append("ws.warehouseID = ?")
+        params.append(warehouse_id)
+
+    conn = await database.get_db_connection()
+    try:
+        async with conn.cursor() as cursor:
+            await cursor.execute(
+                f'''select ws.productID, p.productName, p.category, p.size, ws.warehouseID, ws.available
+                from vw_WarehouseStock as ws with (noexpand)
+                inner join Products as p
+                    on p.productID = ws.productID
+                where {" and ".join(conditions)}
+                order by ws.productID, ws.warehouseID''',
+                params
+            )
+            rows = await cursor.fetchall()
+
+        products = {}
+        for row in rows:
+            product = products.setdefault(int(row[0]), {
+                "productID": int(row[0]),
+                "productName": row[1],
+                "category": row[2],
+                "size": row[3],
+                "available": 0,
+                "warehouses": [],
+            })
+            warehouse = await warehouse_directory.get(int(row[4])) if row[4] is not None else None
+            product["warehouses"].append({
+                "warehouseID": int(row[4]) if row[4] is not None else None,
+                "warehouseName": warehouse["warehouseName"] if warehouse else None,
+                "available": row[5],
+            })
+            product["available"] += row[5]
+        return {"products": list(products.values())}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching warehouse stock: {e}")
+    finally:
+        await conn.close()
+
+# warehouse directory (cached)
+@router.get('/warehouses')
+async def get_warehouse_directory():
+    try:
+        return {"warehouses": await warehouse_directory.all()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching warehouses: {e}")
@@ -0,0 +1,100 @@
+import json
+
+
+# legal purchase order status changes
+ORDER_TRANSITIONS = {
+    'Pending': {'Confirmed', 'Rejected'},
+    'Confirmed': {'To Ship', 'Rejected'},
+    'To Ship': {'Delivered'},
+    'Delivered': {'Received'},
+    'Rejected': set(),
+    'Received': set(),
+}
+
+
+'''
+purchase order state machine
+
+status changes are validated against the allowed transitions inside the update itself, so a
+batch of changes is one conditional set-based statement and an order that moved in between
+is reported instead of being overwritten.
+'''
+class OrderStateMachine:
+    def __init__(self, transitions=ORDER_TRANSITIONS):
+        self.transitions = transitions
+        self.allowed = [
+            {"fromStatus": from_status, "toStatus": to_status}
+            for from_status, targets in transitions.items()
+            for to_status in targets
+        ]
+
+    def is_status(self, status):
+        return status in self.transitions
+
+    def can_transition(self, from_status, to_status):
+        return to_status in self.transitions.get(from_status, ())
+
+    # statuses an order may move to to_status from, for status changes made inside procedures
+    def sources(self, to_status):
+        return sorted(status for status, targets in self.transitions.items() if to_status in targets)
+
+    # changes: {orderID: target status}; returns one result per order with
+    # result = changed | unchanged | invalid_transition | not_found
+    async def apply(self, cursor, changes):
+        await cursor.execute(
+            '''set nocount on;
+
+            declare @changes table (orderID numeric primary key, toStatus varchar(100));
+            insert into @changes (orderID, toStatus)
+            select j.orderID, j.toStatus
+            from openjson(?) with (orderID numeric, toStatus varchar(100)) as j;
+
+            declare @allowed table (fromStatus varchar(100), toStatus varchar(100));
+            insert into @allowed (fromStatus, toStatus)
+            select j.fromStatus, j.toStatus
+            from openjson(?) with (fromStatus varchar(100), toStatus varchar(100)) as j;
+
+            declare @changed table (orderID numeric primary key, fromStatus varchar(100));
+
+            update po
+            set po.orderStatus = c.toStatus,
+                po.statusDate = getdate()
+            output inserted.orderID, deleted.orderStatus into @changed (orderID, fromStatus)
+            from PurchaseOrders as po
+            inner join @changes as c
+                on c.orderID = po.orderID
+            inner join @allowed as a
+                on a.fromStatus = po.orderStatus and a.toStatus = c.toStatus;
+
+            select c.orderID, isnull(ch.fromStatus, po.orderStatus) as fromStatus, po.orderStatus,
+                case
+                    when ch.orderID is not null then 'changed'
+                    when po.orderID is null then 'not_found'
+                    when po.orderStatus = c.toStatus then 'unchanged'
+                    else 'invalid_transition'
+                end as result
+            from @changes as c
+            left join @changed as ch
+                on ch.orderID = c.orderID
+            left join PurchaseOrders as po
+                on po.orderID = c.orderID
+            order by c.orderID;''',
+            (
+                json.dumps([{"orderID": order_id, "toStatus": status} for order_id, status in changes.items()]),
+                json.dumps(self.allowed),
+            )
+        )
+        rows = await cursor.fetchall()
+        return [
+            {
+                "orderID": int(row[0]),
+                "fromStatus": row[1],
+                "status": row[2],
+                "result": row[3],
+            }
+            for row in rows
+        ]
+
+
+# shared instance
+order_states = OrderStateMachine()
@@ -0,0 +1,269 @@
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import json
+import uuid
+import database
+
+
+'''
+purchase order consolidation
+
+reorder demands raised while the window is open are merged per (vendor, warehouse)
+and written as multi-line purchase orders in one transaction when the window closes.
+
+the queued demands live in this worker's memory until then. they are flushed on shutdown,
+but a worker that dies mid-window drops them; nothing is ordered for those products until
+the next stock update for them, which raises the demand again while stock stays low.
+once written, an order also sits in PurchaseOrderOutbox until the VMS accepts it. the
+orders of one flush form a batch with its own key, sent as the Idempotency-Key; a failed
+batch stays there and is resent unchanged with the same key by the next flush (retried every
+retry_seconds, and on startup for batches an earlier worker could not send), so the VMS can
+drop a resend of a batch it already accepted.
+each order is placed by the user whose stock update opened its group in the window.
+'''
+class PurchaseOrderBatcher:
+    def __init__(self, window_seconds, send_batch, retry_seconds=60, claim_seconds=120):
+        self.window_seconds = window_seconds
+        self.send_batch = send_batch  # coroutine that delivers a batch payload and its idempotency key to the VMS
+        self.retry_seconds = retry_seconds
+        self.claim_seconds = claim_seconds  # how long other workers leave orders being sent alone
+        self.pending = {}  # (vendorID, warehouseID) -> {productID: line}
+        self.vendors = {}  # vendorID -> vendorName
+        self.users = {}  # (vendorID, warehouseID) -> userID placing the order
+        self.lock = asyncio.Lock()
+        self.flush_task = None
+
+    # queue a reorder demand; the same product raised twice in a window keeps the larger quantity
+    async def add(self, vendorID, vendorName, warehouseID, line, userID=None):
+        async with self.lock:
+            self.vendors[vendorID] = vendorName
+            if (vendorID, warehouseID) not in self.pending:
+                self.users[(vendorID, warehouseID)] = userID
+            lines = self.pending.setdefault((vendorID, warehouseID), {})
+            queued = lines.get(line["productID"])
+            if queued is None or line["quantity"] > queued["quantity"]:
+                lines[line["productID"]] = line
+
+            self.schedule_flush(self.window_seconds)
+
+    def schedule_flush(self, delay):
+        task = self.flush_task
+        # the running flush schedules its own retry, so it does not count as a scheduled one
+        if task is None or task.done() or task is asyncio.current_task():
+            self.flush_task = asyncio.create_task(self.flush_after(delay))
+
+    async def flush_after(self, delay):
+        await asyncio.sleep(delay)
+        try:
+            await self.flush()
+        except Exception as e:
+            logging.error(f"error flushing purchase order batch: {e}")
+
+    def snapshot(self):
+        return [
+            {
+                "vendorID": vendorID,
+                "vendorName": self.vendors.get(vendorID),
+                "warehouseID": warehouseID,
+                "userID": self.users.get((vendorID, warehouseID)),
+                "lines": list(lines.values()),
+            }
+            for (vendorID, warehouseID), lines in self.pending.items()
+        ]
+
+    # write all queued demands as purchase orders and send them to the VMS as one batch, after any unsent earlier batches
+    async def flush(self):
+        async with self.lock:
+            groups = self.snapshot()
+            self.pending = {}
+            self.users = {}
+
+        batches = []
+        if groups:
+            try:
+                batches.append(await self.write_orders(groups))
+            except Exception:
+                # nothing was committed, put the demands back for the next window
+                for group in groups:
+                    for line in group["lines"]:
+                        await self.add(group["vendorID"], group["vendorName"], group["warehouseID"], line,
+                                       group["userID"])
+                raise
+        unsent = await self.claim_unsent()
+        if unsent:
+            logging.info(f"Resending {len(unsent)} purchase order batches the VMS has not accepted yet.")
+        batches = unsent + batches
+
+        sent, responses = [], []
+        for number, (batch_key, orders) in enumerate(batches):
+            try:
+                responses.append(await self.send_batch({"orders": orders}, f"po-batch-{batch_key}"))
+            except Exception as e:
+                # the orders are committed; keep this batch and the ones not tried yet, and try again later
+                await self.release_unsent([batch for batch, _ in batches[number:]], e)
+                self.schedule_flush(self.retry_seconds)
+                raise
+            await self.mark_sent(batch_key)
+            sent += orders
+        if sent:
+            logging.info(f"Sent {len(sent)} consolidated purchase orders to VMS.")
+        return {"orders": sent, "responses": responses}
+
+    # batches in the outbox that no other worker is sending, claimed for this flush as (batchKey, orders).
+    # claims take an app lock, so a batch is always claimed whole
+    async def claim_unsent(self):
+        conn = await database.get_db_connection()
+        cursor = await conn.cursor()
+        try:
+            await cursor.execute(
+                '''set nocount on;
+                set xact_abort on;
+                begin transaction;
+
+                exec sp_getapplock @Resource = N'purchase_order_outbox', @LockMode = N'Exclusive',
+                    @LockOwner = N'Transaction';
+
+                declare @claimed table (orderID numeric, batchKey varchar(64), payload nvarchar(max));
+
+                update o
+                set o.nextAttemptAt = dateadd(second, ?, sysdatetime())
+                output inserted.orderID, inserted.batchKey, inserted.payload into @claimed (orderID, batchKey, payload)
+                from PurchaseOrderOutbox as o with (updlock, readpast)
+                where o.nextAttemptAt <= sysdatetime();
+
+                commit transaction;
+
+                select batchKey, payload from @claimed order by orderID;''',
+                (self.claim_seconds,)
+            )
+            rows = await cursor.fetchall()
+        finally:
+            await conn.close()
+
+        batches = {}
+        for row in rows:
+            batches.setdefault(row[0], []).append(json.loads(row[1]))
+        return list(batches.items())
+
+    async def mark_sent(self, batch_key):
+        conn = await database.get_db_connection()
+        cursor = await conn.cursor()
+        try:
+            await cursor.execute('delete from PurchaseOrderOutbox where batchKey = ?', (batch_key,))
+        finally:
+            await conn.close()
+
+    async def release_unsent(self, batch_keys, error):
+        conn = await database.get_db_connection()
+        cursor = await conn.cursor()
+        try:
+            await cursor.execute(
+                '''update PurchaseOrderOutbox
+                set attempts = attempts + 1,
+                    lastError = left(?, 1000),
+                    nextAttemptAt = sysdatetime()
+                where batchKey in (select value from openjson(?))''',
+                (str(error), json.dumps(batch_keys))
+            )
+        finally:
+            await conn.close()
+
+    # orders written but not accepted by the VMS yet, oldest first
+    async def unsent(self):
+        conn = await database.get_db_connection()
+        cursor = await conn.cursor()
+        try:
+            await cursor.execute(
+                '''select cast(orderID as int), batchKey, attempts, lastError, nextAttemptAt, createdAt
+                from PurchaseOrderOutbox
+                order by orderID''')
+            rows = await cursor.fetchall()
+        finally:
+            await conn.close()
+        return [
+            {"orderID": row[0], "batchKey": row[1], "attempts": row[2], "lastError": row[3],
+             "nextAttemptAt": row[4], "createdAt": row[5]}
+            for row in rows
+        ]
+
+    async def write_orders(self, groups):
+        order_date = datetime.now()
+        expected_date = order_date + timedelta(days=7)
+
+        batch_key = uuid.uuid4().hex
+        headers = [
+            {"groupKey": key, "vendorID": group["vendorID"], "userID": group["userID"]}
+            for key, group in enumerate(groups)
+        ]
+        lines = [
+            {"groupKey": key, "productID": line["productID"], "warehouseID": group["warehouseID"], "quantity": line["quantity"]}
+            for key, group in enumerate(groups)
+            for line in group["lines"]
+        ]
+
+        # what is sent to the VMS for each order, kept in the outbox until it is accepted
+        payloads = [
+            {
+                "groupKey": key,
+                "payload": {
+                    "vendorID": group["vendorID"],
+                    "vendorName": group["vendorName"],
+                    "warehouseID": group["warehouseID"],
+                    "userID": group["userID"],
+                    "orderDate": order_date.date().isoformat(),
+                    "expectedDate": expected_date.date().isoformat(),
+                    "lines": group["lines"],
+                },
+            }
+            for key, group in enumerate(groups)
+        ]
+
+        conn = await database.get_db_connection()
+        cursor = await conn.cursor()
+        try:
+            # merge on 1 = 0 always inserts, and unlike insert it can output the source groupKey
+            await cursor.execute(
+                '''set nocount on;
+                set xact_abort on;
+                begin transaction;
+
+                declare @orders table (groupKey int, orderID numeric);
+
+                merge PurchaseOrders as po
+                using (select groupKey, vendorID, userID
+                       from openjson(?) with (groupKey int, vendorID numeric, userID numeric)) as g
+                on 1 = 0
+                when not matched then
+                    insert (orderDate, orderStatus, statusDate, vendorID, userID)
+                    values (?, 'Pending', getdate(), g.vendorID, g.userID)
+                output g.groupKey, inserted.orderID into @orders (groupKey, orderID);
+
+                insert into PurchaseOrderDetails (orderQuantity, expectedDate, warehouseID, orderID, variantID)
+                select l.quantity, ?, l.warehouseID, o.orderID, v.variantID
+                from openjson(?) with (groupKey int, productID numeric, warehouseID numeric, quantity int) as l
+                inner join @orders as o
+                    on o.groupKey = l.groupKey
+                outer apply (select top 1 pv.variantID
+                             from ProductVariants as pv
+                             where pv.productID = l.productID
+                             order by pv.variantID desc) as v;
+
+                -- claimed by this flush until its send is over
+                insert into PurchaseOrderOutbox (orderID, batchKey, payload, nextAttemptAt)
+                select o.orderID, ?, json_modify(h.payload, '$.orderID', cast(o.orderID as int)), dateadd(second, ?, sysdatetime())
+                from @orders as o
+                inner join openjson(?) with (groupKey int, payload nvarchar(max) as json) as h
+                    on h.groupKey = o.groupKey;
+
+                commit transaction;
+
+                select groupKey, orderID from @orders;''',
+                (json.dumps(headers), order_date, expected_date, json.dumps(lines),
+                 batch_key, self.claim_seconds, json.dumps(payloads, default=str))
+            )
+            order_ids = {row[0]: int(row[1]) for row in await cursor.fetchall()}
+        finally:
+            await conn.close()
+
+        return batch_key, [{"orderID": order_ids[item["groupKey"]], **item["payload"]} for item in payloads]
@@ -0,0 +1,113 @@
+from fastapi import HTTPException
+from datetime import datetime, time, timedelta
+from routers.order_states import ORDER_TRANSITIONS
+
+
+ORDER_PAGE_SIZE = 50
+ORDER_MAX_PAGE_SIZE = 500
+
+ORDER_STATUSES = list(ORDER_TRANSITIONS)
+
+
+def normalize_order_status(status):
+    # the frontend sends "To-Ship" in urls
+    status = status.replace("-", " ")
+    if status not in ORDER_STATUSES:
+        raise HTTPException(status_code=400, detail="Invalid order status")
+    return status
+
+def encode_order_cursor(order_date, order_id):
+    return f"{order_date.isoformat()}_{int(order_id)}"
+
+def decode_order_cursor(cursor):
+    try:
+        order_date, order_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(order_date), int(order_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+'''
+purchase orders newest first, keyset-paginated on (orderDate, orderID)
+'''
+async def fetch_purchase_orders(cursor, limit=ORDER_PAGE_SIZE, after=None, order_status=None,
+                                vendor_id=None, start_date=None, end_date=None):
+    conditions, params = [], []
+    if order_status:
+        conditions.append("po.orderStatus = ?")
+        params.append(order_status)
+    if vendor_id is not None:
+        conditions.append("po.vendorID = ?")
+        params.append(vendor_id)
+    if start_date:
+        conditions.append("po.orderDate >= ?")
+        params.append(datetime.combine(start_date, time.min))
+    if end_date:
+        # the end date is inclusive
+        conditions.append("po.orderDate < ?")
+        params.append(datetime.combine(end_date + timedelta(days=1), time.min))
+    if after:
+        conditions.append("(po.orderDate < ? or (po.orderDate = ? and po.orderID < ?))")
+        params.extend([after[0], after[0], after[1]])
+    where = ("where " + " and ".join(conditions)) if conditions else ""
+
+    # one extra order tells whether there is a next page
+    await cursor.execute(
+        f'''with page as (
+            select top (?) po.orderID, po.orderDate, po.orderStatus, po.statusDate, po.vendorID
+            from PurchaseOrders as po
+            {where}
+            order by po.orderDate desc, po.orderID desc
+        )
+        select pg.orderID, pg.orderDate, pg.orderStatus, pg.statusDate, pg.vendorID, v.vendorName,
+            p.productID, p.productName, p.category, p.size, pod.orderQuantity,
+            pod.orderQuantity * p.unitPrice as totalPrice, pod.expectedDate
+        from page as pg
+        left join Vendors as v
+            on v.vendorID = pg.vendorID
+        left join PurchaseOrderDetails as pod
+            on pod.orderID = pg.orderID
+        left join ProductVariants as pv
+            on pv.variantID = pod.variantID
+        left join Products as p
+            on p.productID = pv.productID
+        order by pg.orderDate desc, pg.orderID desc, pod.orderDetailID''',
+        (limit + 1, *params)
+    )
+    rows = await cursor.fetchall()
+
+    orders = {}
+    for row in rows:
+        order = orders.get(row[0])
+        if order is None:
+            order = orders[row[0]] = {
+                "orderID": int(row[0]),
+                "orderDate": row[1],
+                "orderStatus": row[2],
+                "statusDate": row[3],
+                "vendorID": int(row[4]) if row[4] is not None else None,
+                "vendorName": row[5],
+                "totalPrice": 0.0,
+                "items": [],
+            }
+        if row[6] is None:
+            continue
+        total_price = float(row[11]) if row[11] is not None else None
+        order["items"].append({
+            "productID": int(row[6]),
+            "productName": row[7],
+            "category": row[8],
+            "size": row[9],
+            "quantity": int(row[10]) if row[10] is not None else None,
+            "totalPrice": total_price,
+            "expectedDate": row[12],
+        })
+        order["totalPrice"] += total_price or 0.0
+
+    page = list(orders.values())
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        if page[-1]["orderDate"] is not None:
+            next_cursor = encode_order_cursor(page[-1]["orderDate"], page[-1]["orderID"])
+    return {"orders": page, "nextCursor": next_cursor}
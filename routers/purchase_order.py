@@ -1,18 +1,25 @@
-from fastapi import APIRouter, HTTPException, Request, Depends
+from fastapi import APIRouter, HTTPException, Request, Depends, Query
 from pydantic import BaseModel 
 import httpx
 from datetime import datetime, date, timedelta
 from typing import Optional, List
 from decimal import Decimal
 import logging
+import os
 import database
+from vms_client import vms_client, VMSUnavailableError
 from routers.auth import role_required, get_current_active_user
+from warehouse_directory import warehouse_directory
+from product_resolver import product_resolver
+from routers.po_batching import PurchaseOrderBatcher
+from routers.po_queries import (fetch_purchase_orders, normalize_order_status, decode_order_cursor,
+                                ORDER_PAGE_SIZE, ORDER_MAX_PAGE_SIZE)
 
 
 router = APIRouter(dependencies=[Depends(role_required(["admin"]))])
 
-# base url for vms api
-VMS_BASE_URL = 'http://127.0.0.1:8001'
+# reorder demands raised by the stock webhook are consolidated for this many seconds (0 sends each PO immediately)
+PO_BATCH_WINDOW_SECONDS = float(os.getenv("PO_BATCH_WINDOW_SECONDS", "300"))
 
 # pydantic model for purchase order
 class PurchaseOrder(BaseModel):
@@ -29,24 +36,41 @@ class PurchaseOrder(BaseModel):
     expectedDate: Optional[datetime] = None
 
 
-# function to send purchase order to vms
-async def send_order_to_vms(payload: dict):
-    async with httpx.AsyncClient() as client:
-        try: 
-            response = await client.post(f"{VMS_BASE_URL}/vms/orders", json=payload)
-            response.raise_for_status()
-            return response.json()
-        except httpx.HTTPError as e:
-            logging.error(f"HTTP error sending order to VMS: {e}")
-            raise HTTPException(status_code=500, detail=f"Error sending order to VMS: {e}")
-        except ValueError as e:
-            logging.error(f"error parsing response from VMS: {e}")
-            raise HTTPException(
-                status_code=500, detail="Invalied response from VMS")
+# function to send purchase order to vms; the key lets the vms drop a retried order it already created
+async def send_order_to_vms(payload: dict, path: str = "/vms/orders", idempotency_key: Optional[str] = None):
+    try: 
+        return await vms_client.post(path, payload, idempotency_key=idempotency_key or f"po-{payload['orderID']}")
+    except (httpx.HTTPError, VMSUnavailableError) as e:
+        logging.error(f"HTTP error sending order to VMS: {e}")
+        raise HTTPException(status_code=500, detail=f"Error sending order to VMS: {e}")
+    except ValueError as e:
+        logging.error(f"error parsing response from VMS: {e}")
+        raise HTTPException(
+            status_code=500, detail="Invalied response from VMS")
+
+# function to send a batch of consolidated purchase orders to vms; the batcher keeps the key of each batch,
+# so a batch that is resent after a lost response carries the key it was first sent with
+async def send_order_batch_to_vms(payload: dict, idempotency_key: str):
+    return await send_order_to_vms(payload, path="/vms/orders/batch", idempotency_key=idempotency_key)
+
+po_batcher = PurchaseOrderBatcher(PO_BATCH_WINDOW_SECONDS, send_batch=send_order_batch_to_vms)
+
+# send orders an earlier worker wrote but could not deliver to the VMS
+@router.on_event('startup')
+async def resend_unsent_purchase_orders():
+    po_batcher.schedule_flush(0)
+
+# flush queued demands on shutdown so they are not lost
+@router.on_event('shutdown')
+async def flush_po_batches():
+    try:
+        await po_batcher.flush()
+    except Exception as e:
+        logging.error(f"error flushing purchase order batch on shutdown: {e}")
 
 # webhook to handle stock updates from IMS
 @router.post('/stock')
-async def stock_webhook(request: Request):
+async def stock_webhook(request: Request, current_user=Depends(get_current_active_user)):
     conn = None
     try:
         #parse payload from ims 
@@ -58,6 +82,10 @@ async def stock_webhook(request: Request):
 
         if productID is None or currentStock is None:
             raise HTTPException(status_code=400, detail='Invalid paylaod received')
+        try:
+            productID, currentStock = int(productID), int(currentStock)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail='productID and currentStock must be numbers')
         
         # check if the stock level requires a PO
         conn = await database.get_db_connection()
@@ -70,15 +98,15 @@ async def stock_webhook(request: Request):
        P.category,
        CAST(P.reorderLevel AS INT) AS reorderLevel,
        CAST(P.minStockLevel AS INT) AS minStockLevel,
-       CAST(P.warehouseID AS INT) AS warehouseID,
-       W.warehouseName
+       CAST(P.warehouseID AS INT) AS warehouseID
 FROM Products P
-INNER JOIN Warehouses W ON P.warehouseID = W.warehouseID
 WHERE P.productID = ? AND P.isActive = 1;
 ''',(productID,))
         product = await cursor.fetchone()
 
-        if not product:
+        # the warehouse name comes from the cached directory instead of a join
+        warehouse = await warehouse_directory.get(int(product[8])) if product and product[8] is not None else None
+        if not product or not warehouse:
             raise HTTPException(status_code=404, detail='Product not found')
         print ('fetched product raw: ', product)
         print("Length of product:", len(product))
@@ -93,11 +121,11 @@ WHERE P.productID = ? AND P.isActive = 1;
         reorderLevel = product[6]
         minStockLevel = product[7]
         warehouseID = product[8]
-        warehouseName = product[9]
+        warehouseName = warehouse["warehouseName"]
 
         # extract product details
         (productID, productName, productDescription, size, color, category, 
-         reorderLevel, minStockLevel, warehouseID, warehouseName) = (product)
+         reorderLevel, minStockLevel, warehouseID) = (product)
 
         # if stock is at or below the reorder level, generate PO
         if currentStock <= reorderLevel:
@@ -117,12 +145,34 @@ WHERE P.productID = ? AND P.isActive = 1;
 
                 vendorID, vendorName, building, street, barangay, city, country, zipcode = vendor
 
+                # consolidate with other demands for the same vendor and warehouse
+                if PO_BATCH_WINDOW_SECONDS > 0:
+                    line = {
+                        "productID": productID,
+                        "productName": productName,
+                        "productDescription": productDescription,
+                        "size": size,
+                        "color": color,
+                        "category": category,
+                        "quantity": quantity_to_order,
+                    }
+                    await po_batcher.add(int(vendorID), vendorName, warehouseID, line, current_user.userID)
+                    return {
+                        "message": "Stock update processed. Reorder demand queued for the next purchase order batch.",
+                        "payload": line,
+                    }
+
                 # insert into PurchaseOrders table
                 await cursor.execute(
-                    '''insert into PurchaseOrders (orderDate, orderStatus, statusDate, vendorID)
-                    output inserted.orderID
-                    values (?, ?, ?, ?)''',
-                    (orderDate, 'Pending', datetime.utcnow(), vendorID)
+                    '''set nocount on;
+                    declare @order table (orderID numeric);
+
+                    insert into PurchaseOrders (orderDate, orderStatus, statusDate, vendorID, userID)
+                    output inserted.orderID into @order (orderID)
+                    values (?, ?, ?, ?, ?);
+
+                    select orderID from @order;''',
+                    (orderDate, 'Pending', datetime.utcnow(), vendorID, current_user.userID)
                 )
                 order = await cursor.fetchone()
                 orderID = order[0] if order else None
@@ -168,6 +218,8 @@ WHERE P.productID = ? AND P.isActive = 1;
         else:
             return {"message": "Stock update processed. No purchase order required."}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"error processing stock webhook: {e}")
         raise HTTPException(status_code=500, detail=f"Error processing stock webhook: {e}")
@@ -189,24 +241,33 @@ def convert_decimal_to_json_compatible(data):
 # manual endpoint to create PO
 @router.post('/create-purchase-order')
 async def create_purchase_order(payload: dict):
+    conn = None
     try:
         # extract payload fields
         productName = payload.get('productName')
         size = payload.get('size')
         category = payload.get('category')
         quantity = payload.get('quantity')
+        warehouseID = payload.get('warehouseID')
         warehouseName = payload.get('warehouseName')
-        building = payload.get('building')
-        street = payload.get('street')
-        barangay = payload.get('barangay')
-        city = payload.get('city')
-        country = payload.get('country')
-        zipcode = payload.get('zipcode')
         userID = payload.get('userID')
 
         # validate the payload 
-        if not productName or not size or not category or not quantity or not warehouseName:
+        if not productName or not size or not category or not quantity or not (warehouseID or warehouseName):
             raise HTTPException(status_code=400, detail="Invalid payload. Missing required fields.")
+
+        # resolve the warehouse by id, or by name and address, through the cached directory
+        if warehouseID:
+            try:
+                warehouseID = int(warehouseID)
+            except (TypeError, ValueError):
+                raise HTTPException(status_code=400, detail="Invalid payload. warehouseID must be a number.")
+            warehouse = await warehouse_directory.get(warehouseID)
+            warehouseID = warehouse["warehouseID"] if warehouse else None
+        else:
+            warehouseID = await warehouse_directory.resolve(payload)
+        if warehouseID is None:
+            raise HTTPException(status_code=404, detail="No warehouse found for the given details.")
         
         conn = await database.get_db_connection()
         cursor = await conn.cursor()
@@ -214,10 +275,14 @@ async def create_purchase_order(payload: dict):
         # fetch color (use default value 'Black' if not provided)
         color = 'Black'
 
+        # the procedure falls back to a name lookup when the resolver does not know the product
+        productID = await product_resolver.resolve(cursor, productName, size, category)
+
         # execute stored procedure 
         await cursor.execute(
-            "EXEC CreatePurchaseOrder ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?",
-            (productName, size, category, quantity, warehouseName, building, street, barangay, city, country, zipcode, userID)
+            '''EXEC CreatePurchaseOrder @productName = ?, @size = ?, @category = ?, @quantity = ?,
+                @userID = ?, @warehouseID = ?, @productID = ?''',
+            (productName, size, category, quantity, userID, warehouseID, productID)
         )
         order = await cursor.fetchone()
 
@@ -290,30 +355,51 @@ async def create_purchase_order(payload: dict):
             "response": response,
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating purchase order: {str(e)}")
 
     finally:
-        await conn.close()
+        if conn:
+            await conn.close()
 
-# get all generated orders and their details
-@router.get('/purchase-orders', response_model=List[dict])
-async def get_purchase_orders():
+# reorder demands waiting for the current batch window, and written orders the VMS has not accepted yet
+@router.get('/batches/pending')
+async def get_pending_po_batches():
     try:
-        conn = await database.get_db_connection()
-        cursor = await conn.cursor()
-        await cursor.execute(
-            ''''''
-        )
-        rows = await cursor.fetchall()
-
-        # fetch column names
-        columns = [column[0] for column in cursor.description]
-
-        # convert rows to dictionary
-        purchase_orders = [dict(zip(columns, row)) for row in rows]
+        unsent = await po_batcher.unsent()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching unsent purchase orders: {e}")
+    return {"windowSeconds": PO_BATCH_WINDOW_SECONDS, "pending": po_batcher.snapshot(), "unsent": unsent}
 
-        return purchase_orders
+# close the current batch window now
+@router.post('/batches/flush')
+async def flush_pending_po_batches():
+    try:
+        result = await po_batcher.flush()
+        return {
+            "message": f"{len(result['orders'])} consolidated purchase orders created and sent to VMS.",
+            "orders": result["orders"],
+            "responses": result["responses"],
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error flushing purchase order batch: {e}")
+
+# list purchase orders with their lines, newest first; pass nextCursor back as cursor for the next page
+@router.get('/purchase-orders')
+async def get_purchase_orders(status: Optional[str] = None, vendor_id: Optional[int] = None,
+                              start_date: Optional[date] = None, end_date: Optional[date] = None,
+                              cursor: Optional[str] = None,
+                              limit: int = Query(ORDER_PAGE_SIZE, ge=1, le=ORDER_MAX_PAGE_SIZE)):
+    order_status = normalize_order_status(status) if status else None
+    after = decode_order_cursor(cursor) if cursor else None
+    conn = await database.get_db_connection()
+    try:
+        db_cursor = await conn.cursor()
+        return await fetch_purchase_orders(db_cursor, limit, after, order_status, vendor_id, start_date, end_date)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"error fetching purchase orders: {e}")
     finally:
@@ -421,18 +507,11 @@ async def get_product_sizes(product_name: str):
 @router.get('/dropdown-data/warehouses')
 async def get_warehouses():
     try:
-        conn = await database.get_db_connection()
-        cursor = await conn.cursor()
-        await cursor.execute(
-            '''SELECT warehouseName, 
-                   CONCAT(building, ', ', street, ', ', barangay, ', ', city, ', ', country, ', ', zipcode) AS fullAddress
-            FROM Warehouses'''
-        )
-        warehouses = [{"warehouseName": row[0], "fullAddress": row[1]} for row in await cursor.fetchall()]
+        warehouses = [
+            {"warehouseID": w["warehouseID"], "warehouseName": w["warehouseName"], "fullAddress": w["fullAddress"]}
+            for w in await warehouse_directory.all()
+        ]
         return {"warehouses": warehouses}
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching warehouses: {str(e)}")
-    
-    finally:
-        await conn.close()
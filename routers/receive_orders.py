@@ -1,12 +1,21 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import List
+from fastapi import APIRouter, HTTPException, Request, Query
+from starlette.requests import ClientDisconnect
+from pydantic import BaseModel, ValidationError
+from typing import List, Optional
 import logging
 import json
 from datetime import datetime
 import httpx
 import asyncio
 import database
+from vms_client import vms_client, VMSUnavailableError
+from barcode_index import barcode_index
+from stock_holds import hold_ledger
+from stock_push import stock_push
+from product_resolver import product_resolver
+from routers.order_states import order_states
+from routers.po_queries import (fetch_purchase_orders, normalize_order_status, decode_order_cursor,
+                                ORDER_PAGE_SIZE, ORDER_MAX_PAGE_SIZE)
 
 
 router = APIRouter()
@@ -26,98 +35,133 @@ class VariantPayload(BaseModel):
 class OrderID(BaseModel):
     order_id: int
 
+class OrderStatusChange(BaseModel):
+    orderID: int
+    orderStatus: str
 
-@router.post("/ims/orders/confirm")
-async def update_order_status(payload: dict):
-    conn = None
-    try:
+class OrderStatusBatch(BaseModel):
+    changes: List[OrderStatusChange]
+
+# most status changes accepted in one batch request
+ORDER_STATUS_BATCH_LIMIT = 1000
+
+
+# build the barcode index in the background so startup is not held up by it
+@router.on_event('startup')
+async def load_barcode_index():
+    async def load():
         conn = await database.get_db_connection()
-        cursor = await conn.cursor()
+        try:
+            cursor = await conn.cursor()
+            await barcode_index.load(cursor)
+            barcode_index.save_snapshot()
+        except Exception as e:
+            logging.error(f"error loading barcode index, receiving falls back to db checks: {e}")
+        finally:
+            if conn:
+                await conn.close()
+    asyncio.create_task(load())
+
+@router.on_event('shutdown')
+async def save_barcode_index():
+    try:
+        barcode_index.save_snapshot()
+    except Exception as e:
+        logging.error(f"error saving barcode index snapshot: {e}")
 
-        orderID = payload.get('orderID')
-        orderStatus = payload.get('orderStatus')
 
-        if not orderID or not orderStatus:
-            raise HTTPException(status_code=400, detail='Missing required fields.')
-        
-        # check if order exists in the IMS database
-        await cursor.execute(
-            '''select * from purchaseOrders
-              where orderID = ?''',
-              (orderID,)
+# status changes go through the order state machine, which rejects illegal transitions
+async def change_order_status(order_id, order_status):
+    if not order_states.is_status(order_status):
+        raise HTTPException(status_code=400, detail=f"Invalid order status: {order_status}")
+
+    conn = await database.get_db_connection()
+    try:
+        cursor = await conn.cursor()
+        result = (await order_states.apply(cursor, {int(order_id): order_status}))[0]
+    finally:
+        await conn.close()
+
+    if result["result"] == "not_found":
+        raise HTTPException(status_code=404, detail='Order not found in the IMS')
+    if result["result"] == "invalid_transition":
+        raise HTTPException(
+            status_code=400,
+            detail=f"Order {order_id} cannot move from {result['status']} to {order_status}."
         )
-        order_in_db = await cursor.fetchone()
+    return result
 
-        if not order_in_db:
-            raise HTTPException(status_code=404, detail='Order not found in the IMS')
-        
-        # update the order status in IMS db
-        await cursor.execute(
-            ''' update purchaseOrders 
-            set orderStatus = ?
-            where orderID = ? ''',
-            (orderStatus, orderID)
-        ) 
-        await conn.commit()
+@router.post("/ims/orders/confirm")
+async def confirm_order(payload: dict):
+    orderID = payload.get('orderID')
+    orderStatus = payload.get('orderStatus')
+
+    if not orderID or not orderStatus:
+        raise HTTPException(status_code=400, detail='Missing required fields.')
+
+    try:
+        await change_order_status(orderID, orderStatus)
         return {'message': 'order status updated', 'orderID': orderID, "status": orderStatus}
-    
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"error updating order status: {e}")
         raise HTTPException(status_code=500, detail=f"error processing order: {e}")
-    finally: 
-        if conn:
-            await conn.close()
 
 # ims 
 @router.post('/ims/orders/ToShip')
-async def update_order_status(payload: dict):
-    conn = None
-    try:
-        conn = await database.get_db_connection()
-        cursor = await conn.cursor()
-
-        orderID = payload.get("orderID")
-        orderStatus = payload.get("orderStatus")
-
-        if not orderID or not orderStatus:
-            raise HTTPException(status_code=400, detail='Missing required fields.')
-        
-        # check if the order exists in IMS db
-        await cursor.execute(
-            '''select * 
-            from purchaseOrders 
-            where orderID = ?''',
-            (orderID,)
-        )
-        order_in_db = await cursor.fetchone()
+async def ship_order(payload: dict):
+    orderID = payload.get("orderID")
+    orderStatus = payload.get("orderStatus")
 
-        if not order_in_db:
-            raise HTTPException(status_code=404, detail='order not found in IMS')
-        
-        # update order status in IMS db
-        await cursor.execute(
-            '''update purchaseOrders
-            set orderStatus = ?
-            where OrderID = CAST(? AS INT)
-            ''',
-            (orderStatus, orderID)
-        )
-        await conn.commit()
+    if not orderID or not orderStatus:
+        raise HTTPException(status_code=400, detail='Missing required fields.')
 
+    try:
+        await change_order_status(orderID, orderStatus)
         return {'message': 'Order status Updated', 'orderID': orderID, 'status': orderStatus}
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"error updated order status: {e}")
         raise HTTPException(status_code=500, detail=f"error processing order: {e}")
+
+# apply many status changes in one set-based update; each order is reported as
+# changed, unchanged, invalid_transition or not_found
+@router.post('/ims/orders/status-batch')
+async def update_order_statuses(batch: OrderStatusBatch):
+    if not batch.changes:
+        raise HTTPException(status_code=400, detail='No status changes.')
+    if len(batch.changes) > ORDER_STATUS_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f'At most {ORDER_STATUS_BATCH_LIMIT} status changes per request.')
+
+    invalid = sorted({change.orderStatus for change in batch.changes if not order_states.is_status(change.orderStatus)})
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid order status: {', '.join(invalid)}")
+
+    # a later change for the same order replaces an earlier one
+    changes = {change.orderID: change.orderStatus for change in batch.changes}
+
+    conn = await database.get_db_connection()
+    try:
+        cursor = await conn.cursor()
+        results = await order_states.apply(cursor, changes)
+        return {
+            "changed": sum(1 for result in results if result["result"] == "changed"),
+            "results": results,
+        }
+    except Exception as e:
+        logging.error(f"error updating order statuses: {e}")
+        raise HTTPException(status_code=500, detail=f"error processing orders: {e}")
     finally:
-        if conn: 
-            await conn.close()
+        await conn.close()
 
-# this works already
+# receive a delivery: staged and applied set-based by ReceiveVariantsBulk in one transaction
 @router.post('/ims/variants/receive')
 async def receive_variants(payload: VariantPayload):
     conn = None
     try:
-        logging.info(f"Received payload: {json.dumps(payload.dict(), default=str)}")
+        logging.info(f"Received {len(payload.variants)} variants for orderID: {payload.orderID}")
         
         if not payload.variants:
             raise HTTPException(status_code=400, detail='No product variants provided')
@@ -125,71 +169,14 @@ async def receive_variants(payload: VariantPayload):
         conn = await database.get_db_connection()
         cursor = await conn.cursor()
 
-        processed_variants = 0
-        for variant in payload.variants:
-            logging.info(f"Processign variant: {variant.barcode}")
-
-            # check barcode existence 
-            await cursor.execute(
-                '''select count(*)
-                from productVariants
-                where barcode =? ''',
-                (variant.barcode,)
-            )
-            barcode_exists = (await cursor.fetchone())[0]
-
-            if barcode_exists > 0:
-                logging.warning(f"barcode {variant.barcode} already exists. Skipping")
-                continue
+        result = await receive_variant_batch(cursor, payload.orderID, payload.variants)
 
-            # fetch productID 
-            await cursor.execute(
-                '''Select productID
-                from Products
-                where productName = ?
-                and category = ? 
-                and size = ?
-                ''',
-                (variant.productName, variant.category, variant.size)
-            )
-            product_id_row = await cursor.fetchone()
-            if not product_id_row:
-                logging.error(f"product not for variant: {variant.barcode}")
-                continue
-            product_id = product_id_row[0]
-
-            # insert into productVariants
-            logging.info(f'inserting variant: {variant.barcode}')
-            await cursor.execute(
-                '''insert into productVariants
-                (barcode, productCode, isAvailable, productID)
-                values (?, ?, ?, ?)''',
-                (variant.barcode, variant.productCode, 1, product_id)
-            )
-
-            #update stock
-            logging.info(f"UPdating stock for productID: {product_id}")
-            await cursor.execute(
-                '''update products
-                set currentstock = currentStock +1
-                where productID = ? ''',
-                (product_id,)
-            )
-            processed_variants += 1
-        
-        # update orderStatus if all variants are processed 
-        if processed_variants == len(payload.variants):
-            logging.info(f'Updating order status for orderID: {payload.orderID}')
-            await cursor.execute(
-                '''update purchaseOrders
-                set orderStatus = 'Delivered'
-                where orderID = ? ''',
-                (payload.orderID,)
-            )
-            await conn.commit()
-            return {'message': 'Variants received and saved successfully.', 'status': 'success'}
+        if not result["skipped"]:
+            return {'message': 'Variants received and saved successfully.', 'status': 'success', **result}
+        return {'message': f"{result['received']} variants received, {len(result['skipped'])} skipped.",
+                'status': 'partial', **result}
 
-    except Exception as e:
+    except HTTPException as e:
         logging.error(f"HTTP error occurred: {e.status_code} - {e.detail}")
         raise
     except Exception as e:
@@ -199,55 +186,207 @@ async def receive_variants(payload: VariantPayload):
         if conn:
             await conn.close()
 
+# insert a batch of variants with one procedure call and report why any were skipped
+async def receive_variant_batch(cursor, order_id, variants, mark_delivered=True, upload_id=None, lines_through=None):
+    # barcodes the filter has not seen skip the locked probe; the unique barcode index still
+    # rejects one inserted meanwhile, and the procedure then retries with every line probed
+    possible_duplicates = await barcode_index.possible_duplicates(cursor, [variant.barcode for variant in variants])
+    # products the resolver already knows skip the name lookup in the procedure
+    await product_resolver.ensure_loaded()
+    variants_json = json.dumps([
+        {
+            "productID": product_resolver.peek(variant.productName, variant.size, variant.category),
+            "barcode": variant.barcode,
+            "productCode": variant.productCode,
+            "productName": variant.productName,
+            "category": variant.category,
+            "size": variant.size,
+            "probe": 1 if variant.barcode in possible_duplicates else 0,
+        }
+        for variant in variants
+    ])
+    await cursor.execute(
+        '''exec ReceiveVariantsBulk @orderID = ?, @variants = ?, @markDelivered = ?,
+        @uploadID = ?, @linesThrough = ?, @deliverFrom = ?''',
+        (order_id, variants_json, 1 if mark_delivered else 0, upload_id, lines_through,
+         json.dumps(order_states.sources('Delivered')))
+    )
+    rows = await cursor.fetchall()
+
+    skipped = [
+        {"barcode": row[1], "reason": row[3]}
+        for row in rows
+        if row[3] is not None
+    ]
+    for item in skipped:
+        logging.warning(f"barcode {item['barcode']} skipped: {item['reason']}")
+
+    # received stock is available to carts straight away
+    received_products = {int(row[2]) for row in rows if row[3] is None}
+    hold_ledger.invalidate(received_products)
+    stock_push.notify(received_products)
+
+    return {"received": len(rows) - len(skipped), "skipped": skipped}
+
 
 '''
-for dropdown logic from the frontend
+streaming receive for very large deliveries
+
+the body is NDJSON (one variant per line). batches are committed while the upload is
+still arriving, each together with its checkpoint, so a dropped connection can resume
+by sending the same uploadID again (either the whole file or from startLine onwards).
 '''
-# function to fetch orders based on status  
-async def fetch_orders(order_status=None):  
-    conn = await database.get_db_connection()  
-    cursor = await conn.cursor()  
-    
-    try:  
-        if order_status:  
-            await cursor.execute(f"exec get_orders_by_status @orderStatus = '{order_status}'")  
-        else:  
-            await cursor.execute('exec get_all_orderStatus')  
-
-        orders_row = await cursor.fetchall()  
-        orders_data = [  
-            {  
-                "Product Name": row[0],  
-                "Category": row[1],  
-                "Size": row[2],  
-                "Quantity": row[3],  
-                "Total Price": row[4],  
-                "Date": row[5].strftime("%m-%d-%Y %I:%M %p"),  
-                "Status": row[6],
-            }  
-            for row in orders_row  
-        ]  
-        return orders_data  
-    except Exception as e:  
-        raise HTTPException(status_code=500, detail=str(e))  
-    finally:  
-        await conn.close()  
-
-# Display all order status  
-@router.get('/all-orders')  
-async def get_all_orders():  
-    orders_data = await fetch_orders()  
-    return {"All order status": orders_data}  
-
-# Display orders by status  
-@router.get('/{status}-orders')  
-async def get_orders_by_status(status: str):  
-    valid_statuses = ['Pending', 'Confirmed', 'Rejected', 'To Ship', 'Delivered']  
-    if status not in valid_statuses:  
-        raise HTTPException(status_code=400, detail="Invalid order status")  
-    
-    orders_data = await fetch_orders(order_status=status)  
-    return {f"{status} orders": orders_data}
+RECEIVE_STREAM_BATCH_SIZE = 500
+MAX_REPORTED_SKIPS = 100
+
+# split a byte stream into lines without holding more than one partial line
+async def iter_ndjson_lines(chunks):
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+async def get_receive_checkpoint(cursor, upload_id):
+    await cursor.execute(
+        '''select orderID, linesCommitted, received, skipped, isComplete, updatedAt
+        from ReceiveCheckpoints
+        where uploadID = ?''',
+        (upload_id,)
+    )
+    row = await cursor.fetchone()
+    if not row:
+        return None
+    return {
+        "uploadID": upload_id,
+        "orderID": int(row[0]),
+        "linesCommitted": row[1],
+        "received": row[2],
+        "skipped": row[3],
+        "isComplete": bool(row[4]),
+        "updatedAt": row[5].strftime("%m-%d-%Y %I:%M %p") if row[5] else None,
+    }
+
+@router.post('/ims/variants/receive/stream')
+async def receive_variants_stream(request: Request, orderID: int, uploadID: str, startLine: int = 1,
+                                  batchSize: int = RECEIVE_STREAM_BATCH_SIZE):
+    conn = None
+    try:
+        if startLine < 1 or batchSize < 1:
+            raise HTTPException(status_code=400, detail='startLine and batchSize must be positive.')
+
+        conn = await database.get_db_connection()
+        cursor = await conn.cursor()
+
+        # one statement, and the key range stays locked until the insert, so two attempts of the same
+        # upload arriving together do not both insert
+        await cursor.execute(
+            '''insert into ReceiveCheckpoints (uploadID, orderID)
+            select ?, ?
+            where not exists (select 1 from ReceiveCheckpoints with (updlock, holdlock) where uploadID = ?)''',
+            (uploadID, orderID, uploadID)
+        )
+        checkpoint = await get_receive_checkpoint(cursor, uploadID)
+        if checkpoint["orderID"] != orderID:
+            raise HTTPException(status_code=409, detail=f"Upload {uploadID} belongs to order {checkpoint['orderID']}.")
+        if checkpoint["isComplete"]:
+            return {'message': 'Upload already completed.', 'status': 'complete', 'checkpoint': checkpoint}
+        if startLine > checkpoint["linesCommitted"] + 1:
+            raise HTTPException(status_code=409,
+                                detail=f"Lines before {startLine} were never committed, resume from line {checkpoint['linesCommitted'] + 1}.")
+
+        committed = checkpoint["linesCommitted"]
+        line_no = startLine - 1
+        batch = []
+        skipped_sample = []
+
+        async def flush(lines_through):
+            result = await receive_variant_batch(cursor, orderID, batch, mark_delivered=False,
+                                                 upload_id=uploadID, lines_through=lines_through)
+            skipped_sample.extend(result["skipped"][:MAX_REPORTED_SKIPS - len(skipped_sample)])
+            batch.clear()
+            return lines_through
+
+        async for line in iter_ndjson_lines(request.stream()):
+            line_no += 1
+            # already committed by an earlier attempt of this upload
+            if line_no <= committed or not line.strip():
+                continue
+            try:
+                batch.append(ProductVariant.model_validate_json(line))
+            except ValidationError as e:
+                raise HTTPException(status_code=400,
+                                    detail=f"Invalid variant on line {line_no}: {e}. Resume from line {committed + 1}.")
+            if len(batch) >= batchSize:
+                committed = await flush(line_no)
+
+        if batch:
+            committed = await flush(line_no)
+
+        # close the upload, the order is delivered only if nothing across all attempts was skipped
+        # and its status allows it; both in one transaction, so a retry never finds one without the other
+        await cursor.execute(
+            '''set nocount on;
+            set xact_abort on;
+            begin transaction;
+
+            update ReceiveCheckpoints
+            set isComplete = 1, updatedAt = getdate()
+            where uploadID = ?;
+
+            update PurchaseOrders
+            set orderStatus = 'Delivered',
+                statusDate = getdate()
+            where orderID = ?
+                and orderStatus in (select value from openjson(?))
+                and exists (select 1 from ReceiveCheckpoints
+                            where uploadID = ? and skipped = 0 and received > 0);
+
+            commit transaction;''',
+            (uploadID, orderID, json.dumps(order_states.sources('Delivered')), uploadID)
+        )
+        checkpoint = await get_receive_checkpoint(cursor, uploadID)
+
+        status = 'success' if checkpoint["skipped"] == 0 else 'partial'
+        logging.info(f"Streamed upload {uploadID} complete: {checkpoint['received']} received, {checkpoint['skipped']} skipped.")
+        return {'message': f"{checkpoint['received']} variants received, {checkpoint['skipped']} skipped.",
+                'status': status, 'checkpoint': checkpoint, 'skipped': skipped_sample}
+
+    except ClientDisconnect:
+        logging.warning(f"Upload {uploadID} disconnected, resume from the last checkpoint.")
+        raise HTTPException(status_code=499, detail="Client disconnected.")
+    except HTTPException as e:
+        logging.error(f"HTTP error occurred: {e.status_code} - {e.detail}")
+        raise
+    except Exception as e:
+        logging.error(f"Unexpected error occurred: {str(e)}")
+        raise HTTPException(status_code=500, detail="An error occurred while processing variants.")
+    finally:
+        if conn:
+            await conn.close()
+
+# progress of a streamed upload, used by clients to decide where to resume
+@router.get('/ims/variants/receive/stream/{upload_id}')
+async def get_receive_stream_checkpoint(upload_id: str):
+    conn = None
+    try:
+        conn = await database.get_db_connection()
+        cursor = await conn.cursor()
+        checkpoint = await get_receive_checkpoint(cursor, upload_id)
+        if not checkpoint:
+            raise HTTPException(status_code=404, detail='Upload not found.')
+        return {'checkpoint': checkpoint, 'resumeFromLine': checkpoint["linesCommitted"] + 1}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if conn:
+            await conn.close()
+
 
 # Get all the order in delivered status
 @router.get('/ims/variants/delivered')
@@ -300,99 +439,71 @@ async def get_delivered_orders():
 '''
 for dropdown logic from the frontend
 '''
-# function to fetch orders based on status  
-async def fetch_orders(order_status=None):  
-    conn = await database.get_db_connection()  
-    cursor = await conn.cursor()  
-    
-    try:  
-        if order_status:  
-            await cursor.execute(f"exec get_orders_by_status @orderStatus = '{order_status}'")  
-        else:  
-            await cursor.execute('exec get_all_orderStatus')  
-
-        orders_row = await cursor.fetchall()  
-        orders_data = [  
-            {  
-                "Product Name": row[0],  
-                "Category": row[1],  
-                "Size": row[2],  
-                "Quantity": row[3],  
-                "Total Price": row[4],  
-                "Date": row[5].strftime("%m-%d-%Y %I:%M %p"),  
-                "Status": row[6],
-            }  
-            for row in orders_row  
-        ]  
-        return orders_data  
-    except Exception as e:  
-        raise HTTPException(status_code=500, detail=str(e))  
-    finally:  
-        await conn.close()  
-
-# display all order status  
-@router.get('/all-orders')  
-async def get_all_orders():  
-    orders_data = await fetch_orders()  
-    return {"All order status": orders_data}  
-
-# display orders by status  
-@router.get('/{status}')  
-async def get_orders_by_status(status: str):  
-    valid_statuses = ['Pending', 'Confirmed', 'Rejected', 'To Ship', 'Delivered', 'Received']  
-    formatted_status = status.replace("-", " ")  # convert "ToShip" back to "To Ship"
-    
-    if formatted_status not in valid_statuses:
-        raise HTTPException(status_code=400, detail="Invalid order status") 
-    
-    orders_data = await fetch_orders(order_status=status)  
-    return {f"{status} orders": orders_data}
+# function to fetch one page of orders, optionally by status, as one row per order line
+async def fetch_orders(order_status=None, limit=ORDER_PAGE_SIZE, cursor=None):
+    after = decode_order_cursor(cursor) if cursor else None
+    conn = await database.get_db_connection()
+
+    try:
+        db_cursor = await conn.cursor()
+        page = await fetch_purchase_orders(db_cursor, limit, after, order_status)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await conn.close()
+
+    orders_data = [
+        {
+            "Order ID": order["orderID"],
+            "Product Name": item["productName"],
+            "Category": item["category"],
+            "Size": item["size"],
+            "Quantity": item["quantity"],
+            "Total Price": item["totalPrice"],
+            "Date": order["statusDate"].strftime("%m-%d-%Y %I:%M %p") if order["statusDate"] else None,
+            "Status": order["orderStatus"],
+        }
+        for order in page["orders"]
+        for item in order["items"]
+    ]
+    return orders_data, page["nextCursor"]
+
+# display all order status
+@router.get('/all-orders')
+async def get_all_orders(cursor: Optional[str] = None,
+                         limit: int = Query(ORDER_PAGE_SIZE, ge=1, le=ORDER_MAX_PAGE_SIZE)):
+    orders_data, next_cursor = await fetch_orders(limit=limit, cursor=cursor)
+    return {"All order status": orders_data, "nextCursor": next_cursor}
+
+# display orders by status; registered before /{status}, which would otherwise match "Pending-orders" as a status
+@router.get('/{status}-orders')
+async def get_orders_by_status_suffixed(status: str, cursor: Optional[str] = None,
+                                        limit: int = Query(ORDER_PAGE_SIZE, ge=1, le=ORDER_MAX_PAGE_SIZE)):
+    return await get_orders_by_status(status, cursor, limit)
+
+@router.get('/{status}')
+async def get_orders_by_status(status: str, cursor: Optional[str] = None,
+                               limit: int = Query(ORDER_PAGE_SIZE, ge=1, le=ORDER_MAX_PAGE_SIZE)):
+    order_status = normalize_order_status(status)
+    orders_data, next_cursor = await fetch_orders(order_status, limit, cursor)
+    return {f"{status} orders": orders_data, "nextCursor": next_cursor}
 
 
 #Received
 @router.post("/ims/orders/mark-received")
 async def mark_order_received(order: OrderID):
     order_id = order.order_id
-    conn = None
     try:
-        conn = await database.get_db_connection()
-        cursor = await conn.cursor()
-
-        # check if order exists and is marked as Delivered
-        await cursor.execute(
-            '''
-            SELECT orderStatus 
-            FROM purchaseOrders
-            WHERE orderID = ?
-            ''',
-            (order_id,)
-        )
-        order_status_row = await cursor.fetchone()
-
-        if not order_status_row:
-            raise HTTPException(status_code=404, detail="Order not found.")
-        
-        order_status = order_status_row[0]
-        if order_status != 'Delivered':
-            raise HTTPException(status_code=400, detail="Order is not marked as Delivered. Current status: {order_status}")
-        
-        # update order status to Received in IMs
+        # only a Delivered order can be marked as Received
         logging.info(f"Marking order {order_id} as Received orderID: {order_id}")
-        await cursor.execute(
-            """update purchaseOrders
-            set orderStatus = 'Received',
-            statusDate = GETDATE()
-            where orderID = ?
-            """, (order_id,)
-        )
-        await conn.commit()
+        await change_order_status(order_id, 'Received')
 
         # send update to vms
-        vms_url = "http://127.0.0.1:8001/orders/vms/orders/update-status"
+        vms_path = "/orders/vms/orders/update-status"
         vms_payload = {"orderID": order_id, "orderStatus": "Received"}
 
         # call helper function to send data to vms with retries 
-        vms_response = await send_to_ims_api_with_retries(vms_url, vms_payload)
+        vms_response = await send_to_ims_api_with_retries(vms_path, vms_payload, idempotency_key=f"po-{order_id}-received")
 
         logging.info(f"VMS Response: {vms_response}")
 
@@ -410,23 +521,13 @@ async def mark_order_received(order: OrderID):
             status_code=500, 
             detail="An error occurred while marking the order as 'Received'."
         )
-    finally:
-        if conn:
-            await conn.close()
 
-# helper function for retrying api calls
-async def send_to_ims_api_with_retries(url, payload, retries=3, delay=2):
-    for attempt in range(retries):
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, json=payload)
-            response.raise_for_status()
-            return response.json()
-        except httpx.HTTPStatusError as e:
-            logging.error(f"HTTP error occurred: {e}")
-        except Exception as e:
-            logging.error(f"Attempt {attempt + 1} failed: {e}")
-        await asyncio.sleep(delay)
-    raise HTTPException(status_code=500, detail="Failed to update VMS after multiple attempts.")
+# helper function for retrying api calls (backoff and circuit breaking live in the shared vms client)
+async def send_to_ims_api_with_retries(path, payload, attempts=3, idempotency_key=None):
+    try:
+        return await vms_client.post(path, payload, attempts=attempts, idempotency_key=idempotency_key)
+    except (httpx.HTTPError, VMSUnavailableError) as e:
+        logging.error(f"HTTP error occurred: {e}")
+        raise HTTPException(status_code=500, detail="Failed to update VMS after multiple attempts.")
 
     
\ No newline at end of file
@@ -1,9 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, Response
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Response, Header, Query
+from typing import List, Optional
 from pydantic import BaseModel
+from datetime import date, datetime, time, timedelta
+import asyncio
 import logging
+import pyodbc
 from fastapi.responses import JSONResponse
 import database
+from cart_store import cart_store
+from stock_holds import hold_ledger
+from stock_push import stock_push
+from product_resolver import product_resolver
+from idempotency import checkout_idempotency, IDEMPOTENCY_RETENTION_DAYS
 from routers.auth import role_required, get_current_active_user
 
 
@@ -18,57 +26,125 @@ class CartItemInput(BaseModel):
     quantity: int
     price: float
 
+class CartQuantityUpdate(BaseModel):
+    quantity: int
+
 class CheckoutRequest(BaseModel):
     cart: List[CartItemInput]
 
-# In-memory cart storage
-cart = []
+# carts are kept per terminal when the POS sends X-Terminal-ID, otherwise per employee
+async def get_cart_key(x_terminal_id: Optional[str] = Header(None), current_user=Depends(get_current_active_user)):
+    if x_terminal_id:
+        return f"terminal:{x_terminal_id}"
+    return f"user:{current_user.userID}"
+
+# an abandoned cart gives its held stock back
+cart_store.on_expire(lambda cart_key, lines: hold_ledger.release(cart_key))
+
+# expire abandoned carts and stale holds in the background
+@router.on_event('startup')
+async def start_cart_sweeper():
+    async def sweep():
+        while True:
+            await asyncio.sleep(60)
+            try:
+                cart_store.sweep()
+                hold_ledger.expire()
+                await cart_store.sweep_persisted()
+                await purge_idempotency_keys()
+            except Exception as e:
+                logging.error(f"error expiring carts: {e}")
+    asyncio.create_task(sweep())
+
+# roll up any sales the checkout did not (history from before the rollups, failed runs)
+ROLLUP_INTERVAL_SECONDS = 300
+
+@router.on_event('startup')
+async def start_rollup_catch_up():
+    async def catch_up():
+        while True:
+            try:
+                await apply_pending_rollups()
+            except Exception as e:
+                logging.error(f"error applying sales rollups: {e}")
+            await asyncio.sleep(ROLLUP_INTERVAL_SECONDS)
+    asyncio.create_task(catch_up())
+
+async def apply_pending_rollups(batch_size=5000):
+    conn = await database.get_db_connection()
+    try:
+        cursor = await conn.cursor()
+        total = 0
+        while True:
+            await cursor.execute('exec ApplySalesRollup @batchSize = ?', (batch_size,))
+            rolled_up = (await cursor.fetchone())[0]
+            total += rolled_up
+            if rolled_up < batch_size:
+                break
+        if total:
+            logging.info(f"Rolled up {total} sales.")
+        return total
+    finally:
+        await conn.close()
+
+# drop stored checkout results past their retention
+async def purge_idempotency_keys():
+    conn = await database.get_db_connection()
+    try:
+        cursor = await conn.cursor()
+        await cursor.execute(
+            '''delete from IdempotencyKeys
+            where createdAt < dateadd(day, -?, getdate())''',
+            (IDEMPOTENCY_RETENTION_DAYS,)
+        )
+    finally:
+        await conn.close()
 
 # Add to cart
 @router.post("/sales/cart", dependencies=[Depends(role_required(["employee"]))])
-async def add_to_cart(item: CartItemInput):
+async def add_to_cart(item: CartItemInput, cart_key: str = Depends(get_cart_key),
+                      current_user=Depends(get_current_active_user)):
+    if item.quantity < 1:
+        raise HTTPException(status_code=400, detail="Quantity must be at least 1.")
+
     conn = await database.get_db_connection()
     cursor = await conn.cursor()
 
     try:
-        # retrieve productID based on productName, category, and size
-        await cursor.execute(
-            """
-            SELECT productID, currentStock 
-            FROM Products
-            WHERE productName = ? AND category = ? AND size = ?
-            """,
-            (item.productName, item.category, item.size)
-        )
-        product_row = await cursor.fetchone()
+        # retrieve productID based on productName, category, and size (checked, the cart and holds key on it)
+        productID = await product_resolver.resolve(cursor, item.productName, item.size, item.category,
+                                                   active_only=False, verify=True)
 
-        if not product_row:
+        if productID is None:
             raise HTTPException(
                 status_code=404,
                 detail=f"Product '{item.productName}' with category '{item.category}' and size '{item.size}' not found."
             )
 
-        productID, currentStock = product_row
-
-        # check if enough stock is available
-        if currentStock < item.quantity:
+        # hold the stock for this cart, including what is already in it
+        in_cart = (await cart_store.get(cart_key)).get(productID, {}).get("quantity", 0)
+        placed, free = await hold_ledger.place(cursor, cart_key, productID, in_cart + item.quantity)
+        if not placed:
             raise HTTPException(
                 status_code=400,
-                detail=f"Not enough stock for product '{item.productName}'. Available stock: {currentStock}."
+                detail=f"Not enough stock for product '{item.productName}'. Available stock: {max(free - in_cart, 0)}."
             )
 
-        # Add to in-memory cart
-        cart_item = {
+        # add to this terminal's cart, merged with any existing line for the product
+        cart_item = await cart_store.add(cart_key, {
             "productID": productID,
             "productName": item.productName,
             "category": item.category,
             "size": item.size,
             "quantity": item.quantity,
-            "price": item.price
-        }
-        cart.append(cart_item)
+            "price": item.price,
+            "userID": current_user.userID,
+        })
+
+        return {"message": "Item added to cart.", "item": cart_item}
 
-        return {"message": "Item added to cart."}
+    except HTTPException:
+        raise
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -78,58 +154,145 @@ async def add_to_cart(item: CartItemInput):
 
 # view cart
 @router.get("/sales/cart", dependencies=[Depends(role_required(["employee"]))])
-async def view_cart():
-    return cart
+async def view_cart(cart_key: str = Depends(get_cart_key)):
+    return await cart_store.view(cart_key)
+
+# change the quantity of a cart line
+@router.put("/sales/cart/{product_id}", dependencies=[Depends(role_required(["employee"]))])
+async def update_cart_item(product_id: int, update: CartQuantityUpdate, cart_key: str = Depends(get_cart_key)):
+    if update.quantity < 1:
+        raise HTTPException(status_code=400, detail="Quantity must be at least 1.")
+    if product_id not in await cart_store.get(cart_key):
+        raise HTTPException(status_code=404, detail="Product is not in the cart.")
+
+    conn = await database.get_db_connection()
+    cursor = await conn.cursor()
+    try:
+        placed, free = await hold_ledger.place(cursor, cart_key, product_id, update.quantity)
+        if not placed:
+            raise HTTPException(status_code=400, detail=f"Not enough stock. Available stock: {free}.")
+        line = await cart_store.update(cart_key, product_id, update.quantity)
+        return {"message": "Cart updated.", "item": line}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await conn.close()
+
+# remove a cart line
+@router.delete("/sales/cart/{product_id}", dependencies=[Depends(role_required(["employee"]))])
+async def remove_cart_item(product_id: int, cart_key: str = Depends(get_cart_key)):
+    line = await cart_store.remove(cart_key, product_id)
+    hold_ledger.release(cart_key, product_id)
+    if line is None:
+        raise HTTPException(status_code=404, detail="Product is not in the cart.")
+    return {"message": "Item removed from cart."}
+
+# empty the cart
+@router.delete("/sales/cart", dependencies=[Depends(role_required(["employee"]))])
+async def clear_cart(cart_key: str = Depends(get_cart_key)):
+    await cart_store.clear(cart_key)
+    hold_ledger.release(cart_key)
+    return {"message": "Cart cleared."}
 
 # process sales endpoint
+# clients may send an Idempotency-Key header and retry freely; a repeated key returns the original sale
 @router.post("/sales/checkout")
-async def checkout(request: CheckoutRequest, current_user=Depends(get_current_active_user)):
+async def checkout(request: CheckoutRequest, current_user=Depends(get_current_active_user),
+                   cart_key: str = Depends(get_cart_key), idempotency_key: Optional[str] = Header(None)):
     logging.info(f"Checkout request received: {request}")
+    if idempotency_key is None:
+        result, _ = await run_checkout(current_user, cart_key)
+        return result
+
+    if len(idempotency_key) > 100:
+        raise HTTPException(status_code=400, detail="Idempotency-Key must be at most 100 characters.")
+    # keys are scoped to the employee so two users cannot collide
+    key = f"{current_user.userID}:{idempotency_key}"
+
+    result = checkout_idempotency.get(key)
+    if result is not None:
+        return replayed_checkout(result)
+
+    running = checkout_idempotency.begin(key)
+    if running is not None:
+        return replayed_checkout(await running)
+
+    try:
+        result, replayed = await run_checkout(current_user, cart_key, key)
+    except Exception as e:
+        checkout_idempotency.finish(key, error=e)
+        raise
+    checkout_idempotency.put(key, result)
+    checkout_idempotency.finish(key, result)
+    return replayed_checkout(result) if replayed else result
+
+def replayed_checkout(result):
+    return JSONResponse(content=result, status_code=200, headers={"Idempotent-Replayed": "true"})
+
+# returns the sale result and whether it was replayed from an earlier request
+async def run_checkout(current_user, cart_key, idempotency_key=None):
     conn = await database.get_db_connection()
     cursor = await conn.cursor()
 
     try:
+        # lines are already aggregated per product
+        cart = await cart_store.view(cart_key)
         if not cart:
+            # a retry of a checkout that already went through finds its cart cleared
+            if idempotency_key is not None:
+                await cursor.execute(
+                    '''select s.salesID, s.totalAmount
+                    from IdempotencyKeys as k
+                    inner join Sales as s
+                        on s.salesID = k.salesID
+                    where k.idempotencyKey = ?''',
+                    (idempotency_key,)
+                )
+                sale = await cursor.fetchone()
+                if sale:
+                    return checkout_result(sale), True
             raise HTTPException(status_code=400, detail="Cart is empty.")
         
-        #generate variantID list from the cart
-        variant_id_list = []
-
-        for item in cart:
-            # fetch `variantIDs` for each product and size
-            await cursor.execute(
-                '''select top(?) variantID
-                from productVariants
-                where productID =?
-                and isAvailable = 1''',
-                (item['quantity'], item['productID'])
-            )
-            variants = await cursor.fetchall()
+        # quantity per product, the variants are picked and claimed inside CheckoutCart
+        quantities = {item['productID']: item['quantity'] for item in cart}
 
-            if len(variants) < item['quantity']:
-                raise HTTPException(status_code=400, detail=f"Not enough available variants for product '{item['productName']}' with size '{item['size']}'.")
-            
-            # add variantIDs to the list
-            variant_id_list.extend([variant[0] for variant in variants])
-        
-        # call the CheckoutSale stored procedure
-        variant_id_list_str = ",".join(map(str, variant_id_list))
         await cursor.execute(
-            '''exec CheckoutSale @userID = ?, @variantIDList =?''',
-            (current_user.userID, variant_id_list_str)
+            '''exec CheckoutCart @userID = ?, @items = ?, @idempotencyKey = ?''',
+            (current_user.userID, [(product_id, quantity) for product_id, quantity in quantities.items()],
+             idempotency_key)
         )
+        sale = await cursor.fetchone()
         await conn.commit()
-        logging.info("Checkout successful.")
+        result = checkout_result(sale)
+
+        if sale[2]:
+            # the cart was cleared by the original checkout; what is in it now (and its holds)
+            # was built since and is not part of that sale
+            logging.info(f"Checkout replayed for sale {result['salesID']}.")
+            return result, True
 
-        #clear in-memory cart after successful checkout
-        cart.clear()
-        return JSONResponse(content={"message": "Checkout successful!"}, status_code=200)   
+        # the held stock is now sold, clear this cart after successful checkout
+        hold_ledger.consume(cart_key, quantities)
+        stock_push.notify(quantities)
+        await cart_store.clear(cart_key)
+
+        logging.info("Checkout successful.")
+        return result, False
     
     except HTTPException as http_err:
         # Catch HTTP exceptions explicitly
         logging.error(f"HTTPException occurred: {http_err.detail}")
         raise http_err
     
+    except pyodbc.Error as e:
+        await conn.rollback()
+        # raised by CheckoutCart when another checkout claimed the last variants
+        if 'Not enough available variants' in str(e):
+            raise HTTPException(status_code=400, detail=f"Not enough available variants: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
     except Exception as e:
         await conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
@@ -137,39 +300,180 @@ async def checkout(request: CheckoutRequest, current_user=Depends(get_current_ac
     finally:
         await conn.close()
 
+def checkout_result(sale):
+    return {"message": "Checkout successful!", "salesID": int(sale[0]), "totalAmount": float(sale[1])}
+
+# sales history pages, newest first, keyset-paginated on (salesDate, salesID)
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 500
+
+def encode_history_cursor(sales_date, sales_id):
+    return f"{sales_date.isoformat()}_{int(sales_id)}"
+
+def decode_history_cursor(cursor):
+    try:
+        sales_date, sales_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(sales_date), int(sales_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+async def fetch_sales_page(cursor, limit, after=None, start_date=None, end_date=None,
+                           user_id=None, product_id=None, category=None):
+    conditions, params = [], []
+    if start_date:
+        conditions.append("s.salesDate >= ?")
+        params.append(datetime.combine(start_date, time.min))
+    if end_date:
+        # the end date is inclusive
+        conditions.append("s.salesDate < ?")
+        params.append(datetime.combine(end_date + timedelta(days=1), time.min))
+    if user_id is not None:
+        conditions.append("s.userID = ?")
+        params.append(user_id)
+    if after:
+        # cast back to datetime so the comparison is not done at datetime2 precision
+        conditions.append("(s.salesDate < cast(? as datetime) or (s.salesDate = cast(? as datetime) and s.salesID < ?))")
+        params.extend([after[0], after[0], after[1]])
+
+    line_conditions, line_params = [], []
+    if product_id is not None:
+        line_conditions.append("p.productID = ?")
+        line_params.append(product_id)
+    if category:
+        line_conditions.append("p.category = ?")
+        line_params.append(category)
+    if line_conditions:
+        # only sales with a matching line, and only the matching lines are returned
+        conditions.append(
+            '''exists (select 1
+                from SalesDetails as sd
+                inner join ProductVariants as pv
+                    on pv.variantID = sd.variantID
+                inner join Products as p
+                    on p.productID = pv.productID
+                where sd.salesID = s.salesID and ''' + " and ".join(line_conditions) + ")"
+        )
+        params.extend(line_params)
+
+    where = ("where " + " and ".join(conditions)) if conditions else ""
+    line_where = ("where " + " and ".join(line_conditions)) if line_conditions else ""
+
+    # one extra sale tells whether there is a next page
+    await cursor.execute(
+        f'''with page as (
+            select top (?) s.salesID, s.salesDate, s.userID, s.totalAmount
+            from Sales as s
+            {where}
+            order by s.salesDate desc, s.salesID desc
+        )
+        select pg.salesID, pg.salesDate, pg.userID, pg.totalAmount,
+            p.productID, p.productName, p.category, p.size,
+            count(*) as quantity, sum(sd.unitPrice) as amount
+        from page as pg
+        inner join SalesDetails as sd
+            on sd.salesID = pg.salesID
+        inner join ProductVariants as pv
+            on pv.variantID = sd.variantID
+        inner join Products as p
+            on p.productID = pv.productID
+        {line_where}
+        group by pg.salesID, pg.salesDate, pg.userID, pg.totalAmount,
+            p.productID, p.productName, p.category, p.size
+        order by pg.salesDate desc, pg.salesID desc, p.productName''',
+        (limit + 1, *params, *line_params)
+    )
+    rows = await cursor.fetchall()
+
+    sales = {}
+    for row in rows:
+        sale = sales.get(row[0])
+        if sale is None:
+            sale = sales[row[0]] = {
+                "salesID": int(row[0]),
+                "salesDate": row[1].isoformat(),
+                "userID": int(row[2]) if row[2] is not None else None,
+                "totalAmount": float(row[3]),
+                "items": [],
+            }
+        sale["items"].append({
+            "productID": int(row[4]),
+            "productName": row[5],
+            "category": row[6],
+            "size": row[7],
+            "quantity": row[8],
+            "amount": float(row[9]),
+        })
+
+    page = list(sales.values())
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        last = page[-1]
+        next_cursor = encode_history_cursor(datetime.fromisoformat(last["salesDate"]), last["salesID"])
+    return {"sales": page, "nextCursor": next_cursor}
+
 # sales history for employee
 @router.get('/sales/history', dependencies=[Depends(role_required(["employee"]))])
-async def get_sales_history(current_user=Depends(get_current_active_user)):
+async def get_sales_history(start_date: Optional[date] = None, end_date: Optional[date] = None,
+                            product_id: Optional[int] = None, category: Optional[str] = None,
+                            cursor: Optional[str] = None,
+                            limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+                            current_user=Depends(get_current_active_user)):
+    after = decode_history_cursor(cursor) if cursor else None
     conn = await database.get_db_connection()
-    cursor = await conn.cursor()
+    db_cursor = await conn.cursor()
 
     try:
-        await cursor.execute(
-            '''exec EmployeeSalesHistory @userID = ?''',
-            current_user.userID
+        return await fetch_sales_page(
+            db_cursor, limit, after, start_date, end_date,
+            user_id=current_user.userID, product_id=product_id, category=category
         )
-        sales_rows = await cursor.fetchall()
-
-        # constructing teh response
-        sales_history = [
-            {
-                "Product Name": row[0],
-                "Category": row[1],
-                "Size": row[2], 
-                "Total Quantity Sold": row[3],
-                "Total Amount": row[4],
-                "Sales Date": row[5].strftime("%m-%d-%Y %I:%M %p"),
-            }
-            for row in sales_rows
-        ]
-
-        return{"Employee Sales History": sales_history}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
     finally:
         await conn.close()
     
+# per-day totals by product, read from the daily rollup; without a start date the last SUMMARY_DAYS days
+SUMMARY_DAYS = 30
+
+def summary_range(start_date, end_date):
+    if start_date is None:
+        start_date = (end_date or date.today()) - timedelta(days=SUMMARY_DAYS - 1)
+    return start_date, end_date
+
+def daily_summary(rows):
+    return [
+        {
+            "Product Name": row[0],
+            "Category": row[1],
+            "Size": row[2],
+            "Total Quantity Sold": row[3],
+            "Total Amount": f"{row[4]:,.2f}",
+            "Sales Date": row[5].strftime("%m-%d-%Y %I:%M %p"),
+        }
+        for row in rows
+    ]
+
+# daily sales summary for employee
+@router.get('/sales/history/summary', dependencies=[Depends(role_required(["employee"]))])
+async def get_sales_history_summary(start_date: Optional[date] = None, end_date: Optional[date] = None,
+                                    current_user=Depends(get_current_active_user)):
+    start_date, end_date = summary_range(start_date, end_date)
+    conn = await database.get_db_connection()
+    cursor = await conn.cursor()
+
+    try:
+        await cursor.execute(
+            'exec EmployeeSalesHistory @userID = ?, @startDate = ?, @endDate = ?',
+            (current_user.userID, start_date, end_date)
+        )
+        return {"Employee Sales History": daily_summary(await cursor.fetchall())}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await conn.close()
+
 # get products per category for the dropdown in sales logic
 @router.get("/sales/products", dependencies=[Depends(role_required(["employee"]))])
 async def get_products_per_category(category: str = "All Categories"):
@@ -204,32 +508,35 @@ async def get_products_per_category(category: str = "All Categories"):
 
 # sales history admin side
 @router.get('/sales/data', dependencies=[Depends(role_required(["admin"]))])
-async def sales_data():
+async def sales_data(start_date: Optional[date] = None, end_date: Optional[date] = None,
+                     user_id: Optional[int] = None, product_id: Optional[int] = None,
+                     category: Optional[str] = None, cursor: Optional[str] = None,
+                     limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE)):
+    after = decode_history_cursor(cursor) if cursor else None
     conn = await database.get_db_connection()
-    cursor = await conn.cursor()
+    db_cursor = await conn.cursor()
 
     try: 
-        await cursor.execute(
-            '''exec SalesData'''
+        return await fetch_sales_page(
+            db_cursor, limit, after, start_date, end_date,
+            user_id=user_id, product_id=product_id, category=category
         )
-        sales_row = await cursor.fetchall()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await conn.close()
 
-        # constructing teh response
-        sales_data = [
-            {
-                "Product Name": row[0],
-                "Category": row[1],
-                "Size": row[2], 
-                "Total Quantity Sold": row[3],
-                "Total Amount": row[4],
-                "Sales Date": row[5].strftime("%m-%d-%Y %I:%M %p"),
-            }
-            for row in sales_row
-        ]
+# daily sales summary admin side
+@router.get('/sales/data/summary', dependencies=[Depends(role_required(["admin"]))])
+async def sales_data_summary(start_date: Optional[date] = None, end_date: Optional[date] = None):
+    start_date, end_date = summary_range(start_date, end_date)
+    conn = await database.get_db_connection()
+    cursor = await conn.cursor()
 
-        return{"Sales History": sales_data}
+    try:
+        await cursor.execute('exec SalesData @startDate = ?, @endDate = ?', (start_date, end_date))
+        return {"Sales History": daily_summary(await cursor.fetchall())}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         await conn.close()
-        
@@ -0,0 +1,64 @@
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException
+from typing import Optional
+import asyncio
+import logging
+from stock_push import stock_push
+from routers.auth import get_current_user
+
+
+router = APIRouter()
+
+
+def parse_categories(categories):
+    if not categories or categories == "All Categories":
+        return None
+    return {category.strip() for category in categories.split(",") if category.strip()}
+
+
+# live stock levels for pos terminals
+# connect with ?token=<access token>&categories=Shoes,Bags (omit categories for all of them).
+# the server sends a snapshot, then {"type": "stock", "levels": [...]} whenever levels change.
+# send {"action": "subscribe", "categories": [...]} to change the categories (an empty list is all)
+@router.websocket('/ws')
+async def stock_socket(websocket: WebSocket, token: Optional[str] = None, categories: Optional[str] = None):
+    # browsers cannot set headers on websockets, so the token comes in the query string
+    try:
+        user = await get_current_user(token or "")
+        if user.disabled:
+            raise HTTPException(status_code=400, detail="Inactive user")
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    client = await stock_push.connect(websocket, parse_categories(categories))
+    sender = asyncio.create_task(client.send_loop())
+    try:
+        await websocket.send_json({"type": "snapshot", "levels": stock_push.snapshot(client)})
+
+        receiver = asyncio.create_task(receive_actions(websocket, client))
+        done, _ = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        receiver.cancel()
+        for task in done:
+            if task.exception() and not isinstance(task.exception(), WebSocketDisconnect):
+                raise task.exception()
+
+    except asyncio.TimeoutError:
+        # the socket stopped reading; drop it rather than buffering for it
+        logging.info("Closing a stock socket that fell behind.")
+        await websocket.close(code=1013)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logging.error(f"stock socket error: {e}")
+    finally:
+        sender.cancel()
+        await stock_push.disconnect(client)
+
+async def receive_actions(websocket, client):
+    while True:
+        message = await websocket.receive_json()
+        if message.get("action") == "subscribe":
+            client.categories = set(message.get("categories") or []) or None
+            client.pending = {}
+            await websocket.send_json({"type": "snapshot", "levels": stock_push.snapshot(client)})
@@ -0,0 +1,161 @@
+'''
+columnar export of sales and inventory for offline analysis
+
+writes Sales and SalesDetails as zstd-compressed parquet files partitioned by sales day,
+and Products and ProductVariants as a daily snapshot. each run exports the complete days
+after the last exported one, so reporting reads the files instead of the production db.
+rows are streamed from the cursor in batches, so memory stays bounded by the batch size.
+
+usage: python -m sales_export [--from YYYY-MM-DD] [--to YYYY-MM-DD]
+'''
+from datetime import date, datetime, time, timedelta
+import argparse
+import asyncio
+import logging
+import json
+import os
+import pyarrow as pa
+import pyarrow.parquet as pq
+import database
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "50000"))
+STATE_FILE = "_state.json"
+
+AMOUNT = pa.decimal128(18, 2)
+
+# partitioned tables: query over one day's [start, end) range and the output schema
+DAILY_TABLES = {
+    "sales": (
+        '''select s.salesID, s.userID, s.salesDate, s.totalAmount
+        from Sales as s
+        where s.salesDate >= ? and s.salesDate < ?
+        order by s.salesID''',
+        pa.schema([("salesID", pa.int64()), ("userID", pa.int64()),
+                   ("salesDate", pa.timestamp("ms")), ("totalAmount", AMOUNT)]),
+    ),
+    "sales_details": (
+        '''select sd.salesDetailID, sd.salesID, sd.variantID, sd.unitPrice
+        from SalesDetails as sd
+        inner join Sales as s
+            on s.salesID = sd.salesID
+        where s.salesDate >= ? and s.salesDate < ?
+        order by sd.salesDetailID''',
+        pa.schema([("salesDetailID", pa.int64()), ("salesID", pa.int64()),
+                   ("variantID", pa.int64()), ("unitPrice", AMOUNT)]),
+    ),
+}
+
+# dimension tables, exported whole as of the run
+SNAPSHOT_TABLES = {
+    "products": (
+        '''select productID, productName, productDescription, size, color, category, unitPrice,
+            reorderLevel, minStockLevel, maxStockLevel, currentStock, isActive, warehouseID
+        from Products
+        order by productID''',
+        pa.schema([("productID", pa.int64()), ("productName", pa.string()), ("productDescription", pa.string()),
+                   ("size", pa.string()), ("color", pa.string()), ("category", pa.string()),
+                   ("unitPrice", AMOUNT), ("reorderLevel", pa.int32()), ("minStockLevel", pa.int32()),
+                   ("maxStockLevel", pa.int32()), ("currentStock", pa.int32()), ("isActive", pa.bool_()),
+                   ("warehouseID", pa.int64())]),
+    ),
+    "product_variants": (
+        '''select variantID, productID, barcode, productCode, isAvailable, isDamaged, isWrongItem, isReturned
+        from ProductVariants
+        order by variantID''',
+        pa.schema([("variantID", pa.int64()), ("productID", pa.int64()), ("barcode", pa.string()),
+                   ("productCode", pa.string()), ("isAvailable", pa.bool_()), ("isDamaged", pa.bool_()),
+                   ("isWrongItem", pa.bool_()), ("isReturned", pa.bool_())]),
+    ),
+}
+
+
+# numeric ids come back as Decimal; arrow needs plain ints for the int64 columns
+def to_column(values, field):
+    if pa.types.is_integer(field.type):
+        values = [int(v) if v is not None else None for v in values]
+    return pa.array(values, type=field.type)
+
+# stream one query into a parquet file, written to a temp name and renamed when complete
+async def export_query(cursor, sql, params, schema, path, batch_size=EXPORT_BATCH_SIZE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    rows_written = 0
+    with pq.ParquetWriter(tmp_path, schema, compression="zstd") as writer:
+        await cursor.execute(sql, params)
+        while True:
+            rows = await cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            batch = pa.record_batch([to_column(columns[i], field) for i, field in enumerate(schema)], schema=schema)
+            writer.write_batch(batch)
+            rows_written += len(rows)
+    os.replace(tmp_path, path)
+    return rows_written
+
+def load_state(export_dir):
+    try:
+        with open(os.path.join(export_dir, STATE_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_state(export_dir, state):
+    os.makedirs(export_dir, exist_ok=True)
+    tmp_path = os.path.join(export_dir, STATE_FILE + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, os.path.join(export_dir, STATE_FILE))
+
+async def first_sales_day(cursor):
+    await cursor.execute('select cast(min(salesDate) as date) from Sales')
+    row = await cursor.fetchone()
+    return row[0] if row and row[0] else None
+
+# export every complete day after the last exported one (or the given range), then snapshot the catalog
+async def run_export(export_dir=EXPORT_DIR, from_day=None, to_day=None):
+    state = load_state(export_dir)
+    conn = await database.get_db_connection()
+    try:
+        cursor = await conn.cursor()
+
+        if from_day is None:
+            last = state.get("lastExportedDay")
+            from_day = date.fromisoformat(last) + timedelta(days=1) if last else await first_sales_day(cursor)
+        # today is still being written to, so only complete days are exported
+        to_day = to_day or date.today() - timedelta(days=1)
+
+        day = from_day
+        while day is not None and day <= to_day:
+            start = datetime.combine(day, time.min)
+            end = start + timedelta(days=1)
+            for table, (sql, schema) in DAILY_TABLES.items():
+                path = os.path.join(export_dir, table, f"salesDay={day.isoformat()}", "part-0.parquet")
+                rows = await export_query(cursor, sql, (start, end), schema, path)
+                logging.info(f"Exported {rows} {table} rows for {day}.")
+            state["lastExportedDay"] = max(day.isoformat(), state.get("lastExportedDay", ""))
+            save_state(export_dir, state)
+            day += timedelta(days=1)
+
+        snapshot_day = date.today().isoformat()
+        for table, (sql, schema) in SNAPSHOT_TABLES.items():
+            path = os.path.join(export_dir, table, f"snapshotDay={snapshot_day}", "part-0.parquet")
+            rows = await export_query(cursor, sql, (), schema, path)
+            logging.info(f"Exported {rows} {table} rows.")
+        state["lastSnapshotDay"] = snapshot_day
+        save_state(export_dir, state)
+        return state
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export sales and inventory to parquet.")
+    parser.add_argument("--from", dest="from_day", type=date.fromisoformat, help="first sales day to (re)export")
+    parser.add_argument("--to", dest="to_day", type=date.fromisoformat, help="last sales day to export")
+    parser.add_argument("--dir", dest="export_dir", default=EXPORT_DIR)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_export(args.export_dir, args.from_day, args.to_day))
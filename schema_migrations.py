@@ -0,0 +1,242 @@
+'''
+schema migration runner
+
+applies the scripts in migrations/ to the database in DB_NAME, each in one transaction:
+- migrations/NNNN_*.sql are versioned: applied once, in order. editing one after it was
+  applied is an error; schema changes go in a new numbered script.
+- migrations/procedures/*.sql hold procedures, views, triggers and table types: applied after
+  the versioned scripts, and again whenever their content changes.
+applied scripts and their sha-256 checksums are recorded in SchemaMigrations. a database lock
+keeps concurrent runs from interleaving. scripts are split into batches on "go" lines.
+
+afterwards it checks that every procedure the code executes exists. this runs at deploy
+(render's preDeployCommand); workers only report pending scripts and missing procedures
+in the background when they start, they never wait for or apply migrations.
+
+usage: python -m schema_migrations [apply|status|verify]
+'''
+from pathlib import Path
+import argparse
+import asyncio
+import hashlib
+import logging
+import json
+import time
+import sys
+import re
+import os
+import database
+
+ROOT = Path(__file__).resolve().parent
+MIGRATIONS_DIR = ROOT / "migrations"
+MIGRATION_LOCK_TIMEOUT_SECONDS = int(os.getenv("MIGRATION_LOCK_TIMEOUT_SECONDS", "120"))
+
+VERSIONED_NAME = re.compile(r"^\d{4}_[\w-]+\.sql$")
+BATCH_SEPARATOR = re.compile(r"^\s*go\s*$", re.IGNORECASE | re.MULTILINE)
+# exec <procedure> in python sql strings and in the scripts; system procedures are skipped
+PROCEDURE_CALL = re.compile(r"\bexec\s+(?:@\w+\s*=\s*)?(?:dbo\.)?([A-Za-z_]\w*)", re.IGNORECASE)
+
+
+class MigrationError(Exception):
+    pass
+
+
+class Script:
+    def __init__(self, path, repeatable):
+        self.name = path.relative_to(MIGRATIONS_DIR).as_posix()
+        self.repeatable = repeatable
+        self.text = path.read_text(encoding="utf-8").replace("\r\n", "\n")
+        self.checksum = hashlib.sha256(self.text.encode("utf-8")).hexdigest()
+
+    def batches(self):
+        for batch in BATCH_SEPARATOR.split(self.text):
+            # skip batches that are only comments
+            code = re.sub(r"--[^\n]*|/\*.*?\*/", "", batch, flags=re.DOTALL)
+            if code.strip():
+                yield batch
+
+
+def load_scripts(migrations_dir=MIGRATIONS_DIR):
+    versioned = sorted(path for path in migrations_dir.glob("*.sql") if VERSIONED_NAME.match(path.name))
+    unnamed = [path.name for path in migrations_dir.glob("*.sql") if not VERSIONED_NAME.match(path.name)]
+    if unnamed:
+        raise MigrationError(f"Versioned scripts must be named NNNN_description.sql: {', '.join(unnamed)}")
+    repeatable = sorted((migrations_dir / "procedures").glob("*.sql"))
+    return [Script(path, False) for path in versioned] + [Script(path, True) for path in repeatable]
+
+
+# scripts still to apply, in order; fails when an applied versioned script was edited
+def pending_scripts(scripts, applied):
+    pending = []
+    for script in scripts:
+        checksum = applied.get(script.name)
+        if checksum is None:
+            pending.append(script)
+        elif checksum != script.checksum:
+            if not script.repeatable:
+                raise MigrationError(
+                    f"{script.name} was changed after it was applied; put the change in a new numbered script")
+            pending.append(script)
+    return pending
+
+
+def referenced_procedures(root=ROOT):
+    sources = [path for path in root.rglob("*.py")
+               if not any(part.startswith((".", "venv")) or part == "__pycache__"
+                          for part in path.relative_to(root).parts)]
+    sources += list((root / "migrations").rglob("*.sql"))
+    names = set()
+    for path in sources:
+        names.update(PROCEDURE_CALL.findall(path.read_text(encoding="utf-8", errors="ignore")))
+    return sorted(name for name in names if not name.lower().startswith(("sp_", "xp_")))
+
+
+async def connect():
+    conn = await database.get_db_connection()
+    if conn is None:
+        raise MigrationError("Could not connect to the database.")
+    return conn
+
+
+async def drain(cursor):
+    # errors raised by later statements of a batch surface while moving through its results
+    while await cursor.nextset():
+        pass
+
+
+async def ensure_history(cursor):
+    await cursor.execute(
+        '''if object_id(N'dbo.SchemaMigrations', 'U') is null
+        begin
+            create table SchemaMigrations (
+                scriptName varchar(255) constraint PK_scriptName primary key,
+                checksum char(64) not null,
+                isRepeatable bit not null,
+                appliedAt datetime2 not null constraint DF_appliedAt_schemaMigrations default sysdatetime(),
+                durationMs int not null
+            )
+        end''')
+
+
+async def applied_checksums(cursor):
+    await cursor.execute("select object_id(N'dbo.SchemaMigrations', 'U')")
+    if (await cursor.fetchone())[0] is None:
+        return {}
+    await cursor.execute('select scriptName, checksum from SchemaMigrations')
+    return {row[0]: row[1] for row in await cursor.fetchall()}
+
+
+async def missing_procedures(cursor, names):
+    await cursor.execute(
+        '''select name from sys.procedures
+        where schema_id = schema_id(N'dbo') and name in (select value from openjson(?))''',
+        (json.dumps(names),))
+    existing = {row[0].lower() for row in await cursor.fetchall()}
+    return [name for name in names if name.lower() not in existing]
+
+
+async def apply_script(cursor, script):
+    started = time.perf_counter()
+    await cursor.execute('set xact_abort on; begin transaction;')
+    try:
+        for number, batch in enumerate(script.batches(), start=1):
+            try:
+                await cursor.execute(batch)
+                await drain(cursor)
+            except Exception as e:
+                raise MigrationError(f"{script.name}, batch {number}: {e}") from e
+
+        await cursor.execute(
+            '''merge SchemaMigrations as target
+            using (select ? as scriptName, ? as checksum, ? as isRepeatable, ? as durationMs) as source
+                on target.scriptName = source.scriptName
+            when matched then
+                update set checksum = source.checksum, appliedAt = sysdatetime(), durationMs = source.durationMs
+            when not matched then
+                insert (scriptName, checksum, isRepeatable, durationMs)
+                values (source.scriptName, source.checksum, source.isRepeatable, source.durationMs);''',
+            (script.name, script.checksum, script.repeatable, int((time.perf_counter() - started) * 1000)))
+        await cursor.execute('commit transaction;')
+    except Exception:
+        await cursor.execute('if @@trancount > 0 rollback transaction;')
+        raise
+
+
+async def migrate(scripts=None):
+    scripts = scripts if scripts is not None else load_scripts()
+    conn = await connect()
+    try:
+        cursor = await conn.cursor()
+        # one runner at a time; the lock is released when the connection closes
+        await cursor.execute(
+            '''declare @result int;
+            exec @result = sp_getapplock @Resource = N'schema_migrations', @LockMode = N'Exclusive',
+                @LockOwner = N'Session', @LockTimeout = ?;
+            select @result;''',
+            (MIGRATION_LOCK_TIMEOUT_SECONDS * 1000,))
+        if (await cursor.fetchone())[0] < 0:
+            raise MigrationError("Another migration run holds the lock.")
+
+        await ensure_history(cursor)
+        pending = pending_scripts(scripts, await applied_checksums(cursor))
+        for script in pending:
+            logging.info(f"Applying {script.name}")
+            await apply_script(cursor, script)
+
+        missing = await missing_procedures(cursor, referenced_procedures())
+        return [script.name for script in pending], missing
+    finally:
+        await conn.close()
+
+
+async def schema_status(scripts=None):
+    scripts = scripts if scripts is not None else load_scripts()
+    conn = await connect()
+    try:
+        cursor = await conn.cursor()
+        pending = pending_scripts(scripts, await applied_checksums(cursor))
+        missing = await missing_procedures(cursor, referenced_procedures())
+        return [script.name for script in pending], missing
+    finally:
+        await conn.close()
+
+
+# worker startup: log what the deploy has not applied yet, without waiting on it
+async def report_schema_status():
+    try:
+        pending, missing = await schema_status()
+    except Exception as e:
+        logging.error(f"error checking the schema: {e}")
+        return
+    if pending:
+        logging.warning(f"Schema scripts not applied: {', '.join(pending)}. Run python -m schema_migrations.")
+    if missing:
+        logging.error(f"Procedures called by the code do not exist: {', '.join(missing)}")
+
+
+async def main(command):
+    try:
+        if command == "apply":
+            pending, missing = await migrate()
+            print(f"applied {len(pending)} script(s)" + (f": {', '.join(pending)}" if pending else ""))
+        else:
+            pending, missing = await schema_status()
+            if command == "status":
+                print("pending: " + (", ".join(pending) if pending else "none"))
+    except MigrationError as e:
+        print(f"migration failed: {e}", file=sys.stderr)
+        return 1
+
+    if missing:
+        print(f"missing procedures: {', '.join(missing)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply the scripts in migrations/ to the database.")
+    parser.add_argument("command", nargs="?", default="apply", choices=["apply", "status", "verify"])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(main(args.command)))
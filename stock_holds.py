@@ -0,0 +1,94 @@
+import time
+import os
+
+# a cart line holds its stock for this long without activity
+HOLD_TTL_SECONDS = float(os.getenv("HOLD_TTL_SECONDS", "900"))
+# how long an available count read from the db is trusted before it is read again
+AVAILABILITY_TTL_SECONDS = float(os.getenv("AVAILABILITY_TTL_SECONDS", "30"))
+
+
+'''
+soft stock holds
+
+when a product goes into a cart, its quantity is held against the product's available
+count so another cart cannot take the same units. holds expire, are released when the
+line is removed, and are consumed by checkout. the ledger lives in this process, so with
+several workers the db claim in CheckoutCart stays the final check.
+'''
+class HoldLedger:
+    def __init__(self, hold_ttl=HOLD_TTL_SECONDS, availability_ttl=AVAILABILITY_TTL_SECONDS):
+        self.hold_ttl = hold_ttl
+        self.availability_ttl = availability_ttl
+        self.available = {}  # productID -> (available variants, loaded at)
+        self.holds = {}  # productID -> {cartKey: (quantity, expires at)}
+        self.held = {}  # productID -> total quantity held
+
+    async def available_count(self, cursor, product_id):
+        cached = self.available.get(product_id)
+        if cached and time.monotonic() - cached[1] < self.availability_ttl:
+            return cached[0]
+        await cursor.execute(
+            '''select count(*)
+            from ProductVariants
+            where productID = ? and isAvailable = 1''',
+            (product_id,)
+        )
+        count = (await cursor.fetchone())[0]
+        self.available[product_id] = (count, time.monotonic())
+        return count
+
+    def expire(self, product_id=None):
+        now = time.monotonic()
+        product_ids = [product_id] if product_id is not None else list(self.holds)
+        for pid in product_ids:
+            for cart_key, (quantity, expires_at) in list(self.holds.get(pid, {}).items()):
+                if expires_at <= now:
+                    self.drop(pid, cart_key)
+
+    def drop(self, product_id, cart_key):
+        holds = self.holds.get(product_id, {})
+        hold = holds.pop(cart_key, None)
+        if hold is not None:
+            self.held[product_id] -= hold[0]
+        if not holds:
+            self.holds.pop(product_id, None)
+            self.held.pop(product_id, None)
+
+    # units of a product not held by any other cart
+    async def free_for(self, cursor, cart_key, product_id):
+        self.expire(product_id)
+        available = await self.available_count(cursor, product_id)
+        own = self.holds.get(product_id, {}).get(cart_key, (0, 0))[0]
+        return available - (self.held.get(product_id, 0) - own)
+
+    # set this cart's hold on a product to quantity; returns (placed, units free for this cart)
+    async def place(self, cursor, cart_key, product_id, quantity):
+        free = await self.free_for(cursor, cart_key, product_id)
+        if quantity > free:
+            return False, free
+        self.drop(product_id, cart_key)
+        self.holds.setdefault(product_id, {})[cart_key] = (quantity, time.monotonic() + self.hold_ttl)
+        self.held[product_id] = self.held.get(product_id, 0) + quantity
+        return True, free
+
+    def release(self, cart_key, product_id=None):
+        product_ids = [product_id] if product_id is not None else [pid for pid, holds in self.holds.items() if cart_key in holds]
+        for pid in product_ids:
+            self.drop(pid, cart_key)
+
+    # checkout turns the cart's holds into sold units
+    def consume(self, cart_key, sold):
+        for product_id, quantity in sold.items():
+            self.drop(product_id, cart_key)
+            cached = self.available.get(product_id)
+            if cached:
+                self.available[product_id] = (max(cached[0] - quantity, 0), cached[1])
+
+    # stock changed outside checkout (receiving, inventory edits)
+    def invalidate(self, product_ids):
+        for product_id in product_ids:
+            self.available.pop(product_id, None)
+
+
+# shared instance
+hold_ledger = HoldLedger()
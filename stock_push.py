@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import json
+import os
+import database
+from change_feed import change_feed
+
+# changes arriving within this window are pushed together
+STOCK_PUSH_COALESCE_SECONDS = float(os.getenv("STOCK_PUSH_COALESCE_SECONDS", "0.1"))
+# a socket that takes longer than this to accept a message is disconnected
+STOCK_PUSH_SEND_TIMEOUT = float(os.getenv("STOCK_PUSH_SEND_TIMEOUT", "5"))
+
+
+class StockClient:
+    def __init__(self, websocket, categories=None):
+        self.websocket = websocket
+        self.categories = categories  # None receives every category
+        # latest level per product not yet sent; a slow socket gets the newest value, not a backlog
+        self.pending = {}
+        self.ready = asyncio.Event()
+
+    def wants(self, level):
+        return self.categories is None or level["category"] in self.categories
+
+    def offer(self, level):
+        if self.wants(level):
+            self.pending[level["productID"]] = level
+            self.ready.set()
+
+    async def send_loop(self, send_timeout=STOCK_PUSH_SEND_TIMEOUT):
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            levels, self.pending = list(self.pending.values()), {}
+            await asyncio.wait_for(
+                self.websocket.send_json({"type": "stock", "levels": levels}), timeout=send_timeout)
+
+
+'''
+stock level push for pos terminals
+
+levels are kept in memory and refreshed with one query per burst of changes, whatever the
+number of connected sockets. changes come from the write paths in this worker (notify) and
+from the change feed, which also covers the other workers.
+'''
+class StockPush:
+    def __init__(self, coalesce_seconds=STOCK_PUSH_COALESCE_SECONDS):
+        self.coalesce_seconds = coalesce_seconds
+        self.clients = set()
+        self.levels = {}  # productID -> level, loaded when the first socket connects
+        self.pending_products = set()
+        self.wake = asyncio.Event()
+        self.tasks = []
+        self.lock = asyncio.Lock()
+
+    async def load_levels(self, product_ids=None):
+        product_filter, params = "", ()
+        if product_ids is not None:
+            product_filter = "and p.productID in (select value from openjson(?))"
+            params = (json.dumps(sorted(product_ids)),)
+
+        conn = await database.get_db_connection()
+        try:
+            cursor = await conn.cursor()
+            await cursor.execute(
+                f'''select p.productID, p.productName, p.category, p.size, count(pv.variantID) as available
+                from Products as p
+                left join ProductVariants as pv
+                    on pv.productID = p.productID and pv.isAvailable = 1
+                where p.isActive = 1 {product_filter}
+                group by p.productID, p.productName, p.category, p.size''',
+                params
+            )
+            rows = await cursor.fetchall()
+        finally:
+            await conn.close()
+        return {
+            int(row[0]): {
+                "productID": int(row[0]),
+                "productName": row[1],
+                "category": row[2],
+                "size": row[3],
+                "available": row[4],
+            }
+            for row in rows
+        }
+
+    def snapshot(self, client):
+        return [level for level in self.levels.values() if client.wants(level)]
+
+    async def connect(self, websocket, categories=None):
+        client = StockClient(websocket, categories)
+        async with self.lock:
+            if not self.clients:
+                self.levels = await self.load_levels()
+                self.start()
+            self.clients.add(client)
+        return client
+
+    async def disconnect(self, client):
+        async with self.lock:
+            self.clients.discard(client)
+            if not self.clients:
+                await self.stop()
+
+    # stock of these products changed; called by checkout, receiving and inventory writes
+    def notify(self, product_ids):
+        if not self.clients:
+            return
+        self.pending_products.update(int(product_id) for product_id in product_ids)
+        self.wake.set()
+
+    def publish(self, product_ids, levels):
+        for product_id in product_ids:
+            level = levels.get(product_id)
+            if level is None:
+                # deactivated or deleted
+                old = self.levels.pop(product_id, None)
+                if old is None:
+                    continue
+                level = dict(old, available=0, removed=True)
+            elif self.levels.get(product_id) == level:
+                continue
+            else:
+                self.levels[product_id] = level
+            for client in self.clients:
+                client.offer(level)
+
+    async def refresh_loop(self):
+        while True:
+            await self.wake.wait()
+            await asyncio.sleep(self.coalesce_seconds)
+            self.wake.clear()
+            product_ids, self.pending_products = self.pending_products, set()
+            if not product_ids:
+                continue
+            try:
+                self.publish(product_ids, await self.load_levels(product_ids))
+            except Exception as e:
+                logging.error(f"error refreshing stock levels: {e}")
+
+    # turn change feed entries into product ids to refresh
+    async def follow_changes(self):
+        while True:
+            subscription = None
+            try:
+                subscription = await change_feed.subscribe()
+                while not subscription.overflowed:
+                    try:
+                        change = await asyncio.wait_for(subscription.queue.get(), timeout=5)
+                    except asyncio.TimeoutError:
+                        continue
+                    if change["table"] == "Products":
+                        self.notify([change["id"]])
+                    elif change["table"] == "ProductVariants" and change["data"]:
+                        self.notify([change["data"]["productID"]])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"error following changes for stock push: {e}")
+                await asyncio.sleep(5)
+            finally:
+                if subscription is not None:
+                    change_feed.unsubscribe(subscription)
+            # changes were missed, refresh everything that is being shown
+            self.notify(list(self.levels))
+
+    def start(self):
+        self.tasks = [asyncio.create_task(self.refresh_loop()), asyncio.create_task(self.follow_changes())]
+
+    async def stop(self):
+        tasks, self.tasks = self.tasks, []
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                logging.error(f"error stopping stock push: {e}")
+        self.pending_products = set()
+        self.wake.clear()
+
+
+# shared instance
+stock_push = StockPush()
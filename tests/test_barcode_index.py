@@ -0,0 +1,108 @@
+import asyncio
+import random
+import string
+from barcode_index import BloomFilter, BarcodeIndex, SNAPSHOT_HEADER
+
+
+def random_barcodes(count, seed):
+    rng = random.Random(seed)
+    return ["".join(rng.choices(string.digits, k=13)) for _ in range(count)]
+
+
+class FakeCursor:
+    # answers the queries BarcodeIndex sends, from a list of (version, barcode) change log inserts
+    def __init__(self, changes, purged_through=0, table=()):
+        self.changes = changes
+        self.purged_through = purged_through
+        self.table = list(table)
+        self.rows = []
+
+    async def execute(self, sql, params=()):
+        if "purgedThrough" in sql:
+            self.rows = [(self.purged_through,)]
+        elif "min_active_rowversion() as bigint" in sql:
+            self.rows = [(max([0] + [version for version, _ in self.changes]), len(self.table))]
+        elif "from ProductVariants" in sql:
+            self.rows = [(barcode,) for barcode in self.table]
+        else:
+            limit, since = params
+            self.rows = [change for change in self.changes if change[0] > since][:limit]
+
+    async def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    async def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    async def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000, error_rate=0.01)
+    barcodes = random_barcodes(5000, seed=1)  # well past capacity
+    for barcode in barcodes:
+        bloom.add(barcode)
+    assert all(barcode in bloom for barcode in barcodes)
+
+
+def test_bloom_filter_false_positive_rate_near_target():
+    bloom = BloomFilter(10000, error_rate=0.01)
+    for barcode in random_barcodes(10000, seed=2):
+        bloom.add(barcode)
+    others = set(random_barcodes(20000, seed=3)) - set(random_barcodes(10000, seed=2))
+    false_positives = sum(barcode in bloom for barcode in others)
+    assert false_positives / len(others) < 0.03
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = tmp_path / "barcodes.snapshot"
+    index = BarcodeIndex(snapshot_path=str(path))
+    index.bloom = BloomFilter(1000)
+    barcodes = random_barcodes(500, seed=4)
+    for barcode in barcodes:
+        index.bloom.add(barcode)
+    index.version = 123456
+    index.save_snapshot()
+
+    loaded = BarcodeIndex(snapshot_path=str(path))
+    assert loaded.load_snapshot()
+    assert loaded.version == 123456
+    assert loaded.bloom.count == 500
+    assert loaded.bloom.bit_count == index.bloom.bit_count
+    assert loaded.bloom.hash_count == index.bloom.hash_count
+    assert loaded.bloom.bits == index.bloom.bits
+    assert all(barcode in loaded.bloom for barcode in barcodes)
+    assert list(tmp_path.iterdir()) == [path]  # the temp file was renamed into place
+
+
+def test_snapshot_with_other_format_is_rejected(tmp_path):
+    path = tmp_path / "barcodes.snapshot"
+    path.write_bytes(SNAPSHOT_HEADER.pack(b"BCB1", 64, 3, 0, 0) + bytes(8))
+    assert not BarcodeIndex(snapshot_path=str(path)).load_snapshot()
+
+    path.write_bytes(b"short")
+    assert not BarcodeIndex(snapshot_path=str(path)).load_snapshot()
+
+
+def test_catch_up_reads_change_log_by_version():
+    index = BarcodeIndex(snapshot_path="unused")
+    index.bloom = BloomFilter(1000)
+    # versions follow commit order, so a variant whose insert committed late is still after the token
+    cursor = FakeCursor([(5, "late-committed"), (7, "4800000000001"), (9, None)])
+    asyncio.run(index.catch_up(cursor, batch_size=2))
+    assert index.version == 9
+    assert "late-committed" in index.bloom and "4800000000001" in index.bloom
+
+
+def test_catch_up_rebuilds_when_the_log_was_purged():
+    index = BarcodeIndex(snapshot_path="unused")
+    index.bloom = BloomFilter(1000)
+    index.version = 3
+    # the log before version 10 is gone, so the filter is rebuilt from the table
+    cursor = FakeCursor([(20, "4800000000002")], purged_through=10, table=["4800000000001", "4800000000002"])
+    asyncio.run(index.catch_up(cursor))
+    assert index.version == 20
+    assert "4800000000001" in index.bloom and "4800000000002" in index.bloom
@@ -0,0 +1,44 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# the router imports the database driver, which needs the odbc libraries
+receive_orders = pytest.importorskip("routers.receive_orders", exc_type=ImportError)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    requested = []
+
+    async def fetch_orders(order_status=None, limit=None, cursor=None):
+        requested.append(order_status)
+        return [], None
+
+    monkeypatch.setattr(receive_orders, "fetch_orders", fetch_orders)
+    app = FastAPI()
+    app.include_router(receive_orders.router, prefix="/receive-orders")
+    test_client = TestClient(app)
+    test_client.requested = requested
+    return test_client
+
+
+def test_status_orders_url(client):
+    response = client.get("/receive-orders/Pending-orders")
+    assert response.status_code == 200
+    assert response.json() == {"Pending orders": [], "nextCursor": None}
+    assert client.requested == ["Pending"]
+
+
+def test_status_url(client):
+    response = client.get("/receive-orders/To-Ship")
+    assert response.status_code == 200
+    assert client.requested == ["To Ship"]
+
+
+def test_all_orders_url_is_not_a_status(client):
+    client.get("/receive-orders/all-orders")
+    assert client.requested == [None]
+
+
+def test_unknown_status_is_rejected(client):
+    assert client.get("/receive-orders/Lost-orders").status_code == 400
@@ -0,0 +1,158 @@
+import httpx
+import asyncio
+import random
+import time
+import logging
+import os
+from collections import deque
+
+# base url for vms api
+VMS_BASE_URL = os.getenv("VMS_BASE_URL", "http://127.0.0.1:8001")
+
+# pool, timeout and circuit breaker settings
+VMS_TIMEOUT_SECONDS = float(os.getenv("VMS_TIMEOUT_SECONDS", "10"))
+VMS_MAX_CONNECTIONS = int(os.getenv("VMS_MAX_CONNECTIONS", "20"))
+VMS_FAILURE_THRESHOLD = int(os.getenv("VMS_FAILURE_THRESHOLD", "5"))
+VMS_RESET_SECONDS = float(os.getenv("VMS_RESET_SECONDS", "30"))
+
+
+# raised when the circuit is open or every attempt to reach the vms failed
+class VMSUnavailableError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started = None  # when the half-open probe call went out
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    # closed lets calls through; half-open lets one probe through, and its outcome decides whether to close again.
+    # a probe that never reports back (cancelled, or a non-http error) is given up after reset_seconds
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "open":
+            return False
+        now = time.monotonic()
+        if self.probe_started is not None and now - self.probe_started < self.reset_seconds:
+            return False
+        self.probe_started = now
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half-open" or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self.probe_started = None
+
+
+class VMSClient:
+    def __init__(self, base_url=VMS_BASE_URL, timeout=VMS_TIMEOUT_SECONDS, max_connections=VMS_MAX_CONNECTIONS,
+                 failure_threshold=VMS_FAILURE_THRESHOLD, reset_seconds=VMS_RESET_SECONDS):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+        self.client = None
+        self.calls = 0
+        self.errors = 0
+        self.rejected = 0
+        self.latencies = deque(maxlen=500)  # seconds, most recent calls
+
+    # one keep-alive pool for the lifetime of the app
+    async def start(self):
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+            )
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    # post json to the vms in up to `attempts` tries with jittered exponential backoff. without an idempotency key
+    # only connection failures are retried, since the vms may have acted on a request that timed out or got a 5xx;
+    # with one (sent as the Idempotency-Key header) transport errors and 5xx responses are retried too
+    async def post(self, path, payload, attempts=3, timeout=None, backoff=0.5, max_backoff=8.0, idempotency_key=None):
+        await self.start()
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+        last_error = None
+
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                self.rejected += 1
+                raise VMSUnavailableError(f"VMS circuit is open, not calling {path}")
+
+            started = time.perf_counter()
+            self.calls += 1
+            try:
+                response = await self.client.post(path, json=payload, headers=headers,
+                                                  timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT)
+                self.latencies.append(time.perf_counter() - started)
+                if response.status_code >= 500:
+                    response.raise_for_status()
+                self.breaker.record_success()
+                # 4xx means the vms is up but refused the payload, so it is not retried
+                response.raise_for_status()
+                return response.json()
+            except httpx.HTTPStatusError as e:
+                self.errors += 1
+                if e.response.status_code < 500:
+                    raise
+                self.breaker.record_failure()
+                last_error = e
+                retryable = idempotency_key is not None
+            except httpx.TransportError as e:
+                self.latencies.append(time.perf_counter() - started)
+                self.errors += 1
+                self.breaker.record_failure()
+                last_error = e
+                # a request that never connected cannot have reached the vms
+                retryable = idempotency_key is not None or isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+
+            logging.error(f"VMS call to {path} failed (attempt {attempt + 1} of {attempts}): {last_error}")
+            if not retryable:
+                break
+            if attempt + 1 < attempts:
+                await asyncio.sleep(random.uniform(0, min(max_backoff, backoff * 2 ** attempt)))
+
+        raise VMSUnavailableError(f"VMS call to {path} failed after {attempt + 1} attempts: {last_error}")
+
+    def metrics(self):
+        latencies = sorted(self.latencies)
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1) if latencies else None
+        return {
+            "baseUrl": self.base_url,
+            "circuit": self.breaker.state,
+            "consecutiveFailures": self.breaker.failures,
+            "calls": self.calls,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "latencyMs": {"p50": percentile(0.5), "p95": percentile(0.95), "max": percentile(1.0)},
+        }
+
+
+# shared instance used by every router
+vms_client = VMSClient()
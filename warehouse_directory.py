@@ -0,0 +1,88 @@
+import asyncio
+import time
+import os
+import database
+
+# the directory is reloaded after this many seconds (warehouses rarely change)
+WAREHOUSE_DIRECTORY_TTL_SECONDS = float(os.getenv("WAREHOUSE_DIRECTORY_TTL_SECONDS", "600"))
+
+ADDRESS_FIELDS = ("warehouseName", "building", "street", "barangay", "city", "country", "zipcode")
+
+
+def address_key(fields):
+    return tuple((fields.get(name) or "").strip().lower() for name in ADDRESS_FIELDS)
+
+
+'''
+in-memory directory of warehouses
+
+handlers resolve warehouses by id, or by name and address through one dict lookup, instead
+of matching the address columns in sql on every purchase order.
+'''
+class WarehouseDirectory:
+    def __init__(self, ttl_seconds=WAREHOUSE_DIRECTORY_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.by_id = {}
+        self.by_address = {}
+        self.loaded_at = None
+        self.lock = asyncio.Lock()
+
+    async def load(self):
+        conn = await database.get_db_connection()
+        try:
+            cursor = await conn.cursor()
+            await cursor.execute(
+                '''select warehouseID, warehouseName, building, street, barangay, city, country, zipcode
+                from Warehouses'''
+            )
+            rows = await cursor.fetchall()
+        finally:
+            await conn.close()
+
+        by_id = {}
+        for row in rows:
+            warehouse = {"warehouseID": int(row[0]), **dict(zip(ADDRESS_FIELDS, row[1:]))}
+            warehouse["fullAddress"] = ", ".join(
+                str(warehouse[name]) for name in ADDRESS_FIELDS[1:] if warehouse[name])
+            by_id[warehouse["warehouseID"]] = warehouse
+        self.by_id = by_id
+        self.by_address = {address_key(w): w["warehouseID"] for w in by_id.values()}
+        self.loaded_at = time.monotonic()
+
+    async def ensure_loaded(self):
+        if self.loaded_at is not None and time.monotonic() - self.loaded_at < self.ttl_seconds:
+            return
+        async with self.lock:
+            if self.loaded_at is None or time.monotonic() - self.loaded_at >= self.ttl_seconds:
+                await self.load()
+
+    # a warehouse was added or changed
+    def invalidate(self):
+        self.loaded_at = None
+
+    async def all(self):
+        await self.ensure_loaded()
+        return list(self.by_id.values())
+
+    # a lookup that missed is retried once after a reload, the warehouse may have been added since the last load
+    async def lookup(self, find):
+        await self.ensure_loaded()
+        found = find()
+        if found is None and self.loaded_at is not None:
+            self.invalidate()
+            await self.ensure_loaded()
+            found = find()
+        return found
+
+    # the warehouse with this id, None when there is no such warehouse; the id must already be an int
+    async def get(self, warehouse_id):
+        return await self.lookup(lambda: self.by_id.get(warehouse_id))
+
+    # warehouseID for a name and address, None when there is no such warehouse
+    async def resolve(self, fields):
+        key = address_key(fields)
+        return await self.lookup(lambda: self.by_address.get(key))
+
+
+# shared instance
+warehouse_directory = WarehouseDirectory()